@@ -0,0 +1,86 @@
+"""
+Measures the UI-thread cost of triggering the client notification sound.
+
+Compares the legacy QSound.play(path) call, which resolves and loads the WAV on
+every trigger, with the preloaded NotificationPlayer.
+
+Usage:
+    python -m benchmarks.client_notification --triggers 200 --output notification.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+from PyQt5.QtMultimedia import QSound
+from client.ui.notification_player import NotificationPlayer, NOTIFICATION_FILE
+from benchmarks.stats import summarize
+
+
+def process_events(app, milliseconds):
+    """Runs the Qt event loop for the given time so queued audio events are delivered."""
+    loop = QEventLoop()
+    QTimer.singleShot(milliseconds, loop.quit)
+    loop.exec_()
+
+
+def bench_legacy(triggers, interval_ms, app):
+    """Times QSound.play(path) per trigger, as the client used to do per message."""
+    samples = []
+    for _ in range(triggers):
+        start = time.perf_counter()
+        QSound.play(os.path.join(os.getcwd(), NOTIFICATION_FILE))
+        samples.append(time.perf_counter() - start)
+        process_events(app, interval_ms)
+    return {"play_call": summarize(samples)}
+
+
+def bench_player(triggers, interval_ms, app):
+    """Times NotificationPlayer.play per trigger, including collapsed triggers."""
+    player = NotificationPlayer()
+    process_events(app, 200)  # Let the effect finish loading before measuring
+    samples = []
+    for _ in range(triggers):
+        start = time.perf_counter()
+        player.play()
+        samples.append(time.perf_counter() - start)
+        process_events(app, interval_ms)
+    stats = player.stats()
+    return {
+        "play_call": summarize(samples),
+        "playback_start": summarize(stats["start_latencies"]),
+        "played": stats["played"],
+        "collapsed": stats["collapsed"],
+    }
+
+
+def main():
+    """Runs both variants and prints or writes the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--triggers", type=int, default=100)
+    parser.add_argument(
+        "--interval-ms", type=int, default=5, help="Event loop time between triggers"
+    )
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    result = {
+        "benchmark": "client_notification",
+        "triggers": args.triggers,
+        "interval_ms": args.interval_ms,
+        "legacy_qsound": bench_legacy(args.triggers, args.interval_ms, app),
+        "notification_player": bench_player(args.triggers, args.interval_ms, app),
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Measures bytes on the wire and CPU cost per history page with and without compression.
+
+Builds synthetic history pages (repeated usernames, chat-like text) and encodes
+them as the server would: one HISTORY frame per message in the text and plain
+binary protocols, and HISTORY_BATCH frames with a per-frame or a per-connection
+zlib stream.
+
+Usage:
+    python -m benchmarks.history_compression --pages 50 --page-size 50 --output history.json
+"""
+
+import json
+import time
+import random
+import zlib
+import argparse
+from server.network import protocol
+from server.network.protocol import Frame, FrameCompressor, FrameReader
+from server.network.message_broadcast import encode_text
+
+USERNAMES = [f"user{i:02d}" for i in range(20)]
+WORDS = (
+    "hey hello meeting tomorrow lunch deploy build failed passed review the a to "
+    "is on at can you check please thanks ok sure later today release branch"
+).split()
+
+
+def make_pages(pages, page_size, seed):
+    """Builds a list of pages, each a list of (id, timestamp, sender, text) rows."""
+    rng = random.Random(seed)
+    start = 1700000000000
+    return [
+        [
+            (
+                page * page_size + row + 1,
+                start + (page * page_size + row) * rng.randint(1, 5000),
+                rng.choice(USERNAMES),
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 25))),
+            )
+            for row in range(page_size)
+        ]
+        for page in range(pages)
+    ]
+
+
+def batch_frame(rows):
+    """Builds the HISTORY_BATCH frame for a page."""
+    fields = []
+    for message_id, timestamp, sender, text in rows:
+        fields.extend((str(message_id), str(timestamp), sender, text))
+    return Frame(protocol.HISTORY_BATCH, fields)
+
+
+def measure(pages, encode, decode=None):
+    """
+    Encodes every page and reports wire bytes and CPU time per page.
+
+    Args:
+        pages (list): The pages to encode.
+        encode: Function from a page to its bytes on the wire.
+        decode: Optional function decoding those bytes, timed separately.
+
+    Returns:
+        dict: Bytes and CPU microseconds per page.
+    """
+    total_bytes = 0
+    encode_cpu = 0.0
+    decode_cpu = 0.0
+    for rows in pages:
+        start = time.process_time()
+        data = encode(rows)
+        encode_cpu += time.process_time() - start
+        total_bytes += len(data)
+        if decode is not None:
+            start = time.process_time()
+            decode(data)
+            decode_cpu += time.process_time() - start
+    result = {
+        "bytes_per_page": total_bytes / len(pages),
+        "encode_cpu_us_per_page": encode_cpu / len(pages) * 1e6,
+    }
+    if decode is not None:
+        result["decode_cpu_us_per_page"] = decode_cpu / len(pages) * 1e6
+    return result
+
+
+def bench_text(pages):
+    """The legacy text protocol, one HISTORY line per message."""
+    return measure(
+        pages,
+        lambda rows: "".join(
+            encode_text(Frame(protocol.HISTORY, row[2:]), "viewer") for row in rows
+        ).encode(),
+    )
+
+
+def bench_binary(pages):
+    """Binary HISTORY_BATCH frames without compression."""
+    reader = FrameReader()
+    return measure(pages, lambda rows: batch_frame(rows).to_bytes(), reader.feed)
+
+
+def bench_zlib_per_frame(pages):
+    """Each batch compressed on its own, without a shared window."""
+    return measure(
+        pages,
+        lambda rows: zlib.compress(batch_frame(rows).to_bytes(), 6),
+        zlib.decompress,
+    )
+
+
+def bench_zlib_stream(pages):
+    """Batches compressed with one zlib stream per connection, as the server does."""
+    compressor = FrameCompressor()
+    reader = FrameReader("zlib")
+    return measure(
+        pages, lambda rows: compressor.encode(batch_frame(rows)), reader.feed
+    )
+
+
+def main():
+    """Runs every variant and prints or writes the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument(
+        "--page-size", type=int, default=50, help="Messages per history page"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.page_size, args.seed)
+    result = {
+        "benchmark": "history_compression",
+        "pages": args.pages,
+        "page_size": args.page_size,
+        "text": bench_text(pages),
+        "binary": bench_binary(pages),
+        "zlib_per_frame": bench_zlib_per_frame(pages),
+        "zlib_stream": bench_zlib_stream(pages),
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+Drives chat traffic through a server over TLS and reports throughput and latency.
+
+Opens --clients connections with the real v2 handshake and binary frames, then
+sends a mix of public, private, group and history requests for --duration
+seconds. Every chat message carries its send time, so each delivery gives an
+end-to-end latency. Server RSS and thread count are sampled from /proc.
+
+Without --port, the server runs in a subprocess on the in-memory storage backend
+(benchmarks.memory_server). With --port, a running server is used; its storage
+needs the load users and group, which --setup creates in the backend selected
+by STORAGE_BACKEND, and --server-pid lets its resources be sampled. The
+subprocess has per-user rate limits off unless RATE_LIMIT_* variables are set;
+a running server needs them raised or off for the traffic to get through.
+
+Usage:
+    python -m benchmarks.load_generator --clients 50 --duration 30 --output load.json
+    python -m benchmarks.load_generator --port 65432 --setup --server-pid 1234
+"""
+
+import os
+import sys
+import ssl
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+from collections import Counter
+from server.network import protocol
+from server.network.protocol import ServerStreamDecoder
+from server.network.admission import RATE_LIMITS
+from benchmarks.stats import summarize
+
+USER_PREFIX = "loadgen"
+GROUP_NAME = "loadgen"
+# Starts the text of every generated message, followed by its send time in ns
+MARKER = "lg"
+TRAFFIC_TYPES = ("public", "private", "group", "history")
+DELIVERY_TYPES = {
+    protocol.PUBLIC: "public",
+    protocol.PRIVATE: "private",
+    protocol.GROUP: "group",
+}
+# Seconds between two samples of the server's RSS and thread count
+SAMPLE_INTERVAL = 0.5
+# Seconds to wait for the in-memory server to accept connections
+SERVER_START_TIMEOUT = 15
+
+
+def parse_mix(text):
+    """
+    Parses a traffic mix such as 'public=70,private=20,group=5,history=5'.
+
+    Returns:
+        dict: The relative weight of each traffic type.
+    """
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in TRAFFIC_TYPES:
+            raise argparse.ArgumentTypeError(f"unknown traffic type '{kind}'")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+class LoadStats:
+    def __init__(self):
+        """Initializes the counters shared by every client's reader thread."""
+        self.lock = threading.Lock()
+        self.latencies = {kind: [] for kind in DELIVERY_TYPES.values()}
+        self.history_messages = 0
+        self.frames = 0
+
+    def record(self, frame, received_ns):
+        """
+        Records a frame received by a client.
+
+        Args:
+            frame (Frame): The received frame.
+            received_ns (int): time.perf_counter_ns() when it was read.
+        """
+        kind = DELIVERY_TYPES.get(frame.frame_type)
+        with self.lock:
+            self.frames += 1
+            if frame.frame_type == protocol.HISTORY_BATCH:
+                self.history_messages += len(frame.fields) // 4
+            elif kind is not None:
+                # The message text is the last field of every chat frame
+                marker, sent_ns, _ = (frame.fields[-1].split(" ", 2) + ["", ""])[:3]
+                if marker == MARKER:
+                    self.latencies[kind].append((received_ns - int(sent_ns)) / 1e9)
+
+
+class LoadClient:
+    def __init__(self, host, port, name, context, stats):
+        """
+        Connects, performs the v2 handshake and starts reading in the background.
+
+        Args:
+            host (str): The server host.
+            port (int): The server port.
+            name (str): The username to connect as.
+            context (ssl.SSLContext): The client TLS context.
+            stats (LoadStats): Where received frames are recorded.
+        """
+        self.name = name
+        self.stats = stats
+        self.send_lock = threading.Lock()
+        raw = socket.create_connection((host, port), timeout=10)
+        self.sock = context.wrap_socket(raw, server_hostname=host)
+        self.sock.sendall(protocol.encode_handshake(name))
+
+        self.stream = ServerStreamDecoder()
+        while self.stream.binary is None:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionResetError("Server closed the connection")
+            self.record(self.stream.feed(data))
+        if not self.stream.binary:
+            raise ConnectionError("Server does not speak protocol v2")
+        self.sock.settimeout(None)
+        self.reader = threading.Thread(target=self.read_loop, daemon=True)
+        self.reader.start()
+
+    def record(self, frames):
+        """Hands received frames to the shared statistics."""
+        received_ns = time.perf_counter_ns()
+        for frame in frames:
+            self.stats.record(frame, received_ns)
+
+    def read_loop(self):
+        """Reads frames until the connection closes."""
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                self.record(self.stream.feed(data))
+        except (OSError, protocol.ProtocolError):
+            pass
+
+    def send(self, command):
+        """Sends a client command, as the UI would produce it, as a binary frame."""
+        data = protocol.encode_command(command).to_bytes()
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def close(self):
+        """Disconnects cleanly and closes the socket."""
+        try:
+            self.send("disconnect")
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def make_command(kind, client, clients, rng, padding):
+    """Builds the command for one generated request, stamped with its send time."""
+    if kind == "history":
+        return "HISTORY:public"
+    text = f"{MARKER} {time.perf_counter_ns()} {padding}"
+    if kind == "private":
+        target = rng.choice(clients)
+        return f"@{target.name}:{text}"
+    if kind == "group":
+        return f"GROUP:{GROUP_NAME}:{text}"
+    return f"@public:{text}"
+
+
+def drive(clients, mix, duration, rate, seed, padding):
+    """
+    Sends the traffic mix from random clients for the given duration.
+
+    Args:
+        clients (list): The connected LoadClient objects.
+        mix (dict): Relative weight per traffic type.
+        duration (float): Seconds to send for.
+        rate (float): Requests per second, 0 for as fast as possible.
+        seed (int): Seed for the choice of clients and traffic types.
+        padding (str): Text appended to every chat message.
+
+    Returns:
+        tuple: Requests sent per traffic type, and the seconds spent sending.
+    """
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    sent = Counter()
+    start = time.perf_counter()
+    next_send = start
+    while time.perf_counter() - start < duration:
+        if rate:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_send += 1 / rate
+        client = rng.choice(clients)
+        kind = rng.choices(kinds, weights)[0]
+        client.send(make_command(kind, client, clients, rng, padding))
+        sent[kind] += 1
+    return sent, time.perf_counter() - start
+
+
+def read_process_status(pid):
+    """
+    Reads a process's resident memory and thread count from /proc.
+
+    Returns:
+        dict | None: 'rss_bytes' and 'threads', or None where /proc is unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    return {
+        "rss_bytes": int(fields["VmRSS"].split()[0]) * 1024,
+        "threads": int(fields["Threads"]),
+    }
+
+
+class ResourceSampler:
+    def __init__(self, pid, interval=SAMPLE_INTERVAL):
+        """Samples a process's RSS and thread count on a background thread."""
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        """Takes samples until stopped."""
+        while not self.stop_event.is_set():
+            status = read_process_status(self.pid)
+            if status is not None:
+                self.samples.append(status)
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        """Starts sampling."""
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops sampling.
+
+        Returns:
+            dict | None: Peak and final RSS and thread count, None without samples.
+        """
+        self.stop_event.set()
+        self.thread.join()
+        if not self.samples:
+            return None
+        return {
+            "peak_rss_bytes": max(s["rss_bytes"] for s in self.samples),
+            "final_rss_bytes": self.samples[-1]["rss_bytes"],
+            "peak_threads": max(s["threads"] for s in self.samples),
+            "final_threads": self.samples[-1]["threads"],
+        }
+
+
+def start_memory_server(host, users):
+    """
+    Starts benchmarks.memory_server in a subprocess and waits until it listens.
+
+    Args:
+        host (str): The address to listen on.
+        users (int): The number of load users to create.
+
+    Returns:
+        tuple: The process and the port it listens on.
+    """
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, STORAGE_BACKEND="memory", HOST=host, PORT=str(port))
+    # Measure the server, not its per-user limits, unless they are set explicitly
+    for kind in RATE_LIMITS:
+        env.setdefault(f"RATE_LIMIT_{kind.upper()}", "0")
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.memory_server",
+            "--users",
+            str(users),
+            "--prefix",
+            USER_PREFIX,
+            "--group",
+            GROUP_NAME,
+        ],
+        env=env,
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("The in-memory server did not start")
+
+
+def setup_storage(names):
+    """
+    Creates the load users and group in the configured storage, with every load
+    user as a member.
+
+    Args:
+        names (list): The usernames the load clients connect as.
+    """
+    from server.shared import storage
+
+    storage.open()
+    for name in names:
+        storage.add_group_member(GROUP_NAME, name)
+
+
+def main():
+    """Connects the load clients, drives the traffic mix and prints JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument(
+        "--rate", type=float, default=200, help="Requests per second, 0 for no limit"
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default="public=70,private=20,group=5,history=5",
+        help="Relative weight of each traffic type",
+    )
+    parser.add_argument("--message-size", type=int, default=64)
+    parser.add_argument(
+        "--drain", type=float, default=2, help="Seconds to wait for late deliveries"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Use a running server on this port")
+    parser.add_argument("--server-pid", type=int, help="PID of the running server")
+    parser.add_argument(
+        "--setup", action="store_true", help="Create the load users in the storage"
+    )
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    args = parser.parse_args()
+
+    names = [f"{USER_PREFIX}{i:04d}" for i in range(args.clients)]
+    server_process = None
+    if args.port is None:
+        server_process, port = start_memory_server(args.host, args.clients)
+        server_pid = server_process.pid
+    else:
+        port, server_pid = args.port, args.server_pid
+        if args.setup:
+            setup_storage(names)
+
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    context.load_verify_locations(os.path.join("certificates", "cert.pem"))
+    stats = LoadStats()
+    sampler = ResourceSampler(server_pid) if server_pid else None
+    clients = []
+    try:
+        if sampler:
+            sampler.start()
+        start = time.perf_counter()
+        for name in names:
+            clients.append(LoadClient(args.host, port, name, context, stats))
+        connect_seconds = time.perf_counter() - start
+
+        padding = "x" * max(0, args.message_size)
+        sent, send_seconds = drive(
+            clients, args.mix, args.duration, args.rate, args.seed, padding
+        )
+        time.sleep(args.drain)
+        server = sampler.stop() if sampler else None
+    finally:
+        for client in clients:
+            client.close()
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+    with stats.lock:
+        delivered = {kind: len(values) for kind, values in stats.latencies.items()}
+        latency = {kind: summarize(values) for kind, values in stats.latencies.items()}
+        history_messages = stats.history_messages
+    result = {
+        "benchmark": "load_generator",
+        "server": "memory" if server_process else f"{args.host}:{port}",
+        "clients": args.clients,
+        "duration": args.duration,
+        "rate": args.rate,
+        "mix": args.mix,
+        "connect_seconds": connect_seconds,
+        "sent": dict(sent),
+        "sent_per_second": sum(sent.values()) / send_seconds,
+        "delivered": delivered,
+        "delivered_per_second": sum(delivered.values()) / send_seconds,
+        "history_messages": history_messages,
+        "latency": latency,
+        "server_resources": server,
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Runs the chat server on the in-memory storage backend, for load generation.
+
+The memory backend starts empty, so the load users are created first and added
+to the load group, then the server starts as `python -m server.server` would.
+Requires STORAGE_BACKEND=memory and the usual HOST and PORT settings.
+
+Usage:
+    STORAGE_BACKEND=memory PORT=65432 python -m benchmarks.memory_server --users 50
+"""
+
+import argparse
+from server.shared import storage
+from server.server import start_server
+
+
+def main():
+    """Creates the load users and group, then runs the server."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--prefix", default="loadgen")
+    parser.add_argument("--group", default="loadgen")
+    args = parser.parse_args()
+
+    if storage.name != "memory":
+        raise SystemExit("Set STORAGE_BACKEND=memory to run the in-memory server")
+    for i in range(args.users):
+        storage.add_group_member(args.group, f"{args.prefix}{i:04d}")
+    start_server()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Measures message search latency with the FULLTEXT index against a LIKE scan.
+
+Runs against the database configured in .env, which must hold the schema from
+the README. With --populate, synthetic users and public messages are added until
+the messages table holds --messages rows, so point DB_NAME at a scratch database.
+
+Usage:
+    python -m benchmarks.message_search --populate --messages 1000000 --output search.json
+"""
+
+import json
+import time
+import random
+import argparse
+from server.database.connection import get_db_connection
+from server.database.mysql_storage import (
+    conversation_query,
+    fulltext_terms,
+    search_query,
+)
+from server.database.storage import MAX_MESSAGE_ID
+from server.shared import SEARCH_PAGE_SIZE
+from benchmarks.stats import summarize
+
+# Frequent words make up most of the text, rare ones are what users search for
+COMMON_WORDS = (
+    "the a to is on at and you we it can check please thanks ok sure later today "
+    "meeting lunch build review release branch deploy coffee"
+).split()
+RARE_WORDS = [f"project{i}" for i in range(2000)]
+INSERT_BATCH_SIZE = 10000
+
+
+def make_message(rng):
+    """Returns a chat-like message with an occasional rare word."""
+    words = [rng.choice(COMMON_WORDS) for _ in range(rng.randint(3, 20))]
+    if rng.random() < 0.2:
+        words.insert(rng.randrange(len(words)), rng.choice(RARE_WORDS))
+    return " ".join(words)
+
+
+def populate(cursor, conn, target, users, seed):
+    """
+    Adds benchmark users and public messages until the messages table holds `target` rows.
+
+    Returns:
+        float: Seconds spent inserting.
+    """
+    rng = random.Random(seed)
+    cursor.executemany(
+        "INSERT IGNORE INTO users (username, password) VALUES (%s, '')",
+        [(f"bench_user{i}",) for i in range(users)],
+    )
+    conn.commit()
+    cursor.execute("SELECT id FROM users WHERE username LIKE 'bench\\_user%'")
+    user_ids = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute("SELECT COUNT(*) FROM messages")
+    missing = target - cursor.fetchone()[0]
+    start = time.perf_counter()
+    while missing > 0:
+        batch = min(INSERT_BATCH_SIZE, missing)
+        cursor.executemany(
+            "INSERT INTO messages (sender_id, message) VALUES (%s, %s)",
+            [(rng.choice(user_ids), make_message(rng)) for _ in range(batch)],
+        )
+        conn.commit()
+        missing -= batch
+    return time.perf_counter() - start
+
+
+def time_query(cursor, query, params):
+    """Runs a query and returns its latency in seconds and the number of rows."""
+    start = time.perf_counter()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    return time.perf_counter() - start, len(rows)
+
+
+def bench(cursor, user_id, words, use_index):
+    """Times one search page per word, either with MATCH ... AGAINST or with LIKE."""
+    samples = []
+    matches = 0
+    for word in words:
+        if use_index:
+            query, params = search_query(
+                "messages",
+                user_id,
+                "public",
+                fulltext_terms(word),
+                MAX_MESSAGE_ID,
+                SEARCH_PAGE_SIZE,
+            )
+        else:
+            query, params = conversation_query("messages", user_id, "public")
+            query += "AND messages.message LIKE %s ORDER BY messages.id DESC LIMIT %s"
+            params += (f"%{word}%", SEARCH_PAGE_SIZE)
+        seconds, rows = time_query(cursor, query, params)
+        samples.append(seconds)
+        matches += rows
+    return {"latency": summarize(samples), "results": matches}
+
+
+def main():
+    """Optionally populates the database, then runs both variants and prints JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--populate", action="store_true", help="Insert messages up to --messages"
+    )
+    parser.add_argument(
+        "--skip-like", action="store_true", help="Only time the indexed search"
+    )
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'messages' "
+            "AND index_type = 'FULLTEXT'"
+        )
+        if not cursor.fetchone()[0]:
+            raise SystemExit("messages has no FULLTEXT index, see the README schema")
+
+        insert_seconds = None
+        if args.populate:
+            insert_seconds = populate(
+                cursor, conn, args.messages, args.users, args.seed
+            )
+        cursor.execute("SELECT COUNT(*) FROM messages")
+        total = cursor.fetchone()[0]
+        cursor.execute("SELECT MIN(id) FROM users")
+        user_id = cursor.fetchone()[0]
+
+        rng = random.Random(args.seed)
+        words = [rng.choice(RARE_WORDS) for _ in range(args.queries)]
+        result = {
+            "benchmark": "message_search",
+            "messages": total,
+            "queries": args.queries,
+            "populate_seconds": insert_seconds,
+            "fulltext": bench(cursor, user_id, words, use_index=True),
+        }
+        if not args.skip_like:
+            result["like_scan"] = bench(cursor, user_id, words, use_index=False)
+    finally:
+        cursor.close()
+        conn.close()
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
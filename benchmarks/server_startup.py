@@ -0,0 +1,103 @@
+"""
+Measures server startup: module import cost and, optionally, the warm-up phases.
+
+Imports are timed in a fresh interpreter with `python -X importtime`, so the
+numbers include every module the server pulls in. With --warm, the database
+pool and startup caches are loaded against the database configured in .env.
+
+Usage:
+    python -m benchmarks.server_startup --runs 5 --warm --output startup.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from benchmarks.stats import summarize
+
+# Imports worth tracking on their own, besides the server's top-level module
+TRACKED_MODULES = (
+    "server.server",
+    "server.network.connection",
+    "server.shared",
+    "server.database.user",
+    "mysql.connector",
+    "bcrypt",
+    "dotenv",
+    "ssl",
+    "concurrent.futures",
+)
+
+
+def import_times(module):
+    """
+    Imports a module in a fresh interpreter and returns cumulative import times.
+
+    Returns:
+        dict: Seconds spent importing each module, including its own imports.
+    """
+    env = dict(os.environ, HOST=os.getenv("HOST", "127.0.0.1"))
+    env.setdefault("PORT", "65432")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def bench_imports(runs):
+    """Times the server import over several fresh interpreters."""
+    samples = {module: [] for module in TRACKED_MODULES}
+    for _ in range(runs):
+        times = import_times("server.server")
+        for module in TRACKED_MODULES:
+            if module in times:
+                samples[module].append(times[module])
+    return {module: summarize(values) for module, values in samples.items() if values}
+
+
+def bench_warm_up():
+    """Runs the server warm-up once and returns the seconds spent per phase."""
+    from server.server import warm_up
+
+    return warm_up()
+
+
+def main():
+    """Runs the import benchmark, optionally the warm-up, and prints JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--warm", action="store_true", help="Also time the database warm-up"
+    )
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    args = parser.parse_args()
+
+    result = {
+        "benchmark": "server_startup",
+        "runs": args.runs,
+        "imports": bench_imports(args.runs),
+    }
+    if args.warm:
+        result["warm_up"] = bench_warm_up()
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
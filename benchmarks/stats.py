@@ -0,0 +1,22 @@
+import statistics
+
+
+def summarize(samples):
+    """
+    Summarizes latency samples in milliseconds.
+
+    Args:
+        samples (list): Latencies in seconds.
+
+    Returns:
+        dict: Count, mean, p50 and p99 in milliseconds.
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+    }
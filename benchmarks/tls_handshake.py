@@ -0,0 +1,157 @@
+"""
+Measures how many TLS connections per second the server accepts in a reconnect storm.
+
+--concurrency threads each open connections back to back until --connections
+have been made. Each one does the TLS handshake and the v2 login handshake,
+then disconnects, as a client reconnecting after a server restart would. With
+--resume every thread offers the TLS session of its previous connection, as
+ClientConnection does on reconnect. Run once with and once without --resume,
+and with CERT_FILE/KEY_FILE pointing at RSA and at ECDSA certificates, to
+compare.
+
+Without --port, the server runs in a subprocess on the in-memory storage backend
+(benchmarks.memory_server) and inherits CERT_FILE, KEY_FILE, HANDSHAKE_WORKERS
+and LISTEN_BACKLOG.
+
+Usage:
+    python -m benchmarks.tls_handshake --connections 2000 --concurrency 100 --resume
+"""
+
+import os
+import ssl
+import json
+import time
+import socket
+import argparse
+import threading
+from server.network import protocol
+from server.network.protocol import Frame, ServerStreamDecoder
+from benchmarks.stats import summarize
+from benchmarks.load_generator import start_memory_server
+
+
+def connect_once(host, port, context, name, session=None):
+    """
+    Opens one connection, logs in and disconnects.
+
+    Returns:
+        tuple: Seconds for the TLS handshake, whether the session was resumed,
+        and the session to offer next time.
+    """
+    raw = socket.create_connection((host, port), timeout=30)
+    started = time.perf_counter()
+    sock = context.wrap_socket(raw, server_hostname=host, session=session)
+    handshake = time.perf_counter() - started
+    try:
+        sock.sendall(protocol.encode_handshake(name))
+        stream = ServerStreamDecoder()
+        while stream.binary is None:
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionResetError("Server closed the connection")
+            stream.feed(data)
+        sock.sendall(Frame(protocol.DISCONNECT, ()).to_bytes())
+        return handshake, sock.session_reused, sock.session
+    finally:
+        sock.close()
+
+
+def run(host, port, context, connections, concurrency, resume):
+    """
+    Makes the connections from `concurrency` threads.
+
+    Returns:
+        dict: Throughput, handshake latency and the share of resumed sessions.
+    """
+    lock = threading.Lock()
+    handshakes = []
+    resumed = []
+    errors = []
+    remaining = [connections]
+
+    def worker(index):
+        session = None
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            try:
+                seconds, reused, new_session = connect_once(
+                    host, port, context, f"tlsbench{index:04d}", session
+                )
+            except (OSError, ssl.SSLError) as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            if resume:
+                session = new_session
+            with lock:
+                handshakes.append(seconds)
+                resumed.append(reused)
+
+    threads = [
+        threading.Thread(target=worker, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "connections": len(handshakes),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": elapsed,
+        "connections_per_second": len(handshakes) / elapsed,
+        "resumed_fraction": sum(resumed) / len(resumed) if resumed else 0,
+        "handshake": summarize(handshakes),
+    }
+
+
+def main():
+    """Runs the reconnect storm and prints JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Use a running server")
+    parser.add_argument("--output", help="Also write the JSON to this file")
+    args = parser.parse_args()
+
+    cert_file = os.getenv("CERT_FILE", os.path.join("certificates", "cert.pem"))
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    context.load_verify_locations(cert_file)
+
+    server_process = None
+    port = args.port
+    if port is None:
+        server_process, port = start_memory_server(args.host, 0)
+    try:
+        report = run(
+            args.host, port, context, args.connections, args.concurrency, args.resume
+        )
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+    result = {
+        "benchmark": "tls_handshake",
+        "certificate": cert_file,
+        "resume": args.resume,
+        "concurrency": args.concurrency,
+        **report,
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Prints the latency of each stage of traced messages, from a server trace file.
+
+Run the server with TRACE_SAMPLE_RATE set (e.g. 0.01 to trace 1 in 100 messages)
+to have it append spans to TRACE_FILE, logs/traces.jsonl by default. Stages are
+'receive' (decoding), 'route' (ID allocation and fan-out), 'persist' (the
+storage write), 'queue' (waiting in a recipient's queue) and 'send'; 'delivered'
+is the time from receipt to the last recipient's send finishing.
+
+Usage:
+    python -m benchmarks.trace_report logs/traces.jsonl [--json]
+"""
+
+import json
+import argparse
+from collections import defaultdict
+from benchmarks.stats import summarize
+
+STAGES = ("receive", "route", "persist", "queue", "send")
+
+
+def read_spans(path):
+    """Returns the spans in a trace file, skipping lines cut off by a crash."""
+    spans = []
+    with open(path) as trace_file:
+        for line in trace_file:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def breakdown(spans):
+    """
+    Summarizes span durations per stage and receipt-to-delivery latency per message.
+
+    Args:
+        spans (list): Span dicts as written by server.tracing.
+
+    Returns:
+        dict: Stage name to the summary of its durations.
+    """
+    durations = defaultdict(list)
+    traces = defaultdict(list)
+    for span in spans:
+        durations[span["stage"]].append((span["end_ns"] - span["start_ns"]) / 1e9)
+        traces[span["trace"]].append(span)
+
+    for trace_spans in traces.values():
+        received = [s["start_ns"] for s in trace_spans if s["stage"] == "receive"]
+        sent = [s["end_ns"] for s in trace_spans if s["stage"] == "send"]
+        if received and sent:
+            durations["delivered"].append((max(sent) - received[0]) / 1e9)
+
+    stages = STAGES + ("delivered",)
+    names = list(stages) + sorted(set(durations) - set(stages))
+    return {name: summarize(durations[name]) for name in names if name in durations}
+
+
+def main():
+    """Reads a trace file and prints the per-stage breakdown."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace_file")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead")
+    args = parser.parse_args()
+
+    spans = read_spans(args.trace_file)
+    report = breakdown(spans)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len({span['trace'] for span in spans})} traced messages")
+    print(f"{'stage':<10} {'count':>8} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, summary in report.items():
+        print(
+            f"{name:<10} {summary['count']:>8} {summary['mean_ms']:>10.3f} "
+            f"{summary['p50_ms']:>10.3f} {summary['p99_ms']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
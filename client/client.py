@@ -1,19 +1,26 @@
 import os
 import sys
 import random
-import logging
-import threading
 from dotenv import load_dotenv
 from PyQt5.QtWidgets import QApplication, QDialog
 from PyQt5.QtCore import pyqtSignal, QObject
-from PyQt5.QtMultimedia import QSound
-from logging.handlers import RotatingFileHandler
 from client.ui.chat_client_ui import ChatClientUI
 from client.ui.login_dialog import LoginDialog
+from client.ui.update_scheduler import NotificationDebouncer
+from client.ui.notification_player import NotificationPlayer
 from server.database.user import logout_user
+from server.logging_setup import configure_logging
 from client.ui.chat_management import set_target_client
 from client.network.connection import ClientConnection
+from client.network.async_connection import AsyncClientConnection
+from client.network.reconnect import (
+    ReconnectSupervisor,
+    CONNECTED,
+    DISCONNECTED,
+    FAILED,
+)
 from client.handlers.message_broadcast import MessageHandler
+from client.handlers.message_decoder import ChatRecord
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,25 +28,20 @@ load_dotenv()
 # Server configuration from environment variables
 HOST = os.getenv("HOST")
 PORT = int(os.getenv("PORT"))
-
-# Create logs folder if it doesn't exist
-if not os.path.exists("logs"):
-    os.makedirs("logs")
-
-# Configure logging with rotation to avoid oversized logs
-log_handler = RotatingFileHandler("logs/client.log", maxBytes=5000000, backupCount=5)
-logging.basicConfig(
-    handlers=[log_handler],
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+# Client transport: "socket" (blocking SSL socket) or "asyncio"
+CLIENT_TRANSPORT = os.getenv("CLIENT_TRANSPORT", "socket")
+# Wire protocol offered to the server: 2 (binary frames) or 1 (text only)
+CLIENT_PROTOCOL = int(os.getenv("CLIENT_PROTOCOL", "2"))
 
 
 class ChatClient(QObject):
     # Define custom signals for communication between components
-    new_message_signal = pyqtSignal(str, str, str)
-    display_message_signal = pyqtSignal(str, str, str)
+    new_message_signal = pyqtSignal(object)
+    display_message_signal = pyqtSignal(object)
     connection_status_signal = pyqtSignal(bool)
+    connection_state_signal = pyqtSignal(str)
+    reconnected_signal = pyqtSignal()
+    search_results_signal = pyqtSignal(object)
 
     def __init__(self, host, port, ui, client_name):
         """
@@ -54,7 +56,14 @@ class ChatClient(QObject):
         super().__init__()
         self.ui = ui
         self.client_name = client_name
-        self.connection = ClientConnection(host, port, client_name)
+        if CLIENT_TRANSPORT == "asyncio":
+            self.connection = AsyncClientConnection(
+                host, port, client_name, CLIENT_PROTOCOL
+            )
+        else:
+            self.connection = ClientConnection(host, port, client_name, CLIENT_PROTOCOL)
+        self.notification_debouncer = NotificationDebouncer()
+        self.notification_player = NotificationPlayer()  # Loads the sound once
         self.message_handler = MessageHandler(
             ui, client_name, self
         )  # Pass self to MessageHandler
@@ -65,23 +74,44 @@ class ChatClient(QObject):
             self.play_notification_sound
         )  # Connect the signal to the method
         self.display_message_signal.connect(self.ui.display_message)
+        self.search_results_signal.connect(self.ui.show_search_results)
 
+        self.has_connected = False  # Set once the first connection is made
         self.connect_to_server()
 
     def connect_to_server(self):
-        """Attempts to connect to the server and starts the message receiving thread."""
-        if self.connection.connect_to_server():
+        """Starts the background supervisor that connects, receives and reconnects."""
+        self.supervisor = ReconnectSupervisor(
+            self.connection,
+            self.receive_messages,
+            self.handle_connection_state,
+            self.connection.max_reconnect_attempts,
+        )
+        self.supervisor.start()
+
+    def handle_connection_state(self, state):
+        """Reports connection state changes from the supervisor thread to the UI.
+
+        Args:
+            state (str): One of the states defined in client.network.reconnect.
+        """
+        self.connection_state_signal.emit(state)
+        if state == CONNECTED:
             self.connection_status_signal.emit(True)  # Emit connection status signal
-            threading.Thread(
-                target=self.receive_messages, daemon=True
-            ).start()  # Start a thread to receive messages
-        else:
+            if self.has_connected:
+                self.reconnected_signal.emit()
+            self.has_connected = True
+        elif state in (DISCONNECTED, FAILED):
+            self.connection_status_signal.emit(False)  # Emit connection status signal
+        if state == FAILED:
             self.display_message_signal.emit(
-                f"Failed to connect after {self.connection.max_reconnect_attempts} attempts",
-                "general",
-                "left",
+                ChatRecord(
+                    "general",
+                    None,
+                    f"Failed to connect after {self.connection.max_reconnect_attempts} attempts",
+                    "left",
+                )
             )
-            self.connection_status_signal.emit(False)  # Emit connection status signal
 
     def receive_messages(self):
         """Receives messages from the server and processes them."""
@@ -104,20 +134,25 @@ class ChatClient(QObject):
         """
         set_target_client(self, target_client)
 
-    def play_notification_sound(self, message, message_type, alignment):
+    def play_notification_sound(self, record):
         """Plays a notification sound for new messages.
 
         Args:
-            message (str): The received message.
-            message_type (str): The type of the message.
-            alignment (str): The alignment of the message (left or right).
+            record (ChatRecord): The decoded message that was received.
         """
-        # Play sound only for received messages, not history
-        if alignment == "left" and message_type != "history":
-            QSound.play(os.path.join(os.getcwd(), "notification.wav"))
+        # Play sound only for received messages, not history, and debounce floods
+        if (
+            record.alignment == "left"
+            and record.message_type != "history"
+            and self.notification_debouncer.should_notify(
+                record.highlight or record.sender
+            )
+        ):
+            self.notification_player.play()
 
     def close_connection(self):
         """Closes the connection to the server and logs out the user."""
+        self.supervisor.stop()  # Don't reconnect after an intentional close
         self.connection.close_connection()  # Close the client connection
         logout_user(self.client_name)  # Log out the user
         QApplication.instance().quit()  # Quit the application
@@ -125,6 +160,7 @@ class ChatClient(QObject):
 
 def main():
     """Main function to start the chat client application."""
+    configure_logging(os.path.join("logs", "client.log"))
     app = QApplication(sys.argv)
 
     login_dialog = LoginDialog()
@@ -146,6 +182,12 @@ def main():
     ui.client_selected_signal.connect(
         client.set_target_client
     )  # Connect UI signal to set target client
+    client.connection_state_signal.connect(
+        ui.show_connection_state
+    )  # Show reconnects in the window title
+    client.reconnected_signal.connect(
+        ui.reload_current_chat
+    )  # Catch up on the open chat's missed messages
 
     ui.show()  # Show the UI
     app.aboutToQuit.connect(
@@ -1,5 +1,10 @@
 import logging
-from server.database.user import register_user, login_user
+from PyQt5.QtCore import QThreadPool, QTimer
+from server.database.user import register_user, login_user, logout_user
+from client.handlers.auth_worker import AuthTask
+
+# Milliseconds to wait for a login or registration before reporting a timeout
+AUTH_TIMEOUT_MS = 15000
 
 
 class AuthHandler:
@@ -11,19 +16,131 @@ class AuthHandler:
             login_dialog: The dialog interface for user login and registration.
         """
         self.login_dialog = login_dialog
+        self.thread_pool = QThreadPool.globalInstance()
+        self.request_id = 0  # Incremented per request so stale results are ignored
+        self.active_request = None  # Id of the request the dialog is waiting for
+        self.active_kind = None  # 'login' or 'register'
+        self.pending_username = None
+        self.timeout_timer = QTimer()
+        self.timeout_timer.setSingleShot(True)
+        self.timeout_timer.timeout.connect(self.handle_timeout)
+
+    def start_request(self, kind, func, *args, **kwargs):
+        """
+        Runs a blocking authentication call on the thread pool and marks the dialog busy.
+
+        Args:
+            kind (str): 'login' or 'register'.
+            func: The blocking function to run.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+        """
+        self.request_id += 1
+        self.active_request = self.request_id
+        self.active_kind = kind
+
+        task = AuthTask(self.request_id, func, *args, **kwargs)
+        if kind == "login":
+            task.signals.finished.connect(self.on_login_finished)
+        else:
+            task.signals.finished.connect(self.on_register_finished)
+        task.signals.failed.connect(self.on_request_failed)
+
+        self.login_dialog.set_busy(
+            True, "Signing in..." if kind == "login" else "Registering..."
+        )
+        self.timeout_timer.start(AUTH_TIMEOUT_MS)
+        self.thread_pool.start(task)
+
+    def finish_request(self, request_id):
+        """
+        Clears the busy state if the result belongs to the request being waited for.
+
+        Args:
+            request_id (int): The id of the finished request.
+
+        Returns:
+            bool: True if the result should be applied, False if it is stale.
+        """
+        if request_id != self.active_request:
+            return False
+        self.active_request = None
+        self.timeout_timer.stop()
+        self.login_dialog.set_busy(False)
+        return True
+
+    def cancel(self):
+        """Stops waiting for the current request; its result will be discarded."""
+        if self.active_request is None:
+            return
+        logging.info(f"{self.active_kind.capitalize()} cancelled by the user.")
+        self.finish_request(self.active_request)
+        self.show_message("Cancelled.", "grey")
+
+    def handle_timeout(self):
+        """Gives up on a request that did not complete within AUTH_TIMEOUT_MS."""
+        if self.active_request is None:
+            return
+        logging.warning(f"{self.active_kind.capitalize()} timed out.")
+        self.finish_request(self.active_request)
+        self.show_message("Server is not responding,\nplease try again.", "red")
+
+    def show_message(self, text, color):
+        """
+        Shows a feedback message on the page the current request was made from.
+
+        Args:
+            text (str): The message to show.
+            color (str): The CSS color of the message.
+        """
+        if self.active_kind == "register":
+            label = self.login_dialog.register_message_label
+        else:
+            label = self.login_dialog.login_message_label
+        label.setText(text)
+        label.setStyleSheet(f"color: {color}")
+
+    def on_request_failed(self, request_id, error):
+        """
+        Reports an unexpected error raised by an authentication task.
+
+        Args:
+            request_id (int): The id of the failed request.
+            error (str): The error description.
+        """
+        if not self.finish_request(request_id):
+            return
+        self.show_message("Something went wrong,\nplease try again.", "red")
 
     def handle_login(self):
         """
-        Handles the login process by retrieving the username and password,
-        authenticating the user, and updating the dialog interface accordingly.
+        Handles the login process by retrieving the username and password and
+        authenticating the user on a worker thread.
         """
         username = self.login_dialog.login_username.text()
         password = self.login_dialog.login_password.text()
 
         logging.info("Login attempt made.")
 
-        # login_user now returns the case-preserved username
-        original_username = login_user(username, password)
+        self.pending_username = username
+        self.start_request("login", login_and_measure, username, password)
+
+    def on_login_finished(self, request_id, result):
+        """
+        Applies the result of a login attempt and updates the dialog accordingly.
+
+        Args:
+            request_id (int): The id of the finished request.
+            result (tuple): The case-preserved username (or False) and the phase timings.
+        """
+        original_username, timings = result
+        if not self.finish_request(request_id):
+            if original_username:
+                # The user gave up waiting, undo the login that completed meanwhile
+                self.thread_pool.start(
+                    AuthTask(request_id, logout_user, original_username)
+                )
+            return
 
         if original_username:
             # Store the original case-preserved username on successful login
@@ -37,12 +154,12 @@ class AuthHandler:
             self.login_dialog.login_message_label.setStyleSheet("color: red")
             self.login_dialog.login_username.setText("")
             self.login_dialog.login_password.setText("")
-            logging.warning(f"Login failed for user: {original_username}.")
+            logging.warning(f"Login failed for user: {self.pending_username}.")
 
     def handle_register(self):
         """
-        Handles user registration by validating the input and attempting to register the new user.
-        Displays messages based on the success or failure of the registration attempt.
+        Handles user registration by validating the input and attempting to register
+        the new user on a worker thread.
         """
         username = self.login_dialog.register_username.text()
         password = self.login_dialog.register_password.text()
@@ -74,20 +191,52 @@ class AuthHandler:
             self.login_dialog.confirm_password.setText("")
             logging.warning("Registration failed: passwords do not match.")
         else:
-            if register_user(username, password):
-                logging.info("Registration successful.")
-                self.login_dialog.register_message_label.setText(
-                    "Successful registration."
-                )
-                self.login_dialog.register_message_label.setStyleSheet("color: green")
-                self.login_dialog.switch_to_login()
-                self.login_dialog.login_username.setText(username)
-            else:
-                logging.warning("Registration failed: username might be taken.")
-                self.login_dialog.register_message_label.setText(
-                    "Username might be taken."
-                )
-                self.login_dialog.register_message_label.setStyleSheet("color: red")
-                self.login_dialog.register_username.setText("")
-                self.login_dialog.register_password.setText("")
-                self.login_dialog.confirm_password.setText("")
+            self.pending_username = username
+            self.start_request("register", register_user, username, password)
+
+    def on_register_finished(self, request_id, registered):
+        """
+        Applies the result of a registration attempt.
+
+        Args:
+            request_id (int): The id of the finished request.
+            registered (bool): True if the user was registered.
+        """
+        if not self.finish_request(request_id):
+            return
+
+        if registered:
+            logging.info("Registration successful.")
+            self.login_dialog.register_message_label.setText("Successful registration.")
+            self.login_dialog.register_message_label.setStyleSheet("color: green")
+            self.login_dialog.switch_to_login()
+            self.login_dialog.login_username.setText(self.pending_username)
+        else:
+            logging.warning("Registration failed: username might be taken.")
+            self.login_dialog.register_message_label.setText("Username might be taken.")
+            self.login_dialog.register_message_label.setStyleSheet("color: red")
+            self.login_dialog.register_username.setText("")
+            self.login_dialog.register_password.setText("")
+            self.login_dialog.confirm_password.setText("")
+
+
+def login_and_measure(username, password):
+    """
+    Runs login_user and logs how long each phase took. Called on a worker thread.
+
+    Args:
+        username (str): The username of the user trying to log in.
+        password (str): The password of the user trying to log in.
+
+    Returns:
+        tuple: The result of login_user and the phase timings in seconds.
+    """
+    timings = {}
+    result = login_user(username, password, timings)
+    logging.info(
+        "Login timings: "
+        + ", ".join(
+            f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in timings.items()
+        )
+    )
+    return result, timings
@@ -0,0 +1,38 @@
+import logging
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class AuthSignals(QObject):
+    # Emitted with the request id and the return value of the task
+    finished = pyqtSignal(int, object)
+    # Emitted with the request id and an error description
+    failed = pyqtSignal(int, str)
+
+
+class AuthTask(QRunnable):
+    def __init__(self, request_id, func, *args, **kwargs):
+        """
+        Wraps a blocking authentication call so it can run on a QThreadPool.
+
+        Args:
+            request_id (int): Identifies the request, so stale results can be ignored.
+            func: The blocking function to call, e.g. login_user or register_user.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+        """
+        super().__init__()
+        self.request_id = request_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = AuthSignals()
+
+    def run(self):
+        """Runs the wrapped call on a worker thread and reports the outcome via signals."""
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            logging.error(f"Authentication task failed: {e}")
+            self.signals.failed.emit(self.request_id, str(e))
+        else:
+            self.signals.finished.emit(self.request_id, result)
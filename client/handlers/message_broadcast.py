@@ -1,4 +1,11 @@
-import logging
+from server.network.protocol import Frame
+from client.handlers.message_decoder import (
+    MessageDecoder,
+    CLIENT_LIST,
+    ALL_USERS,
+    CHAT,
+    SEARCH_RESULTS,
+)
 
 
 class MessageHandler:
@@ -14,57 +21,75 @@ class MessageHandler:
         self.ui = ui
         self.client_name = client_name
         self.chat_client = chat_client
+        self.decoder = MessageDecoder(client_name)
+        # Map each record kind to the method that hands it to the UI
+        self.handlers = {
+            CLIENT_LIST: self.handle_client_list,
+            ALL_USERS: self.handle_client_list,
+            CHAT: self.handle_chat,
+            SEARCH_RESULTS: self.handle_search_results,
+        }
 
     def process_message(self, message):
         """
-        Processes incoming messages and updates the UI or chat client accordingly.
+        Decodes incoming data into typed records and dispatches them to their handlers.
+
+        This runs on the receive thread, so the UI only receives ready-to-render records.
+
+        Args:
+            message (Frame | str): A binary frame, or text data that may hold several
+                newline-separated text-protocol frames.
+        """
+        if isinstance(message, Frame):
+            self.dispatch(self.decoder.decode_frame(message))
+            return
+        for frame in message.split("\n"):
+            if frame:
+                self.dispatch(self.decoder.decode(frame))
+
+    def dispatch(self, record):
+        """
+        Hands a decoded record to the handler registered for its kind.
+
+        Args:
+            record (ClientListRecord | ChatRecord | list | None): The record, or a list
+                of records from a history batch; None is ignored.
+        """
+        if isinstance(record, list):
+            for item in record:
+                self.handlers[item.kind](item)
+        elif record is not None:
+            self.handlers[record.kind](record)
+
+    def handle_client_list(self, record):
+        """
+        Updates the sidebar with a decoded list of users.
 
         Args:
-            message (str): The incoming message to be processed.
+            record (ClientListRecord): The decoded user list.
         """
-        logging.info(f"Processing message for {self.client_name}.")
+        self.ui.update_client_list_signal.emit(record.clients)
 
-        if message.startswith("CLIENT_LIST:"):
-            client_list = message[len("CLIENT_LIST:") :].split(",")
-            # Avoid duplicates by normalizing the list to lowercase
-            unique_clients = {client.lower(): client for client in client_list}
-            client_list = list(unique_clients.values())  # Use the case-preserved values
-            client_list.remove(self.client_name)  # Don't include the current client
-            self.ui.update_client_list_signal.emit(client_list)
-        elif message.startswith("ALL_USERS:"):
-            all_users = message[len("ALL_USERS:") :].split(",")
-            self.ui.update_client_list_signal.emit(all_users)
-        elif message.startswith("PRIVATE:"):
-            sender, msg = message[len("PRIVATE:") :].split(":", 1)
-            alignment = "left" if sender != self.client_name else "right"
-            self.chat_client.new_message_signal.emit(
-                f"{sender}: {msg}", "private", alignment
-            )
-            if (
-                sender != self.client_name
-            ):  # Only highlight if the message is from someone else
-                self.ui.highlight_chat_tab(sender)
-        elif message.startswith("GROUP:"):
-            group, sender, msg = message[len("GROUP:") :].split(":", 2)
-            alignment = "left" if sender != self.client_name else "right"
-            self.chat_client.new_message_signal.emit(
-                f"{sender} in {group}: {msg}", "group", alignment
-            )
-            if group != self.ui.current_chat:
-                self.ui.highlight_chat_tab(group)
-        elif message.startswith("HISTORY:"):
-            _, sender, msg = message.split(":", 2)
-            alignment = "right" if sender == "ME" else "left"
-            self.chat_client.display_message_signal.emit(
-                f"{sender}: {msg}", "history", alignment
-            )
-        elif message.startswith("PUBLIC:"):
-            sender, msg = message[len("PUBLIC:") :].split(":", 1)
-            alignment = "left" if sender != self.client_name else "right"
-            self.chat_client.new_message_signal.emit(
-                f"{sender}: {msg}", "public", alignment
-            )
-            if self.ui.current_chat != "All":
-                self.ui.highlight_chat_tab("All")
+    def handle_chat(self, record):
+        """
+        Hands a decoded chat message to the UI.
+
+        History is displayed without notifications; live messages also trigger the
+        notification sound and unread highlighting.
+
+        Args:
+            record (ChatRecord): The decoded chat message.
+        """
+        if record.message_type == "history":
+            self.chat_client.display_message_signal.emit(record)
         else:
-            logging.debug(f"Unhandled message: {message}")
+            self.chat_client.new_message_signal.emit(record)
+
+    def handle_search_results(self, record):
+        """
+        Hands a page of search results to the UI, which shows them without notifications.
+
+        Args:
+            record (SearchResultsRecord): The decoded search results.
+        """
+        self.chat_client.search_results_signal.emit(record)
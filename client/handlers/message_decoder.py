@@ -0,0 +1,326 @@
+import logging
+from server.network import protocol
+
+# Record kinds used to dispatch decoded messages to their handlers
+CLIENT_LIST = "client_list"
+ALL_USERS = "all_users"
+CHAT = "chat"
+SEARCH_RESULTS = "search_results"
+
+# Text-protocol lines that together carry one page of search results
+SEARCH_RESULT_LINE = "search_result_line"
+SEARCH_END_LINE = "search_end_line"
+
+
+class ClientListRecord:
+    """A decoded list of usernames for the sidebar."""
+
+    __slots__ = ("kind", "clients")
+
+    def __init__(self, kind, clients):
+        """
+        Initializes the record.
+
+        Args:
+            kind (str): Either CLIENT_LIST (connected users) or ALL_USERS (registered users).
+            clients (list): The usernames carried by the message.
+        """
+        self.kind = kind
+        self.clients = clients
+
+
+class ChatRecord:
+    """A decoded chat message, ready to be rendered by the UI without further parsing."""
+
+    __slots__ = (
+        "kind",
+        "message_type",
+        "sender",
+        "content",
+        "alignment",
+        "initials",
+        "highlight",
+        "message_id",
+        "timestamp",
+        "conversation",
+    )
+
+    def __init__(
+        self,
+        message_type,
+        sender,
+        content,
+        alignment,
+        highlight=None,
+        message_id=0,
+        timestamp=0,
+        conversation=None,
+    ):
+        """
+        Initializes the record.
+
+        Args:
+            message_type (str): 'public', 'private', 'group', 'history' or 'general'.
+            sender (str | None): The sender's username, or None for local notices.
+            content (str): The message text to show in the bubble.
+            alignment (str): 'left' for received messages, 'right' for our own.
+            highlight (str | None): The sidebar name to mark as unread, if any.
+            message_id (int): The server-assigned ID, 0 for text-protocol and local messages.
+            timestamp (int): The server timestamp in milliseconds, 0 if unknown.
+            conversation (str | None): The chat a history record belongs to, None
+                if the server did not say.
+        """
+        self.kind = CHAT
+        self.message_type = message_type
+        self.sender = sender
+        self.content = content
+        self.alignment = alignment
+        self.initials = sender[:2].upper() if sender else ""
+        self.highlight = highlight
+        self.message_id = message_id
+        self.timestamp = timestamp
+        self.conversation = conversation
+
+
+class SearchResultsRecord:
+    """A decoded page of search results."""
+
+    __slots__ = ("kind", "conversation", "query", "results", "next_before_id")
+
+    def __init__(self, conversation, query, results, next_before_id=0):
+        """
+        Initializes the record.
+
+        Args:
+            conversation (str): The conversation that was searched.
+            query (str): The searched text.
+            results (list): ChatRecord objects of type 'search', newest first.
+            next_before_id (int): The before ID of the next page, 0 on the last page.
+        """
+        self.kind = SEARCH_RESULTS
+        self.conversation = conversation
+        self.query = query
+        self.results = results
+        self.next_before_id = next_before_id
+
+
+class MessageDecoder:
+    def __init__(self, client_name):
+        """
+        Initializes the decoder for the given client.
+
+        Args:
+            client_name (str): The name of the client, used to resolve alignment.
+        """
+        self.client_name = client_name
+        self.history_chat = None  # The chat named by the last HISTORY_START
+        self.search_lines = []  # Text-protocol search results awaiting their SEARCH_END
+        # Map each frame type to the function that builds its record from the fields
+        self.builders = {
+            protocol.CLIENT_LIST: self.build_client_list,
+            protocol.ALL_USERS: self.build_all_users,
+            protocol.PRIVATE: self.build_private,
+            protocol.GROUP: self.build_group,
+            protocol.HISTORY_START: self.start_history,
+            protocol.HISTORY: self.build_history,
+            protocol.HISTORY_BATCH: self.build_history_batch,
+            protocol.SEARCH_RESULTS: self.build_search_results,
+            SEARCH_RESULT_LINE: self.collect_search_result,
+            SEARCH_END_LINE: self.build_search_end,
+            protocol.PUBLIC: self.build_public,
+        }
+        # Map each text-protocol prefix to its frame type and field parser
+        self.text_parsers = {
+            "CLIENT_LIST": (protocol.CLIENT_LIST, self.parse_list),
+            "ALL_USERS": (protocol.ALL_USERS, self.parse_list),
+            "PRIVATE": (protocol.PRIVATE, self.parse_private),
+            "GROUP": (protocol.GROUP, self.parse_group),
+            "HISTORY_START": (protocol.HISTORY_START, self.parse_chat),
+            "HISTORY": (protocol.HISTORY, self.parse_history),
+            "PUBLIC": (protocol.PUBLIC, self.parse_public),
+            "SEARCH_RESULT": (SEARCH_RESULT_LINE, self.parse_search_result),
+            "SEARCH_END": (SEARCH_END_LINE, self.parse_search_end),
+        }
+
+    def decode(self, frame):
+        """
+        Decodes a single text-protocol frame into a typed record.
+
+        Args:
+            frame (str): The frame received from the server, e.g. 'PUBLIC:Bob: hi'.
+
+        Returns:
+            ClientListRecord | ChatRecord | None: The decoded record, or None if the
+            frame is not recognised or malformed.
+        """
+        prefix, separator, payload = frame.partition(":")
+        parser = self.text_parsers.get(prefix)
+        if parser is None or not separator:
+            logging.debug("Unhandled message: %s", frame)
+            return None
+        frame_type, parse = parser
+        try:
+            return self.builders[frame_type](parse(payload))
+        except ValueError:
+            logging.debug("Malformed %s message", prefix)
+            return None
+
+    def decode_frame(self, frame):
+        """
+        Decodes a binary protocol frame into a typed record.
+
+        Args:
+            frame (Frame): The frame received from the server.
+
+        Returns:
+            ClientListRecord | ChatRecord | list | None: The decoded record, a list of
+            records for a history batch, or None if the frame type is not handled or
+            has missing fields.
+        """
+        builder = self.builders.get(frame.frame_type)
+        if builder is None:
+            if frame.frame_type == protocol.ERROR:
+                logging.warning("Server reported an error: %s", frame.fields)
+            else:
+                logging.debug("Unhandled frame type: %s", frame.frame_type)
+            return None
+        try:
+            record = builder(frame.fields)
+        except ValueError:
+            logging.debug("Malformed frame of type %s", frame.frame_type)
+            return None
+        if isinstance(record, ChatRecord):
+            record.message_id = frame.message_id
+            record.timestamp = frame.timestamp
+        elif isinstance(record, SearchResultsRecord):
+            record.next_before_id = frame.message_id
+        return record
+
+    def alignment_for(self, sender):
+        """Returns 'right' for our own messages and 'left' for everyone else's."""
+        return "right" if sender == self.client_name else "left"
+
+    def parse_list(self, payload):
+        """Parses '<user>,<user>,...' into one field per user."""
+        return payload.split(",")
+
+    def parse_chat(self, payload):
+        """Parses '<chat>', which may itself contain ':' as in 'group:<name>'."""
+        return (payload,)
+
+    def parse_private(self, payload):
+        """Parses '<sender>:<message>'; the text protocol does not carry the recipient."""
+        sender, msg = payload.split(":", 1)
+        return sender, "", msg
+
+    def parse_group(self, payload):
+        """Parses '<group>:<sender>:<message>'."""
+        return payload.split(":", 2)
+
+    def parse_history(self, payload):
+        """Parses '<sender>:<message>', where our own messages use 'ME'."""
+        sender, msg = payload.split(":", 1)
+        return (self.client_name if sender == "ME" else sender), msg
+
+    def parse_public(self, payload):
+        """Parses '<sender>: <message>'."""
+        sender, msg = payload.split(":", 1)
+        if msg.startswith(" "):
+            msg = msg[1:]  # The server separates sender and text with ': '
+        return sender, msg
+
+    def parse_search_result(self, payload):
+        """Parses '<id>:<sender>:<message>', one text-protocol line per result."""
+        message_id, sender, msg = payload.split(":", 2)
+        return message_id, "0", sender, msg
+
+    def parse_search_end(self, payload):
+        """Parses '<next before id>:<conversation>:<query>', which ends a page of results."""
+        next_before_id, _, search = payload.partition(":")
+        return (next_before_id,) + protocol.split_search(search)
+
+    def build_client_list(self, fields):
+        """Builds the connected-users record without the current client."""
+        # Avoid duplicates by normalizing the list to lowercase
+        unique_clients = {client.lower(): client for client in fields}
+        unique_clients.pop(self.client_name.lower(), None)
+        return ClientListRecord(CLIENT_LIST, list(unique_clients.values()))
+
+    def build_all_users(self, fields):
+        """Builds the registered-users record."""
+        return ClientListRecord(ALL_USERS, list(fields))
+
+    def build_private(self, fields):
+        """Builds a private message record from (sender, recipient, message)."""
+        sender, _, msg = fields
+        highlight = sender if sender != self.client_name else None
+        return ChatRecord("private", sender, msg, self.alignment_for(sender), highlight)
+
+    def build_group(self, fields):
+        """Builds a group message record from (group, sender, message)."""
+        group, sender, msg = fields
+        return ChatRecord(
+            "group", f"{sender} in {group}", msg, self.alignment_for(sender), group
+        )
+
+    def start_history(self, fields):
+        """Notes the chat whose history follows; there is nothing to display."""
+        (self.history_chat,) = fields
+        return None
+
+    def build_history(self, fields):
+        """Builds a history record from (sender, message)."""
+        sender, msg = fields
+        return ChatRecord(
+            "history",
+            sender,
+            msg,
+            self.alignment_for(sender),
+            conversation=self.history_chat,
+        )
+
+    def build_history_batch(self, fields):
+        """Builds one history record per (id, timestamp, sender, message) in a batch."""
+        if len(fields) % 4:
+            raise ValueError("history batch has an incomplete message")
+        return [
+            ChatRecord(
+                "history",
+                sender,
+                msg,
+                self.alignment_for(sender),
+                message_id=int(message_id),
+                timestamp=int(timestamp),
+                conversation=self.history_chat,
+            )
+            for message_id, timestamp, sender, msg in zip(
+                fields[::4], fields[1::4], fields[2::4], fields[3::4]
+            )
+        ]
+
+    def build_search_results(self, fields):
+        """Builds a search results record from (conversation, query, results...)."""
+        conversation, query = fields[:2]
+        results = self.build_history_batch(fields[2:])
+        for record in results:
+            record.message_type = "search"
+            record.conversation = conversation
+        return SearchResultsRecord(conversation, query, results)
+
+    def collect_search_result(self, fields):
+        """Holds a text-protocol search result until the SEARCH_END of its page."""
+        self.search_lines.extend(fields)
+        return None
+
+    def build_search_end(self, fields):
+        """Builds the page of search results collected since the previous SEARCH_END."""
+        next_before_id, conversation, query = fields
+        results, self.search_lines = self.search_lines, []
+        record = self.build_search_results([conversation, query] + results)
+        record.next_before_id = int(next_before_id)
+        return record
+
+    def build_public(self, fields):
+        """Builds a public message record from (sender, message)."""
+        sender, msg = fields
+        return ChatRecord("public", sender, msg, self.alignment_for(sender), "All")
@@ -0,0 +1,235 @@
+import ssl
+import queue
+import asyncio
+import logging
+import threading
+from server.network import protocol
+from server.network.protocol import ServerStreamDecoder
+from client.network.connection import CERT_FILE
+
+# Seconds to wait for the TCP and TLS handshake before an attempt is considered failed
+CONNECT_TIMEOUT = 10
+# Queued outgoing bytes above which a warning is logged; sends are never blocked
+WRITE_QUEUE_WARNING_BYTES = 1024 * 1024
+
+
+class AsyncClientConnection:
+    def __init__(
+        self, host, port, client_name, protocol_version=protocol.PROTOCOL_VERSION
+    ):
+        """
+        Initializes an asyncio-based connection with the same interface as ClientConnection.
+
+        The asyncio event loop runs on a dedicated daemon thread, so the Qt event loop
+        is never blocked by connects, sends or network back-pressure.
+
+        Args:
+            host (str): The server host address.
+            port (int): The server port.
+            client_name (str): The name of the client.
+            protocol_version (int): 2 to negotiate binary frames, 1 for the text protocol only.
+        """
+        self.host = host
+        self.port = port
+        self.client_name = client_name
+        self.context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        self.context.load_verify_locations(
+            CERT_FILE
+        )  # Load SSL certificate for verification
+        self.stop_event = threading.Event()
+        self.connected = False
+        self.reconnect_attempt = 0
+        self.max_reconnect_attempts = 8  # Consecutive failures before giving up
+        self.protocol_version = protocol_version
+        self.stream = ServerStreamDecoder()
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(
+            target=self.loop.run_forever, name="client-asyncio", daemon=True
+        )
+        self.loop_thread.start()
+
+        self.writer = None
+        self.write_queue = None  # asyncio.Queue of encoded messages, loop thread only
+        self.queued_bytes = 0
+        self.tasks = []
+        self.incoming = (
+            queue.Queue()
+        )  # Received text for receive_messages, None ends it
+
+    def connect_to_server(self):
+        """
+        Makes a single attempt to connect to the server with SSL encryption.
+
+        Blocks the calling (supervisor) thread, never the Qt thread.
+
+        Returns:
+            bool: True if the connection was successful, False otherwise.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.open(), self.loop)
+        try:
+            future.result(CONNECT_TIMEOUT + 1)
+        except Exception as e:
+            future.cancel()
+            logging.warning(
+                f"Connection attempt {self.reconnect_attempt + 1} failed: {str(e)}"
+            )
+            self.reconnect_attempt += 1
+            return False
+
+        logging.info(f"SSL connection established to server {self.host}:{self.port}.")
+        self.reconnect_attempt = 0
+        return True
+
+    async def open(self):
+        """Opens the TLS stream, sends the client name and starts the reader and writer tasks."""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host, self.port, ssl=self.context, server_hostname=self.host
+            ),
+            CONNECT_TIMEOUT,
+        )
+        try:
+            await self.negotiate(reader, writer)
+        except BaseException:
+            # Includes cancellation by connect_to_server's timeout
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), CONNECT_TIMEOUT)
+            except Exception:
+                pass  # The stream already failed, the original error is raised
+            raise
+
+        self.writer = writer
+        self.write_queue = asyncio.Queue()
+        self.queued_bytes = 0
+        self.tasks = [
+            asyncio.ensure_future(self.read_loop(reader)),
+            asyncio.ensure_future(self.write_loop(writer, self.write_queue)),
+        ]
+        self.stop_event.clear()
+        self.connected = True
+
+    async def negotiate(self, reader, writer):
+        """Sends the client name and waits for the first bytes, which show the server's protocol."""
+        self.stream = ServerStreamDecoder()
+        self.incoming = queue.Queue()
+        if self.protocol_version < protocol.PROTOCOL_VERSION:
+            writer.write(self.client_name.encode())  # Text protocol only
+            self.stream.binary = False
+        else:
+            writer.write(protocol.encode_handshake(self.client_name))
+        await writer.drain()
+
+        # The server's first bytes show which protocol it speaks
+        while self.stream.binary is None:
+            data = await asyncio.wait_for(reader.read(4096), CONNECT_TIMEOUT)
+            if not data:
+                raise ConnectionResetError("Server closed the connection")
+            for message in self.stream.feed(data):
+                self.incoming.put(message)
+
+    async def read_loop(self, reader):
+        """Reads from the server and hands decoded messages to receive_messages."""
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    raise ConnectionResetError("Server closed the connection")
+                for message in self.stream.feed(data):
+                    self.incoming.put(message)
+        except asyncio.CancelledError:
+            pass
+        except (ConnectionResetError, OSError, protocol.ProtocolError) as e:
+            logging.info(f"Connection lost: {e}")
+        finally:
+            self.on_connection_lost()
+
+    async def write_loop(self, writer, write_queue):
+        """Writes queued messages in order, one at a time, until cancelled."""
+        try:
+            while True:
+                data = await write_queue.get()
+                writer.write(data)
+                await writer.drain()  # Back-pressure is absorbed here, off the UI thread
+                self.queued_bytes -= len(data)
+        except asyncio.CancelledError:
+            pass
+        except (ConnectionResetError, OSError) as e:
+            logging.error(f"Failed to send message: {e}")
+            self.on_connection_lost()
+
+    def on_connection_lost(self):
+        """Cancels the connection's tasks and ends receive_messages. Runs on the loop thread."""
+        if not self.connected and self.writer is None:
+            return
+        self.connected = False
+        self.stop_event.set()
+        for task in self.tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.incoming.put(None)
+
+    def send_message(self, message):
+        """
+        Queues a message for sending and returns immediately.
+
+        Args:
+            message (str): The message to send.
+        """
+        if not self.connected:
+            logging.error("Not connected to server. Message not sent.")
+            return
+
+        if self.stream.binary:
+            data = protocol.encode_command(message).to_bytes()
+        else:
+            data = message.encode()
+        self.loop.call_soon_threadsafe(self.enqueue, data)
+
+    def enqueue(self, data):
+        """Adds encoded data to the write queue. Runs on the loop thread."""
+        if self.write_queue is None or self.writer is None:
+            logging.error("Not connected to server. Message not sent.")
+            return
+        self.write_queue.put_nowait(data)
+        self.queued_bytes += len(data)
+        if self.queued_bytes > WRITE_QUEUE_WARNING_BYTES:
+            logging.warning(f"Write queue holds {self.queued_bytes} unsent bytes.")
+
+    def receive_messages(self):
+        """
+        Generator that receives messages from the server.
+
+        Yields:
+            Frame | str: A binary frame, or a decoded text chunk from a text-only server.
+        """
+        incoming = self.incoming
+        while True:
+            message = incoming.get()
+            if message is None:
+                break
+            yield message
+
+    def handle_connection_loss(self):
+        """Handles loss of connection to the server."""
+        self.loop.call_soon_threadsafe(self.on_connection_lost)
+
+    def close_connection(self):
+        """Cancels pending sends and receives, closes the connection and stops the loop."""
+        logging.info("Closing connection...")
+        self.stop_event.set()
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop)
+            self.loop_thread.join(timeout=2)
+        self.connected = False
+        logging.info(f"User {self.client_name} logged out.")
+
+    async def shutdown(self):
+        """Closes the stream, cancels the tasks and stops the event loop."""
+        self.on_connection_lost()
+        await asyncio.sleep(0)  # Let cancelled tasks finish
+        self.loop.stop()
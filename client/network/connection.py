@@ -1,13 +1,22 @@
 import os
-import time
 import socket
 import ssl
 import threading
 import logging
+from server.network import protocol
+from server.network.protocol import ServerStreamDecoder
+
+
+# Seconds to wait for the server's first bytes, which decide the protocol
+HANDSHAKE_TIMEOUT = 10
+# Certificate the server's is verified against
+CERT_FILE = os.getenv("CERT_FILE", os.path.join("certificates", "cert.pem"))
 
 
 class ClientConnection:
-    def __init__(self, host, port, client_name):
+    def __init__(
+        self, host, port, client_name, protocol_version=protocol.PROTOCOL_VERSION
+    ):
         """
         Initializes the ClientConnection object with the given host, port, and client name.
 
@@ -15,51 +24,93 @@ class ClientConnection:
             host (str): The server host address.
             port (int): The server port.
             client_name (str): The name of the client.
+            protocol_version (int): 2 to negotiate binary frames, 1 for the text protocol only.
         """
         self.host = host
         self.port = port
         self.client_name = client_name
         self.context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-        cert_file = os.path.join("certificates", "cert.pem")
         self.context.load_verify_locations(
-            cert_file
+            CERT_FILE
         )  # Load SSL certificate for verification
         self.socket = None
+        self.session = (
+            None  # TLS session resumed on reconnect, skipping a full handshake
+        )
         self.stop_event = threading.Event()
         self.connected = False
         self.reconnect_attempt = 0
-        self.max_reconnect_attempts = 5
+        self.max_reconnect_attempts = 8  # Consecutive failures before giving up
+        self.protocol_version = protocol_version
+        self.stream = ServerStreamDecoder()
+        self.pending_messages = []  # Decoded with the handshake, yielded first
 
     def connect_to_server(self):
         """
-        Attempts to connect to the server with SSL encryption.
+        Makes a single attempt to connect to the server with SSL encryption.
+
+        Retries and backoff are handled by the ReconnectSupervisor, so this never sleeps.
 
         Returns:
             bool: True if the connection was successful, False otherwise.
         """
-        while self.reconnect_attempt < self.max_reconnect_attempts:
-            try:
-                # Create an SSL socket and connect to the server
-                self.socket = self.context.wrap_socket(
-                    socket.socket(socket.AF_INET), server_hostname=self.host
-                )
-                self.socket.connect((self.host, self.port))
-                logging.info(
-                    f"SSL connection established to server {self.host}:{self.port}."
-                )
-                self.socket.sendall(
-                    self.client_name.encode()
-                )  # Send the client name to the server
-                self.connected = True
-                self.reconnect_attempt = 0
-                return True
-            except Exception as e:
-                logging.warning(
-                    f"Connection attempt {self.reconnect_attempt + 1} failed: {str(e)}"
-                )
-                self.reconnect_attempt += 1
-                time.sleep(5)  # Wait 5 seconds before trying to reconnect
-        return False
+        try:
+            # Create an SSL socket and connect to the server
+            self.socket = self.context.wrap_socket(
+                socket.socket(socket.AF_INET),
+                server_hostname=self.host,
+                session=self.session,
+            )
+            self.socket.connect((self.host, self.port))
+            logging.info(
+                f"SSL connection established to server {self.host}:{self.port}"
+                f"{' (resumed)' if self.socket.session_reused else ''}."
+            )
+            self.negotiate_protocol()
+            # TLS 1.3 tickets arrive after the handshake, so keep the session once
+            # the server has replied
+            self.session = self.socket.session
+            self.stop_event.clear()  # Resume receiving after a previous loss
+            self.connected = True
+            self.reconnect_attempt = 0
+            return True
+        except Exception as e:
+            logging.warning(
+                f"Connection attempt {self.reconnect_attempt + 1} failed: {str(e)}"
+            )
+            self.reconnect_attempt += 1
+            if self.socket:
+                try:
+                    self.socket.close()
+                except OSError:
+                    pass
+                self.socket = None
+            return False
+
+    def negotiate_protocol(self):
+        """
+        Sends the client name, offering the binary protocol, and waits until the
+        server's first bytes show which protocol it speaks.
+        """
+        self.stream = ServerStreamDecoder()
+        self.pending_messages = []
+        if self.protocol_version < protocol.PROTOCOL_VERSION:
+            self.socket.sendall(self.client_name.encode())  # Text protocol only
+            self.stream.binary = False
+            return
+
+        self.socket.sendall(protocol.encode_handshake(self.client_name))
+        self.socket.settimeout(HANDSHAKE_TIMEOUT)
+        while self.stream.binary is None:
+            data = self.socket.recv(4096)
+            if not data:
+                raise ConnectionResetError("Server closed the connection")
+            self.pending_messages.extend(self.stream.feed(data))
+        self.socket.settimeout(None)
+        logging.info(
+            f"Using {'binary' if self.stream.binary else 'text'} protocol with the server, "
+            f"compression {self.stream.compression or 'off'}."
+        )
 
     def send_message(self, message):
         """
@@ -73,9 +124,11 @@ class ClientConnection:
             return
 
         try:
-            self.socket.sendall(
-                message.encode()
-            )  # Send the encoded message to the server
+            if self.stream.binary:
+                data = protocol.encode_command(message).to_bytes()
+            else:
+                data = message.encode()
+            self.socket.sendall(data)  # Send the encoded message to the server
         except Exception as e:
             logging.error(f"Failed to send message: {e}")
             self.handle_connection_loss()  # Handle connection loss if sending fails
@@ -85,15 +138,19 @@ class ClientConnection:
         Generator that receives messages from the server.
 
         Yields:
-            str: The received message decoded.
+            Frame | str: A binary frame, or a decoded text chunk from a text-only server.
         """
+        yield from self.pending_messages
+        self.pending_messages = []
         while not self.stop_event.is_set():
             try:
-                data = self.socket.recv(1024).strip()  # Receive data from the socket
+                data = self.socket.recv(65536)  # Receive data from the socket
                 if not data:
                     raise ConnectionResetError("Server closed the connection")
-                yield data.decode()  # Decode and yield the received message
-            except (ConnectionResetError, OSError):
+                yield from self.stream.feed(
+                    data
+                )  # Decode and yield the received messages
+            except (ConnectionResetError, OSError, protocol.ProtocolError):
                 self.handle_connection_loss()
                 break
 
@@ -101,6 +158,11 @@ class ClientConnection:
         """Handles loss of connection to the server."""
         self.connected = False
         self.stop_event.set()  # Signal to stop receiving messages
+        if self.socket:
+            try:
+                self.socket.close()  # Unblocks a pending recv so a reconnect can start
+            except OSError as e:
+                logging.debug(f"Error closing lost connection: {e}")
 
     def close_connection(self):
         """Closes the connection to the server gracefully."""
@@ -0,0 +1,78 @@
+import random
+import logging
+import threading
+
+# Connection states reported through the on_state callback
+CONNECTING = "connecting"
+CONNECTED = "connected"
+DISCONNECTED = "disconnected"
+FAILED = "failed"
+
+# Backoff parameters in seconds
+BASE_RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+
+def backoff_delay(attempt, base=BASE_RECONNECT_DELAY, cap=MAX_RECONNECT_DELAY):
+    """
+    Returns an exponential backoff delay with full jitter.
+
+    The delay is drawn uniformly from [0, min(cap, base * 2 ** attempt)], so
+    clients that lost the server at the same moment spread their reconnects out.
+
+    Args:
+        attempt (int): The number of consecutive failed attempts so far.
+        base (float): The delay ceiling for the first retry.
+        cap (float): The largest delay ceiling.
+
+    Returns:
+        float: The number of seconds to wait before the next attempt.
+    """
+    return random.uniform(0, min(cap, base * 2 ** min(attempt, 32)))
+
+
+class ReconnectSupervisor(threading.Thread):
+    def __init__(self, connection, receive_loop, on_state, max_attempts=None):
+        """
+        Initializes a background thread that keeps the client connected.
+
+        Args:
+            connection: The ClientConnection to (re)connect.
+            receive_loop: Called after each successful connect; returns when the connection drops.
+            on_state: Called with CONNECTING, CONNECTED, DISCONNECTED or FAILED.
+            max_attempts (int | None): Consecutive failures before giving up, None to retry forever.
+        """
+        super().__init__(name="reconnect-supervisor", daemon=True)
+        self.connection = connection
+        self.receive_loop = receive_loop
+        self.on_state = on_state
+        self.max_attempts = max_attempts
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """Connects, runs the receive loop, and reconnects with backoff until stopped."""
+        attempt = 0
+        while not self.stop_event.is_set():
+            self.on_state(CONNECTING)
+            if self.connection.connect_to_server():
+                attempt = 0
+                self.on_state(CONNECTED)
+                self.receive_loop()  # Returns once the connection is lost or closed
+                if self.stop_event.is_set():
+                    break
+                logging.warning("Connection to server lost, reconnecting.")
+                self.on_state(DISCONNECTED)
+            else:
+                attempt += 1
+                if self.max_attempts is not None and attempt >= self.max_attempts:
+                    logging.error(f"Giving up after {attempt} connection attempts.")
+                    self.on_state(FAILED)
+                    break
+
+            delay = backoff_delay(attempt)
+            logging.info(f"Next connection attempt in {delay:.1f}s.")
+            self.stop_event.wait(delay)
+
+    def stop(self):
+        """Stops reconnecting; the current receive loop ends when the connection closes."""
+        self.stop_event.set()
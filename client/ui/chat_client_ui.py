@@ -3,14 +3,18 @@ from PyQt5.QtWidgets import QApplication, QMainWindow
 from PyQt5.QtCore import pyqtSignal
 from client.ui.layouts import setup_ui
 from client.ui.chat_management import (
-    display_message,
     clear_chat_display,
     request_message_history,
+    reload_current_chat,
+    show_search_results,
     scroll_to_bottom,
     switch_chat,
     highlight_chat_tab,
     handle_send_button,
+    resize_message_bubbles,
 )
+from client.ui.text_metrics import TextMetricsCache
+from client.ui.update_scheduler import UiUpdateScheduler
 from client.ui.sidebar_management import (
     update_client_list,
     add_client_to_sidebar,
@@ -20,7 +24,7 @@ from client.ui.sidebar_management import (
 
 class ChatClientUI(QMainWindow):
     # Define custom signals for communication between components
-    display_message_signal = pyqtSignal(str, str, str)
+    display_message_signal = pyqtSignal(object)
     send_message_signal = pyqtSignal(str)
     close_connection_signal = pyqtSignal()
     update_client_list_signal = pyqtSignal(list)
@@ -40,17 +44,31 @@ class ChatClientUI(QMainWindow):
         self.last_click_time = 0
         self.last_sender = None  # Track the sender of the last message
         self.private_chats = []  # Track private chats
+        self.sidebar_index = {}  # Map sidebar names to their rows
+        self.unread_counts = {}  # Track unread messages per sidebar name
+        self.selected_chat = "All"  # Name of the selected sidebar row
+        self.text_metrics = TextMetricsCache()  # Cached bubble text widths
+        self.message_bubbles = []  # Displayed bubbles with their measured widths
+        self.bubble_max_width = None  # Bubble width limit for the current window width
+        self.displayed_ids = set()  # Server message IDs shown in the chat area
+        self.search_query = None  # (chat, query) while the chat area shows a search
+        self.search_before_id = 0  # Before ID of the next page of results, 0 if none
 
         setup_ui(self)  # Set up the user interface
+        self.update_scheduler = UiUpdateScheduler(self)  # Batches UI updates per frame
 
     # Delegate the methods to the respective modules
     def handle_send_button(self):
         """Handles sending messages through the connected handler."""
         handle_send_button(self)
 
-    def display_message(self, message, message_type, alignment):
-        """Displays messages in the chat UI."""
-        display_message(self, message, message_type, alignment)
+    def display_message(self, record):
+        """Queues a decoded message to be displayed on the next UI frame."""
+        self.update_scheduler.enqueue(record)
+
+    def show_search_results(self, record):
+        """Queues a page of search results to be displayed, if the search is still open."""
+        show_search_results(self, record)
 
     def update_client_list(self, client_list):
         """Updates the sidebar with the current list of clients."""
@@ -69,22 +87,41 @@ class ChatClientUI(QMainWindow):
         switch_chat(self, chat_identifier, item)
 
     def clear_chat_display(self):
-        """Clears the current chat display area."""
+        """Clears the chat display area and the messages queued for it, keeping their unread marks."""
+        self.update_scheduler.clear()
         clear_chat_display(self)
 
     def request_message_history(self, chat_identifier):
         """Requests the message history for the specified chat."""
         request_message_history(self, chat_identifier)
 
+    def reload_current_chat(self):
+        """Requests the open chat's history again after a reconnect."""
+        reload_current_chat(self)
+
     def closeEvent(self, event):
         """Handles the close event for the application window."""
         self.close_connection_signal.emit()  # Emit signal to close connection
         event.accept()  # Accept the event to close the window
 
+    def resizeEvent(self, event):
+        """Resizes the message bubbles in bulk when the window width changes."""
+        super().resizeEvent(event)
+        resize_message_bubbles(self)
+
     def scroll_to_bottom(self):
         """Scrolls the chat area to the bottom."""
         scroll_to_bottom(self)
 
+    def show_connection_state(self, state):
+        """Shows the connection state in the window title while not connected."""
+        status = {
+            "connecting": " (connecting...)",
+            "disconnected": " (reconnecting...)",
+            "failed": " (offline)",
+        }.get(state, "")
+        self.setWindowTitle(f"ChaSe - {self.client_name}{status}")
+
     def highlight_chat_tab(self, chat_identifier):
         """Highlights the selected chat tab in the UI."""
         highlight_chat_tab(self, chat_identifier)
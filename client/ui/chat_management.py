@@ -1,39 +1,36 @@
 from PyQt5.QtWidgets import QLabel, QWidget, QHBoxLayout, QSizePolicy
-from PyQt5.QtGui import QTextDocument
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt
+from client.ui.sidebar_management import refresh_sidebar_row
+from client.handlers.message_decoder import ChatRecord
 import logging
 import time
 
+BUBBLE_MIN_WIDTH = 20
+# Typed in the message input to search the current chat instead of sending
+SEARCH_COMMAND = "/search "
+# Typed in the message input to show the next, older page of search results
+MORE_COMMAND = "/more"
 
-def display_message(chat_client, message, message_type, alignment):
+
+def display_message(chat_client, record):
     """
-    Displays a message in the chat interface based on its type and alignment.
+    Displays a decoded message in the chat interface based on its type and alignment.
 
     Args:
         chat_client: The current chat client instance.
-        message: The message string, formatted as 'sender: content'.
-        message_type: Type of message ('public', 'private', or 'history').
-        alignment: Alignment for displaying the message ('left' or 'right').
+        record: The ChatRecord to display, already decoded on the receive thread.
     """
-
-    # Split the message into sender and content
-    sender, content = message.split(": ", 1) if ": " in message else (None, message)
-
-    # Calculate the width of the text based on its content
-    text_document = QTextDocument()
-    text_document.setPlainText(content)
-    text_width = text_document.idealWidth()
-    max_width = int(
-        chat_client.width() * 0.5
-    )  # Maximum width set to 50% of window width
-    min_width = 20
-    final_width = min(
-        max_width, max(min_width, int(text_width + 30))
-    )  # Final width calculation
+    sender = record.sender
+    content = record.content
+    message_type = record.message_type
+    alignment = record.alignment
 
     # Determine if the message should be displayed in the current chat
     should_display = False
-    if message_type == "public" and chat_client.current_chat in ["All", "public"]:
+    if chat_client.search_query is not None:
+        # The chat area shows search results until another chat is opened
+        should_display = message_type == "search"
+    elif message_type == "public" and chat_client.current_chat in ["All", "public"]:
         should_display = True
     elif message_type == "private":
         if (
@@ -43,33 +40,35 @@ def display_message(chat_client, message, message_type, alignment):
         ):
             should_display = True
     elif message_type == "history":
+        # History sent for another chat, e.g. public history on reconnect, is dropped
+        should_display = record.conversation is None or same_chat(
+            record.conversation, chat_client.current_chat
+        )
+    elif message_type == "search":
         should_display = True
 
     if not should_display:
         return
 
-    # Logic to manage sender initials and message bubble display
-    sender_initials = ""
+    # Live messages and history can overlap, e.g. after a reconnect
+    if record.message_id:
+        if record.message_id in chat_client.displayed_ids:
+            return
+        chat_client.displayed_ids.add(record.message_id)
+
+    # Show the sender's initials only on the first of consecutive messages
+    sender_initials = record.initials
     display_initials = True
-    current_sender = None
-
-    if alignment == "right":
-        message_parts = message.split(":", 1)
-        if len(message_parts) == 2:
-            current_sender = chat_client.client_name
-            message = message_parts[1]
-    elif alignment == "left":
-        message_parts = message.split(":", 1)
-        if len(message_parts) == 2:
-            current_sender = message_parts[0]
-            sender_initials = current_sender[:2].upper()
-            message = message_parts[1]
+    current_sender = sender
 
     if chat_client.last_sender == current_sender:
         display_initials = False
     else:
         chat_client.last_sender = current_sender
 
+    # Measure the text once, bubbles are resized in bulk when the window width changes
+    text_width = chat_client.text_metrics.ideal_width(content)
+
     # Create the message bubble
     label = QLabel(content)
     label.setWordWrap(True)
@@ -84,7 +83,7 @@ def display_message(chat_client, message, message_type, alignment):
     )
 
     label.setAlignment(Qt.AlignCenter)  # Align the text inside the bubble to the left
-    label.setFixedWidth(final_width if len(content) > 0 else min_width)
+    label.setFixedWidth(bubble_width(chat_client, content, text_width))
     label.setSizePolicy(QSizePolicy.MinimumExpanding, QSizePolicy.Preferred)
 
     # Set up the container layout for message bubbles
@@ -132,9 +131,45 @@ def display_message(chat_client, message, message_type, alignment):
 
     # Add the message bubble to the chat layout
     chat_client.chat_layout.addWidget(wrapper)
-    QTimer.singleShot(
-        100, chat_client.scroll_to_bottom
-    )  # Scroll to the bottom after displaying the message
+    chat_client.message_bubbles.append((label, content, text_width))
+
+
+def bubble_width(chat_client, content, text_width):
+    """
+    Calculates the fixed width of a message bubble for the current window width.
+
+    Args:
+        chat_client: The current chat client instance.
+        content: The text shown in the bubble.
+        text_width: The ideal width of the text, as measured by the text metrics cache.
+
+    Returns:
+        int: The bubble width in pixels.
+    """
+    if chat_client.bubble_max_width is None:
+        # Maximum width set to 50% of window width
+        chat_client.bubble_max_width = int(chat_client.width() * 0.5)
+    if not content:
+        return BUBBLE_MIN_WIDTH
+    return min(
+        chat_client.bubble_max_width, max(BUBBLE_MIN_WIDTH, int(text_width + 30))
+    )
+
+
+def resize_message_bubbles(chat_client):
+    """
+    Recomputes all bubble widths in one pass, only when the window width has changed.
+
+    Args:
+        chat_client: The current chat client instance.
+    """
+    max_width = int(chat_client.width() * 0.5)
+    if max_width == chat_client.bubble_max_width:
+        return
+
+    chat_client.bubble_max_width = max_width
+    for label, content, text_width in chat_client.message_bubbles:
+        label.setFixedWidth(bubble_width(chat_client, content, text_width))
 
 
 def switch_chat(chat_client, chat_identifier, item):
@@ -153,6 +188,7 @@ def switch_chat(chat_client, chat_identifier, item):
     chat_client.last_click_time = current_time
     chat_client.current_chat = chat_identifier
     chat_client.last_sender = None  # Reset last sender on chat switch
+    chat_client.search_query = None  # Leave the search results, if shown
 
     # Update the header based on the chat identifier
     if chat_identifier in ["public", "All"]:
@@ -171,28 +207,12 @@ def switch_chat(chat_client, chat_identifier, item):
     chat_client.chat_layout.setAlignment(Qt.AlignTop)
     chat_client.clear_chat_display()
 
-    # Update styles for the selected chat in the sidebar
-    for index in range(chat_client.sidebar.count()):
-        list_item = chat_client.sidebar.item(index)
-        widget = chat_client.sidebar.itemWidget(list_item)
-        if list_item == item:
-            widget.setStyleSheet(
-                """
-                background-color: #3e4248;
-                border: none;
-                border-radius: 15px;
-                margin: 2px 0px;
-            """
-            )
-            list_item.setBackground(Qt.transparent)
-        else:
-            widget.setStyleSheet(
-                """
-                background-color: #2C2F33;
-                color: white;
-            """
-            )
-            list_item.setBackground(Qt.transparent)
+    # Repaint only the previously selected row and the newly selected one
+    previous_chat = chat_client.selected_chat
+    chat_client.selected_chat = item.data(Qt.UserRole) if item else None
+    chat_client.unread_counts.pop(chat_client.selected_chat, None)
+    refresh_sidebar_row(chat_client, previous_chat)
+    refresh_sidebar_row(chat_client, chat_client.selected_chat)
 
 
 def clear_chat_display(chat_client):
@@ -206,6 +226,29 @@ def clear_chat_display(chat_client):
         widget_to_remove = chat_client.chat_layout.itemAt(i).widget()
         chat_client.chat_layout.removeWidget(widget_to_remove)
         widget_to_remove.setParent(None)  # Remove widget from parent layout
+    chat_client.message_bubbles.clear()
+    chat_client.displayed_ids.clear()
+
+
+def same_chat(chat_identifier, other_identifier):
+    """Returns True if both identifiers name the same chat; 'All' is the public chat."""
+    public = ("public", "All")
+    if chat_identifier in public:
+        return other_identifier in public
+    return chat_identifier == other_identifier
+
+
+def reload_current_chat(chat_client):
+    """
+    Requests the history of the open chat after a reconnect, to show the messages
+    missed while disconnected. Public history is sent by the server on login, and
+    history already displayed is skipped by message ID.
+
+    Args:
+        chat_client: The current chat client instance.
+    """
+    if not same_chat(chat_client.current_chat, "public"):
+        request_message_history(chat_client, chat_client.current_chat)
 
 
 def request_message_history(chat_client, chat_identifier):
@@ -217,7 +260,7 @@ def request_message_history(chat_client, chat_identifier):
         chat_identifier: Identifier for the chat whose history is requested.
     """
     chat_client.send_message_signal.emit(f"HISTORY:{chat_identifier}")
-    QTimer.singleShot(100, chat_client.scroll_to_bottom)  # Delay scrolling to bottom
+    chat_client.update_scheduler.request_scroll()
 
 
 def scroll_to_bottom(chat_client):
@@ -246,6 +289,26 @@ def handle_send_button(chat_client):
     if not message:  # Discard empty messages
         return
 
+    if message.startswith(SEARCH_COMMAND):
+        # Replace the chat area with the matching messages of the current chat
+        query = message[len(SEARCH_COMMAND) :].strip()
+        chat_client.clear_chat_display()
+        chat_client.search_query = (chat_client.current_chat, query)
+        chat_client.search_before_id = 0
+        chat_client.send_message_signal.emit(
+            f"SEARCH:{chat_client.current_chat}:{query}"
+        )
+        return
+
+    if message == MORE_COMMAND and chat_client.search_query is not None:
+        # Repeated requests for a page are harmless, results are shown once by ID
+        if chat_client.search_before_id:
+            chat, query = chat_client.search_query
+            chat_client.send_message_signal.emit(
+                f"SEARCH_MORE:{chat_client.search_before_id}:{chat}:{query}"
+            )
+        return
+
     # Send the message based on the current chat type
     if chat_client.current_chat == "public":
         chat_client.send_message_signal.emit(message)
@@ -256,29 +319,54 @@ def handle_send_button(chat_client):
         chat_client.send_message_signal.emit(f"@{chat_client.current_chat}:{message}")
 
 
+def show_search_results(chat_client, record):
+    """
+    Queues a page of search results for display, with a notice when nothing matched
+    and a hint when older results can be requested.
+
+    Args:
+        chat_client: The current chat client instance.
+        record (SearchResultsRecord): The decoded page of results.
+    """
+    if chat_client.search_query != (record.conversation, record.query):
+        return  # The search was left or replaced before its results arrived
+
+    first_page = not chat_client.search_before_id
+    chat_client.search_before_id = record.next_before_id
+    if not record.results and first_page:
+        chat_client.display_message(
+            ChatRecord(
+                "search", None, f"No messages found for '{record.query}'", "left"
+            )
+        )
+    for result in record.results:
+        chat_client.display_message(result)
+    if record.next_before_id:
+        chat_client.display_message(
+            ChatRecord("search", None, f"Type {MORE_COMMAND} for older results", "left")
+        )
+
+
 def highlight_chat_tab(chat_client, chat_identifier):
     """
-    Highlights the sidebar tab for the specified chat identifier.
+    Marks the sidebar tab for the specified chat identifier as unread.
+
+    The row is looked up by exact name, its unread counter is incremented,
+    and only that row is repainted.
 
     Args:
         chat_client: The current chat client instance.
         chat_identifier: Identifier for the chat tab to highlight.
     """
-    for index in range(chat_client.sidebar.count()):
-        list_item = chat_client.sidebar.item(index)
-        widget = chat_client.sidebar.itemWidget(list_item)
-        if widget:
-            if chat_identifier in widget.findChildren(QLabel)[1].text():
-                widget.setStyleSheet(
-                    """
-                    background-color: #40444B;
-                    border-radius: 15px;
-                    margin: 2px 0px;
-                    color: white;
-                """
-                )
-                list_item.setBackground(Qt.transparent)
-                break
+    if chat_identifier not in chat_client.sidebar_index:
+        return
+    if chat_identifier == chat_client.selected_chat:
+        return  # The chat is already open, nothing is unread
+
+    chat_client.unread_counts[chat_identifier] = (
+        chat_client.unread_counts.get(chat_identifier, 0) + 1
+    )
+    refresh_sidebar_row(chat_client, chat_identifier)
 
 
 def set_target_client(self, target_client):
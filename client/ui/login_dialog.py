@@ -65,6 +65,11 @@ class LoginDialog(QDialog):
         self.login_message_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.login_message_label)
 
+        self.login_cancel_button = QPushButton("Cancel")  # Shown while signing in
+        self.login_cancel_button.hide()
+        layout.addWidget(self.login_cancel_button)
+        self.login_cancel_button.clicked.connect(self.auth_handler.cancel)
+
         self.switch_to_register_label = QLabel("or <a href='#'>Register</a>")
         self.switch_to_register_label.setAlignment(
             Qt.AlignCenter
@@ -108,6 +113,11 @@ class LoginDialog(QDialog):
         self.register_message_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.register_message_label)
 
+        self.register_cancel_button = QPushButton("Cancel")  # Shown while registering
+        self.register_cancel_button.hide()
+        layout.addWidget(self.register_cancel_button)
+        self.register_cancel_button.clicked.connect(self.auth_handler.cancel)
+
         self.switch_to_login_label = QLabel("or <a href='#'>Login</a>")
         self.switch_to_login_label.setAlignment(
             Qt.AlignCenter
@@ -136,6 +146,34 @@ class LoginDialog(QDialog):
             ""
         )  # Clear any register messages when switching
 
+    def set_busy(self, busy, message=""):
+        """
+        Locks the inputs while an authentication request runs in the background.
+
+        Args:
+            busy (bool): True while a request is in progress.
+            message (str): Progress text to show while busy.
+        """
+        for widget in (
+            self.login_username,
+            self.login_password,
+            self.login_button,
+            self.register_username,
+            self.register_password,
+            self.confirm_password,
+            self.register_button,
+            self.switch_to_register_label,
+            self.switch_to_login_label,
+        ):
+            widget.setEnabled(not busy)
+        self.login_cancel_button.setVisible(busy)
+        self.register_cancel_button.setVisible(busy)
+
+        # Show progress while busy and clear it once the request is over
+        for label in (self.login_message_label, self.register_message_label):
+            label.setText(message if busy else "")
+            label.setStyleSheet("color: grey")
+
     def get_name(self):
         """
         Returns the stored username.
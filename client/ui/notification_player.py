@@ -0,0 +1,80 @@
+import os
+import time
+import logging
+from collections import deque
+from PyQt5.QtCore import QUrl
+from PyQt5.QtMultimedia import QSoundEffect
+
+NOTIFICATION_FILE = "notification.wav"
+# Number of recent latency samples kept for benchmarking
+LATENCY_SAMPLES = 256
+# Seconds a requested playback may take to start before new triggers are accepted again
+PENDING_START_TIMEOUT = 0.5
+
+
+class NotificationPlayer:
+    def __init__(self, path=None, volume=1.0):
+        """
+        Loads the notification sound once into a reusable QSoundEffect.
+
+        Args:
+            path (str | None): Path to the WAV file, notification.wav in the working directory by default.
+            volume (float): Playback volume between 0.0 and 1.0.
+        """
+        self.path = path or os.path.join(os.getcwd(), NOTIFICATION_FILE)
+        self.effect = QSoundEffect()
+        self.effect.setSource(QUrl.fromLocalFile(self.path))
+        self.effect.setVolume(volume)
+        self.effect.playingChanged.connect(self.on_playing_changed)
+
+        self.played = 0  # Triggers that started playback
+        self.collapsed = 0  # Triggers dropped because the sound was already playing
+        self.play_call_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.start_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.requested_at = None
+
+    def play(self):
+        """
+        Plays the notification without blocking, collapsing overlapping triggers.
+
+        Returns:
+            bool: True if playback was started, False if the trigger was collapsed.
+        """
+        start = time.perf_counter()
+        pending = (
+            self.requested_at is not None
+            and start - self.requested_at < PENDING_START_TIMEOUT
+        )
+        if self.effect.isPlaying() or pending:
+            self.collapsed += 1
+            return False
+        if self.effect.status() == QSoundEffect.Error:
+            logging.warning(f"Notification sound could not be loaded from {self.path}")
+            return False
+
+        self.requested_at = start
+        self.effect.play()  # Returns immediately, decoding was done at load time
+        self.played += 1
+        self.play_call_latencies.append(time.perf_counter() - start)
+        return True
+
+    def on_playing_changed(self):
+        """Records how long playback took to start after it was requested."""
+        if self.effect.isPlaying() and self.requested_at is not None:
+            self.start_latencies.append(time.perf_counter() - self.requested_at)
+        if not self.effect.isPlaying():
+            self.requested_at = None
+
+    def stats(self):
+        """
+        Returns playback counters and latency samples for the benchmark harness.
+
+        Returns:
+            dict: Counts of played and collapsed triggers, and latencies in seconds.
+        """
+        return {
+            "played": self.played,
+            "collapsed": self.collapsed,
+            "play_call_latencies": list(self.play_call_latencies),
+            "start_latencies": list(self.start_latencies),
+        }
@@ -1,6 +1,24 @@
 from PyQt5.QtWidgets import QListWidgetItem, QLabel, QHBoxLayout, QWidget, QPushButton
 from PyQt5.QtCore import pyqtSlot, Qt
 
+# Sidebar row styles for the selected, unread and idle states
+SELECTED_ROW_STYLE = """
+    background-color: #3e4248;
+    border: none;
+    border-radius: 15px;
+    margin: 2px 0px;
+"""
+UNREAD_ROW_STYLE = """
+    background-color: #40444B;
+    border-radius: 15px;
+    margin: 2px 0px;
+    color: white;
+"""
+DEFAULT_ROW_STYLE = """
+    background-color: #2C2F33;
+    color: white;
+"""
+
 
 @pyqtSlot(list)
 def update_client_list(chat_client, client_list):
@@ -12,6 +30,7 @@ def update_client_list(chat_client, client_list):
         client_list: A list of current connected clients.
     """
     chat_client.sidebar.clear()
+    chat_client.sidebar_index.clear()  # Rows are rebuilt below
     add_client_to_sidebar(chat_client, "All", "public")
     for client in client_list:
         add_client_to_sidebar(chat_client, client)
@@ -58,12 +77,36 @@ def add_client_to_sidebar(chat_client, client, chat_identifier=None):
     )
     item_layout.addWidget(name_label)
 
+    # Unread counter badge, hidden until a message arrives for this chat
+    unread_label = QLabel()
+    unread_label.setFixedSize(24, 24)
+    unread_label.setStyleSheet(
+        """
+        background-color: #F04747;
+        color: white;
+        border-radius: 12px;
+        font-size: 10pt;
+    """
+    )
+    unread_label.setAlignment(Qt.AlignCenter)
+    unread_label.hide()
+    item_layout.addWidget(unread_label)
+
     item_widget.setLayout(item_layout)
     item.setSizeHint(item_widget.sizeHint())
+    item.setData(Qt.UserRole, client)  # Lets switch_chat map the row back to its name
 
     chat_client.sidebar.addItem(item)
     chat_client.sidebar.setItemWidget(item, item_widget)
 
+    # Index the row by name so highlighting does not need to scan the sidebar
+    chat_client.sidebar_index[client] = {
+        "item": item,
+        "widget": item_widget,
+        "unread_label": unread_label,
+    }
+    refresh_sidebar_row(chat_client, client)
+
     chat_identifier = chat_identifier or client
     item_widget.mousePressEvent = (
         lambda event, c=chat_identifier: chat_client.switch_chat(c, item)
@@ -74,6 +117,34 @@ def add_client_to_sidebar(chat_client, client, chat_identifier=None):
         chat_client.private_chats.append(chat_identifier)
 
 
+def refresh_sidebar_row(chat_client, name):
+    """
+    Repaints a single sidebar row according to its selection and unread state.
+
+    Args:
+        chat_client: The current chat client instance.
+        name: The name shown in the sidebar row.
+    """
+    row = chat_client.sidebar_index.get(name)
+    if row is None:
+        return
+
+    unread = chat_client.unread_counts.get(name, 0)
+    if name == chat_client.selected_chat:
+        row["widget"].setStyleSheet(SELECTED_ROW_STYLE)
+    elif unread:
+        row["widget"].setStyleSheet(UNREAD_ROW_STYLE)
+    else:
+        row["widget"].setStyleSheet(DEFAULT_ROW_STYLE)
+
+    if unread:
+        row["unread_label"].setText(str(unread) if unread < 100 else "99+")
+        row["unread_label"].show()
+    else:
+        row["unread_label"].hide()
+    row["item"].setBackground(Qt.transparent)
+
+
 def add_button_to_sidebar(chat_client, button_text, chat_identifier):
     """
     Adds a button to the sidebar for switching chats.
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from PyQt5.QtGui import QFont, QFontMetricsF, QTextDocument
+
+# Messages up to this length on a single line are measured with QFontMetricsF
+FAST_PATH_MAX_LENGTH = 200
+# Number of measured texts kept before the least recently used one is dropped
+MAX_CACHED_WIDTHS = 2048
+
+
+class TextMetricsCache:
+    def __init__(self, max_entries=MAX_CACHED_WIDTHS):
+        """
+        Initializes an LRU cache of ideal text widths keyed by content and font.
+
+        Args:
+            max_entries (int): The maximum number of widths to keep.
+        """
+        self.max_entries = max_entries
+        self.widths = OrderedDict()
+        self.font_metrics = {}  # Font key -> QFontMetricsF for the fast path
+        self.document = None  # Reusable document for multi-line or long text
+        self.default_font = None
+
+    def ideal_width(self, text, font=None):
+        """
+        Returns the width the text needs to be laid out without wrapping.
+
+        Matches QTextDocument.idealWidth(), but short single-line texts are measured
+        with QFontMetricsF and every result is cached, so repeated or bursty
+        messages do not allocate a document each.
+
+        Args:
+            text (str): The plain text to measure.
+            font (QFont | None): The font to measure with, the application font by default.
+
+        Returns:
+            float: The ideal width in pixels, including the document margins.
+        """
+        if font is None:
+            if self.default_font is None:
+                self.default_font = QFont()
+            font = self.default_font
+        key = (text, font.key())
+
+        width = self.widths.get(key)
+        if width is not None:
+            self.widths.move_to_end(key)
+            return width
+
+        if len(text) <= FAST_PATH_MAX_LENGTH and "\n" not in text and "\t" not in text:
+            metrics = self.font_metrics.get(key[1])
+            if metrics is None:
+                metrics = QFontMetricsF(font)
+                self.font_metrics[key[1]] = metrics
+            width = metrics.horizontalAdvance(text) + 2 * self.document_margin()
+        else:
+            document = self.get_document()
+            document.setDefaultFont(font)
+            document.setPlainText(text)
+            width = document.idealWidth()
+
+        self.widths[key] = width
+        if len(self.widths) > self.max_entries:
+            self.widths.popitem(last=False)
+        return width
+
+    def get_document(self):
+        """Returns the shared QTextDocument, creating it on first use."""
+        if self.document is None:
+            self.document = QTextDocument()
+        return self.document
+
+    def document_margin(self):
+        """Returns the margin QTextDocument adds on each side of its content."""
+        return self.get_document().documentMargin()
@@ -0,0 +1,136 @@
+import time
+from collections import deque
+from PyQt5.QtCore import QObject, QTimer
+from client.ui.chat_management import display_message, highlight_chat_tab
+
+# Roughly 60 UI updates per second
+FRAME_INTERVAL_MS = 16
+# Upper bound on bubbles added in one frame, the rest wait for the next frame
+MAX_RECORDS_PER_FRAME = 200
+# Minimum seconds between two notification sounds for the same conversation
+NOTIFICATION_DEBOUNCE_SECONDS = 2.0
+# Minimum seconds between two notification sounds across all conversations
+NOTIFICATION_MIN_INTERVAL_SECONDS = 0.25
+
+
+class UiUpdateScheduler(QObject):
+    def __init__(self, chat_client, interval_ms=FRAME_INTERVAL_MS):
+        """
+        Initializes the scheduler that applies incoming messages to the UI once per frame.
+
+        Args:
+            chat_client: The ChatClientUI instance to update.
+            interval_ms (int): The frame interval in milliseconds.
+        """
+        super().__init__(chat_client)
+        self.chat_client = chat_client
+        self.pending = deque()
+        self.scroll_requested = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.flush)
+
+    def enqueue(self, record):
+        """
+        Queues a decoded message to be displayed on the next frame.
+
+        Args:
+            record (ChatRecord): The message to display.
+        """
+        self.pending.append(record)
+        self.schedule()
+
+    def request_scroll(self):
+        """Asks for the chat area to be scrolled to the bottom on the next frame."""
+        self.scroll_requested = True
+        self.schedule()
+
+    def schedule(self):
+        """Starts the frame timer unless a frame is already scheduled."""
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def clear(self):
+        """
+        Drops queued messages, e.g. when the chat display is cleared.
+
+        Their bubbles would land in the cleared view, but the unread highlights of
+        messages for other chats are only applied on display, so they are kept.
+        """
+        while self.pending:
+            record = self.pending.popleft()
+            if record.highlight:
+                highlight_chat_tab(self.chat_client, record.highlight)
+
+    def flush(self):
+        """
+        Applies one frame of updates: at most one scroll and a batch of queued messages.
+
+        The scroll runs first so it acts on the layout settled since the previous
+        frame; bubbles added in this frame request a scroll on the next one.
+        """
+        if self.scroll_requested:
+            self.scroll_requested = False
+            self.chat_client.scroll_to_bottom()
+
+        if not self.pending:
+            return
+
+        container = self.chat_client.chat_container
+        container.setUpdatesEnabled(False)  # Repaint once for the whole batch
+        try:
+            for _ in range(min(len(self.pending), MAX_RECORDS_PER_FRAME)):
+                record = self.pending.popleft()
+                display_message(self.chat_client, record)
+                if record.highlight:
+                    highlight_chat_tab(self.chat_client, record.highlight)
+        finally:
+            container.setUpdatesEnabled(True)
+
+        self.request_scroll()
+
+
+class NotificationDebouncer:
+    def __init__(
+        self,
+        debounce_seconds=NOTIFICATION_DEBOUNCE_SECONDS,
+        min_interval_seconds=NOTIFICATION_MIN_INTERVAL_SECONDS,
+    ):
+        """
+        Initializes the per-conversation notification rate limiter.
+
+        Args:
+            debounce_seconds (float): Minimum time between notifications for one conversation.
+            min_interval_seconds (float): Minimum time between any two notifications.
+        """
+        self.debounce_seconds = debounce_seconds
+        self.min_interval_seconds = min_interval_seconds
+        # Conversation -> monotonic time of its last notification
+        self.last_notified = {}
+        self.last_any = None
+
+    def should_notify(self, conversation, now=None):
+        """
+        Decides whether a message in the given conversation should play a notification.
+
+        Args:
+            conversation (str | None): The conversation the message belongs to.
+            now (float | None): The current monotonic time, mainly for tests.
+
+        Returns:
+            bool: True if a notification should be played now.
+        """
+        now = time.monotonic() if now is None else now
+        if (
+            self.last_any is not None
+            and now - self.last_any < self.min_interval_seconds
+        ):
+            return False
+        last = self.last_notified.get(conversation)
+        if last is not None and now - last < self.debounce_seconds:
+            return False
+
+        self.last_notified[conversation] = now
+        self.last_any = now
+        return True
@@ -0,0 +1,121 @@
+import os
+import logging
+import threading
+import mysql.connector
+from server.database.connection import get_db_connection
+
+# Messages older than this many days move to messages_archive, 0 disables archiving
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+# Seconds between two archive runs
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+# Range of message IDs moved per transaction, keeping locks on the hot table short
+ARCHIVE_BATCH_SIZE = 1000
+
+MESSAGE_COLUMNS = "id, sender_id, recipient_id, group_id, message, timestamp"
+
+
+def archived_through(cursor):
+    """
+    Returns the highest archived message ID.
+
+    Whole ID ranges are archived, so every message with a higher ID is in the hot
+    messages table and history only needs the archive when paging below this ID.
+
+    Args:
+        cursor: An open database cursor.
+
+    Returns:
+        int: The highest archived ID, 0 if nothing is archived or the archive
+        table does not exist.
+    """
+    try:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM messages_archive")
+        return int(cursor.fetchone()[0])
+    except mysql.connector.ProgrammingError:
+        return 0  # Database created before the archive table
+
+
+def archive_old_messages(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Moves messages older than the given age from messages to messages_archive.
+
+    Args:
+        days (int): Age in days from which messages are archived.
+        batch_size (int): Range of IDs moved per transaction.
+
+    Returns:
+        int: The number of messages moved.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    moved = 0
+    try:
+        cursor.execute(
+            "SELECT MAX(id) FROM messages WHERE timestamp < NOW() - INTERVAL %s DAY",
+            (days,),
+        )
+        boundary = cursor.fetchone()[0]
+        if boundary is None:
+            return 0
+        cursor.execute("SELECT MIN(id) FROM messages")
+        start = cursor.fetchone()[0]
+
+        # IDs grow with time, so everything up to the boundary is old enough
+        while start is not None and start <= boundary:
+            end = min(start + batch_size - 1, boundary)
+            cursor.execute(
+                f"INSERT INTO messages_archive ({MESSAGE_COLUMNS}) "
+                f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE id BETWEEN %s AND %s",
+                (start, end),
+            )
+            cursor.execute(
+                "DELETE FROM messages WHERE id BETWEEN %s AND %s", (start, end)
+            )
+            moved += cursor.rowcount
+            conn.commit()
+            start = end + 1
+        logging.info(f"Archived {moved} messages up to ID {boundary}")
+        return moved
+    except mysql.connector.Error as err:
+        conn.rollback()
+        logging.error(f"Error archiving messages after {moved} moved: {err}")
+        return moved
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_archive_job(stop_event, interval=ARCHIVE_INTERVAL):
+    """
+    Archives old messages periodically until the stop event is set.
+
+    Args:
+        stop_event (threading.Event): Set to stop the job.
+        interval (float): Seconds between two runs.
+    """
+    while not stop_event.is_set():
+        try:
+            archive_old_messages()
+        except Exception as e:
+            logging.error(f"Unexpected error in the archive job: {e}")
+        stop_event.wait(interval)
+
+
+def start_archive_job(stop_event):
+    """
+    Starts the background archive job unless archiving is disabled.
+
+    Args:
+        stop_event (threading.Event): Set to stop the job.
+
+    Returns:
+        threading.Thread | None: The job's thread, or None if archiving is disabled.
+    """
+    if ARCHIVE_AFTER_DAYS <= 0:
+        logging.info("Message archiving is disabled.")
+        return None
+    thread = threading.Thread(
+        target=run_archive_job, args=(stop_event,), name="archive", daemon=True
+    )
+    thread.start()
+    return thread
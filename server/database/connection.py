@@ -1,5 +1,6 @@
 import os
 import mysql.connector
+from mysql.connector import pooling
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -10,15 +11,58 @@ DB_HOST = os.getenv("DB_HOST")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
+# Seconds to wait for the database before giving up on a connection attempt
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Connections kept open by the server, capped by mysql.connector's pool limit
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+# Opened during server startup, None in the client and before startup
+db_pool = None
+
+
+def init_db_pool(size=DB_POOL_SIZE):
+    """
+    Opens the pool of database connections used by get_db_connection.
+
+    Args:
+        size (int): The number of connections to keep open.
+
+    Returns:
+        MySQLConnectionPool: The opened pool.
+    """
+    global db_pool
+    db_pool = pooling.MySQLConnectionPool(
+        pool_name="chase",
+        pool_size=max(1, min(size, pooling.CNX_POOL_MAXSIZE)),
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        connection_timeout=DB_CONNECT_TIMEOUT,
+    )
+    return db_pool
 
 
 def get_db_connection():
     """
     Establishes a connection to the MySQL database using credentials from environment variables.
 
+    Connections come from the pool once it is open; closing them returns them to
+    the pool. Without a pool, or when every pooled connection is in use, a new
+    connection is opened.
+
     Returns:
         mysql.connector.connection: A connection object to the MySQL database.
     """
+    if db_pool is not None:
+        try:
+            return db_pool.get_connection()
+        except pooling.PoolError:
+            pass  # Pool exhausted, fall back to a dedicated connection
     return mysql.connector.connect(
-        host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        connection_timeout=DB_CONNECT_TIMEOUT,
     )
@@ -0,0 +1,139 @@
+import re
+import time
+import bisect
+import threading
+from server.database.storage import Storage, MAX_MESSAGE_ID, is_public, search_words
+
+
+class MemoryStorage(Storage):
+    """
+    Storage in process memory, for benchmarks and tests without a database.
+
+    Clients authenticate against MySQL, so users are created here when they first
+    send a message or join a group. Nothing survives a restart.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        """Initializes an empty store."""
+        self.lock = threading.Lock()
+        self.users = {}  # Lowercase username -> (ID, username)
+        self.groups = {}  # Group name -> lowercase usernames of its members
+        self.conversations = {}  # Conversation key -> rows ordered by ID
+        self.last_id = 0
+
+    def user_id(self, username):
+        """Returns a user's ID, creating the user if needed. Called with the lock held."""
+        user = self.users.get(username.lower())
+        if user is None:
+            user = self.users[username.lower()] = (len(self.users) + 1, username)
+        return user[0]
+
+    def conversation_key(self, username, chat_identifier):
+        """Returns the key of the rows of a conversation seen by the given user."""
+        if is_public(chat_identifier):
+            return ("public",)
+        if chat_identifier.startswith("group:"):
+            return ("group", chat_identifier.split(":", 1)[1])
+        return ("private",) + tuple(sorted((username.lower(), chat_identifier.lower())))
+
+    def get_all_users(self):
+        """Returns the usernames of every known user."""
+        with self.lock:
+            return [username for _, username in self.users.values()]
+
+    def get_user_id(self, username):
+        """Returns a user's ID, or None if the user is unknown."""
+        with self.lock:
+            user = self.users.get(username.lower())
+        return user[0] if user else None
+
+    def add_user(self, username, password_hash=""):
+        """Creates a user unless the username exists, and returns the user's ID."""
+        with self.lock:
+            return self.user_id(username)
+
+    def group_members(self, group_name):
+        """Returns the usernames of a group's members."""
+        with self.lock:
+            return [self.users[name][1] for name in self.groups.get(group_name, ())]
+
+    def add_group_member(self, group_name, username):
+        """Adds a user to a group, creating the user and the group if needed."""
+        with self.lock:
+            self.user_id(username)
+            self.groups.setdefault(group_name, set()).add(username.lower())
+
+    def store_message(
+        self, sender, recipient, group, message, message_id=0, timestamp=0
+    ):
+        """Stores a message in its conversation, keeping rows ordered by ID."""
+        with self.lock:
+            self.user_id(sender)
+            if recipient:
+                self.user_id(recipient)
+                key = self.conversation_key(sender, recipient)
+            elif group:
+                key = ("group", group)
+            else:
+                key = ("public",)
+            message_id = message_id or self.last_id + 1
+            self.last_id = max(self.last_id, message_id)
+            row = (message_id, timestamp or int(time.time() * 1000), sender, message)
+            rows = self.conversations.setdefault(key, [])
+            if rows and rows[-1][0] > message_id:
+                bisect.insort(rows, row)  # Stored slightly out of ID order
+            else:
+                rows.append(row)
+
+    def last_message_id(self):
+        """Returns the highest stored message ID."""
+        with self.lock:
+            return self.last_id
+
+    def can_read(self, username, conversation):
+        """Returns False for a group the user is not a member of, True otherwise."""
+        if not conversation.startswith("group:"):
+            return True
+        members = self.groups.get(conversation.split(":", 1)[1], ())
+        return (username or "").lower() in members
+
+    def history(self, username, chat_identifier, after_id, before_id, limit, batch):
+        """Yields a copy of the page, so the lock is not held while the client reads."""
+        with self.lock:
+            if not self.can_read(username, chat_identifier):
+                return
+            rows = self.conversations.get(
+                self.conversation_key(username or "", chat_identifier), []
+            )
+            start = bisect.bisect_left(rows, (after_id + 1,))
+            end = bisect.bisect_left(rows, (before_id or MAX_MESSAGE_ID,))
+            page = rows[max(start, end - limit) : end]
+        for offset in range(0, len(page), batch):
+            yield page[offset : offset + batch]
+
+    def search(self, username, conversation, text, before_id, limit):
+        """Matches every word as a prefix of a word in the message, newest first."""
+        words = [word.lower() for word in search_words(text)]
+        if not words:
+            return [], 0
+        with self.lock:
+            if not self.can_read(username, conversation):
+                return [], 0
+            rows = self.conversations.get(
+                self.conversation_key(username, conversation), []
+            )
+            end = bisect.bisect_left(rows, (before_id or MAX_MESSAGE_ID,))
+            results = []
+            for row in reversed(rows[:end]):
+                message_words = re.findall(r"\w+", row[3].lower())
+                if all(
+                    any(candidate.startswith(word) for candidate in message_words)
+                    for word in words
+                ):
+                    results.append(row)
+                    if len(results) == limit:
+                        break
+        next_before_id = results[-1][0] if len(results) == limit else 0
+        return results, next_before_id
@@ -0,0 +1,400 @@
+import logging
+import mysql.connector
+from server.database.connection import get_db_connection, init_db_pool
+from server.database.archive import archived_through
+from server.database.user import get_all_users, get_user_id, load_user_ids
+from server.database.storage import (
+    Storage,
+    MAX_MESSAGE_ID,
+    is_public,
+    search_words,
+)
+
+
+def conversation_query(table, user_id, chat_identifier):
+    """
+    Builds the start of a query selecting a conversation's messages from one storage tier.
+
+    Group messages only match if the user is a member of the group, so history
+    and search see the same messages.
+
+    Args:
+        table (str): 'messages' for the hot tier or 'messages_archive'.
+        user_id (int): The ID of the user reading the conversation.
+        chat_identifier (str): 'public', 'All', 'group:<groupname>', or a username.
+
+    Returns:
+        tuple: The SELECT ... WHERE clause, ending with a space so conditions can
+        be appended with AND, and its parameters.
+    """
+    columns = (
+        "SELECT messages.id, "
+        "COALESCE(CAST(UNIX_TIMESTAMP(messages.timestamp) * 1000 AS UNSIGNED), 0) AS sent_at, "
+        "users.username, messages.message "
+        f"FROM {table} AS messages JOIN users ON messages.sender_id = users.id "
+    )
+    if chat_identifier == "public" or chat_identifier == "All":
+        # Retrieve all public messages
+        return columns + "WHERE recipient_id IS NULL AND group_id IS NULL ", ()
+    if chat_identifier.startswith("group:"):
+        # Retrieve messages for a specific group
+        group_name = chat_identifier.split(":", 1)[1]
+        query = (
+            columns + "JOIN `groups` ON messages.group_id = `groups`.id "
+            "WHERE `groups`.name = %s "
+            "AND EXISTS (SELECT 1 FROM group_memberships "
+            "WHERE group_memberships.group_id = messages.group_id "
+            "AND group_memberships.user_id = %s) "
+        )
+        return query, (group_name, user_id)
+    # Retrieve private message history
+    query = (
+        columns
+        + "WHERE ((messages.sender_id = %s AND messages.recipient_id = (SELECT id FROM users WHERE username = %s)) "
+        "OR (messages.sender_id = (SELECT id FROM users WHERE username = %s) AND messages.recipient_id = %s)) "
+    )
+    return query, (user_id, chat_identifier, chat_identifier, user_id)
+
+
+def history_query(table, user_id, chat_identifier, after_id, before_id, limit):
+    """
+    Builds the query for one page of a chat's history from one storage tier.
+
+    The page holds the newest matching messages below before_id, returned oldest
+    first, so the query reads at most `limit` rows however large the table is.
+
+    Args:
+        table (str): 'messages' for the hot tier or 'messages_archive'.
+        user_id (int): The ID of the user requesting the history.
+        chat_identifier (str): 'public', 'All', 'group:<groupname>', or a username.
+        after_id (int): Only include messages with a higher ID.
+        before_id (int): Only include messages with a lower ID.
+        limit (int): The maximum number of messages.
+
+    Returns:
+        tuple: The SQL query and its parameters.
+    """
+    query, params = conversation_query(table, user_id, chat_identifier)
+    # IDs are assigned in delivery order, unlike second-resolution timestamps
+    query += (
+        "AND messages.id > %s AND messages.id < %s ORDER BY messages.id DESC LIMIT %s"
+    )
+    return (
+        f"SELECT * FROM ({query}) AS page ORDER BY id ASC",
+        params + (after_id, before_id, limit),
+    )
+
+
+def history_queries(cursor, user_id, chat_identifier, after_id, before_id, limit):
+    """
+    Builds the queries for one page of a chat's history across both storage tiers.
+
+    The hot messages table is read first; the archive is only queried when the
+    page reaches below the archived IDs.
+
+    Args:
+        cursor: An open database cursor, used to find the archive boundary.
+        user_id (int): The ID of the user requesting the history.
+        chat_identifier (str): 'public', 'All', 'group:<groupname>', or a username.
+        after_id (int): Only include messages with a higher ID.
+        before_id (int): Only include messages with a lower ID, 0 for the newest.
+        limit (int): The maximum number of messages.
+
+    Returns:
+        list: (query, params) pairs to run in order, the older messages first.
+    """
+    before_id = before_id or MAX_MESSAGE_ID
+    boundary = archived_through(cursor)
+    page = (user_id, chat_identifier, after_id)
+
+    hot_query = None
+    hot_count = 0
+    if before_id > boundary + 1:
+        hot_query = history_query("messages", *page, before_id, limit)
+        if boundary > after_id:
+            # Only count when the archive could be needed to fill the page
+            cursor.execute(
+                f"SELECT COUNT(*) FROM ({hot_query[0]}) AS hot", hot_query[1]
+            )
+            hot_count = cursor.fetchone()[0]
+        else:
+            hot_count = limit
+
+    # Older messages go first, so the archive part of a page is sent before the hot part
+    queries = []
+    if hot_count < limit and boundary > after_id:
+        queries.append(
+            history_query(
+                "messages_archive",
+                *page,
+                min(before_id, boundary + 1),
+                limit - hot_count,
+            )
+        )
+    if hot_query is not None:
+        queries.append(hot_query)
+    return queries
+
+
+def fulltext_terms(text):
+    """
+    Converts free text into a boolean-mode FULLTEXT query.
+
+    Every word is required and matched as a prefix; operators typed by the user
+    are dropped, so the query cannot be used to change the search syntax.
+
+    Args:
+        text (str): The text the user searched for.
+
+    Returns:
+        str: The FULLTEXT query, empty if the text holds no words.
+    """
+    return " ".join(f"+{word}*" for word in search_words(text))
+
+
+def search_query(table, user_id, conversation, terms, before_id, limit):
+    """
+    Builds the query for one page of search results from one storage tier.
+
+    Args:
+        table (str): 'messages' for the hot tier or 'messages_archive'.
+        user_id (int): The ID of the user searching.
+        conversation (str): 'public', 'All', 'group:<groupname>', or a username.
+        terms (str): The FULLTEXT query, as built by fulltext_terms.
+        before_id (int): Only include messages with a lower ID.
+        limit (int): The maximum number of results.
+
+    Returns:
+        tuple: The SQL query and its parameters.
+    """
+    query, params = conversation_query(table, user_id, conversation)
+    query += (
+        "AND MATCH(messages.message) AGAINST (%s IN BOOLEAN MODE) "
+        "AND messages.id < %s ORDER BY messages.id DESC LIMIT %s"
+    )
+    return query, params + (terms, before_id, limit)
+
+
+class MySQLStorage(Storage):
+    """Storage in the MySQL database described in the README, with an archive tier."""
+
+    name = "mysql"
+    errors = (mysql.connector.Error,)
+    archives = True
+
+    def open(self):
+        """Opens the connection pool."""
+        init_db_pool()
+
+    def load_user_ids(self):
+        """Loads every user's ID into the identity cache."""
+        return load_user_ids()
+
+    def get_all_users(self):
+        """Returns the usernames of every registered user."""
+        return get_all_users()
+
+    def get_user_id(self, username):
+        """Returns a user's ID from the identity cache or the database."""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            return get_user_id(cursor, username)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def add_user(self, username, password_hash=""):
+        """Registers a user unless the username exists, and returns the user's ID."""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT IGNORE INTO users (username, password) VALUES (%s, %s)",
+                (username, password_hash),
+            )
+            conn.commit()
+            return get_user_id(cursor, username)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def group_members(self, group_name):
+        """Returns the usernames of a group's members."""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT users.username FROM users "
+                "JOIN group_memberships ON users.id = group_memberships.user_id "
+                "JOIN `groups` ON group_memberships.group_id = `groups`.id "
+                "WHERE `groups`.name = %s",
+                (group_name,),
+            )
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def add_group_member(self, group_name, username):
+        """Adds a user to a group, creating the user and the group if needed."""
+        user_id = self.add_user(username)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT IGNORE INTO `groups` (name) VALUES (%s)", (group_name,)
+            )
+            cursor.execute(
+                "INSERT INTO group_memberships (group_id, user_id) "
+                "SELECT id, %s FROM `groups` WHERE name = %s "
+                "AND NOT EXISTS (SELECT 1 FROM group_memberships "
+                "WHERE group_memberships.group_id = `groups`.id "
+                "AND group_memberships.user_id = %s)",
+                (user_id, group_name, user_id),
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def store_message(
+        self, sender, recipient, group, message, message_id=0, timestamp=0
+    ):
+        """Stores a sent message, keeping the ID the recipients received."""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            sender_id = get_user_id(cursor, sender)
+            recipient_id = get_user_id(cursor, recipient) if recipient else None
+            group_id = None
+
+            if sender_id is None or (recipient and recipient_id is None):
+                logging.error(
+                    f"Error storing message in DB: unknown user in {sender}, {recipient}"
+                )
+                return
+
+            if group:
+                # Fetch group ID for group message
+                cursor.execute("SELECT id FROM `groups` WHERE name = %s", (group,))
+                group_id = cursor.fetchone()[0]
+
+            # Insert message into the database, keeping the ID the recipients received
+            if message_id:
+                cursor.execute(
+                    "INSERT INTO messages (id, sender_id, recipient_id, group_id, message, timestamp) "
+                    "VALUES (%s, %s, %s, %s, %s, FROM_UNIXTIME(%s))",
+                    (
+                        message_id,
+                        sender_id,
+                        recipient_id,
+                        group_id,
+                        message,
+                        timestamp / 1000,
+                    ),
+                )
+            else:
+                cursor.execute(
+                    "INSERT INTO messages (sender_id, recipient_id, group_id, message) VALUES (%s, %s, %s, %s)",
+                    (sender_id, recipient_id, group_id, message),
+                )
+            conn.commit()
+            logging.debug("Stored message in DB.")
+        finally:
+            cursor.close()
+            conn.close()
+
+    def last_message_id(self):
+        """Returns the highest message ID in either tier, 0 if there are no messages."""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM messages")
+            last_id = int(cursor.fetchone()[0])
+            return max(last_id, archived_through(cursor))  # The hot table may be empty
+        finally:
+            cursor.close()
+            conn.close()
+
+    def history(self, username, chat_identifier, after_id, before_id, limit, batch):
+        """
+        Streams a history page from an unbuffered cursor, reading the archive only
+        when the page reaches below the archived IDs.
+        """
+        conn_db = get_db_connection()
+        # Unbuffered cursor: rows stay on the server until fetched, so memory per
+        # request is bounded by the batch size rather than the history size
+        cursor = conn_db.cursor(buffered=False)
+        finished = False
+        try:
+            user_id = 0
+            if not is_public(chat_identifier):
+                user_id = get_user_id(cursor, username)
+                if user_id is None:
+                    logging.error(
+                        f"Error retrieving message history: unknown user {username}"
+                    )
+                    finished = True
+                    return
+
+            for query, params in history_queries(
+                cursor, user_id, chat_identifier, after_id, before_id, limit
+            ):
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch)
+                    if not rows:
+                        break
+                    yield rows
+            finished = True
+        finally:
+            if not finished:
+                conn_db.consume_results()  # Discard the unread rows
+            cursor.close()
+            conn_db.close()
+
+    def search(self, username, conversation, text, before_id, limit):
+        """
+        Searches with the FULLTEXT index, reading the archive only when the hot
+        tier cannot fill the page.
+        """
+        terms = fulltext_terms(text)
+        if not terms:
+            return [], 0
+
+        conn_db = get_db_connection()
+        cursor = conn_db.cursor()
+        try:
+            user_id = get_user_id(cursor, username)
+            if user_id is None:
+                return [], 0
+
+            before_id = before_id or MAX_MESSAGE_ID
+            boundary = archived_through(cursor)
+            results = []
+            if before_id > boundary + 1:
+                cursor.execute(
+                    *search_query(
+                        "messages", user_id, conversation, terms, before_id, limit
+                    )
+                )
+                results = cursor.fetchall()  # At most one page
+            if len(results) < limit and boundary:
+                # Only touch the archive when the hot tier cannot fill the page
+                cursor.execute(
+                    *search_query(
+                        "messages_archive",
+                        user_id,
+                        conversation,
+                        terms,
+                        min(before_id, boundary + 1),
+                        limit - len(results),
+                    )
+                )
+                results += cursor.fetchall()
+            next_before_id = results[-1][0] if len(results) == limit else 0
+            return results, next_before_id
+        finally:
+            cursor.close()
+            conn_db.close()
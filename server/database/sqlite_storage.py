@@ -0,0 +1,217 @@
+import os
+import time
+import sqlite3
+import threading
+from server.database.storage import Storage, MAX_MESSAGE_ID, is_public, search_words
+
+# Database file used by the SQLite backend, ':memory:' keeps it in memory
+SQLITE_PATH = os.getenv("SQLITE_PATH", "chase.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    password TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS group_memberships (
+    group_id INTEGER NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    PRIMARY KEY (group_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    sender_id INTEGER REFERENCES users (id),
+    recipient_id INTEGER REFERENCES users (id),
+    group_id INTEGER REFERENCES groups (id),
+    message TEXT NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_recipient ON messages (recipient_id, sender_id);
+CREATE INDEX IF NOT EXISTS messages_group ON messages (group_id);
+"""
+
+COLUMNS = (
+    "SELECT messages.id, messages.timestamp, users.username, messages.message "
+    "FROM messages JOIN users ON messages.sender_id = users.id "
+)
+
+
+class SQLiteStorage(Storage):
+    """
+    Storage in a local SQLite file, for running the server without MySQL.
+
+    Clients authenticate against MySQL, so users are created here when they first
+    send a message or join a group. Search matches words anywhere in a message
+    with LIKE, there is no full-text index.
+    """
+
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path=SQLITE_PATH):
+        """
+        Initializes the backend; the database is opened on first use.
+
+        Args:
+            path (str): The database file.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = None
+
+    def connection(self):
+        """Returns the shared connection, creating the schema on first use. Called with the lock held."""
+        if self.db is None:
+            # One connection shared by every thread, serialized by the lock
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.executescript(SCHEMA)
+        return self.db
+
+    def query(self, sql, params=()):
+        """Runs a read query and returns every row."""
+        with self.lock:
+            return self.connection().execute(sql, params).fetchall()
+
+    def open(self):
+        """Opens the database and creates the schema."""
+        with self.lock:
+            self.connection()
+
+    def user_id(self, db, username):
+        """Returns a user's ID, creating the user if needed. Called with the lock held."""
+        db.execute("INSERT OR IGNORE INTO users (username) VALUES (?)", (username,))
+        return db.execute(
+            "SELECT id FROM users WHERE username = ?", (username,)
+        ).fetchone()[0]
+
+    def get_all_users(self):
+        """Returns the usernames of every registered user."""
+        return [row[0] for row in self.query("SELECT username FROM users")]
+
+    def get_user_id(self, username):
+        """Returns a user's ID, or None if there is no such user."""
+        rows = self.query("SELECT id FROM users WHERE username = ?", (username,))
+        return rows[0][0] if rows else None
+
+    def add_user(self, username, password_hash=""):
+        """Registers a user unless the username exists, and returns the user's ID."""
+        with self.lock:
+            db = self.connection()
+            db.execute(
+                "INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)",
+                (username, password_hash),
+            )
+            db.commit()
+            return self.user_id(db, username)
+
+    def group_members(self, group_name):
+        """Returns the usernames of a group's members."""
+        rows = self.query(
+            "SELECT users.username FROM users "
+            "JOIN group_memberships ON users.id = group_memberships.user_id "
+            "JOIN groups ON group_memberships.group_id = groups.id "
+            "WHERE groups.name = ?",
+            (group_name,),
+        )
+        return [row[0] for row in rows]
+
+    def add_group_member(self, group_name, username):
+        """Adds a user to a group, creating the user and the group if needed."""
+        with self.lock:
+            db = self.connection()
+            user_id = self.user_id(db, username)
+            db.execute("INSERT OR IGNORE INTO groups (name) VALUES (?)", (group_name,))
+            db.execute(
+                "INSERT OR IGNORE INTO group_memberships (group_id, user_id) "
+                "SELECT id, ? FROM groups WHERE name = ?",
+                (user_id, group_name),
+            )
+            db.commit()
+
+    def store_message(
+        self, sender, recipient, group, message, message_id=0, timestamp=0
+    ):
+        """Stores a sent message, keeping the ID the recipients received."""
+        with self.lock:
+            db = self.connection()
+            sender_id = self.user_id(db, sender)
+            recipient_id = self.user_id(db, recipient) if recipient else None
+            group_id = None
+            if group:
+                db.execute("INSERT OR IGNORE INTO groups (name) VALUES (?)", (group,))
+                group_id = db.execute(
+                    "SELECT id FROM groups WHERE name = ?", (group,)
+                ).fetchone()[0]
+            db.execute(
+                "INSERT INTO messages (id, sender_id, recipient_id, group_id, message, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    message_id or None,  # NULL lets SQLite assign the next ID
+                    sender_id,
+                    recipient_id,
+                    group_id,
+                    message,
+                    timestamp or int(time.time() * 1000),
+                ),
+            )
+            db.commit()
+
+    def last_message_id(self):
+        """Returns the highest stored message ID, 0 if there are no messages."""
+        return self.query("SELECT COALESCE(MAX(id), 0) FROM messages")[0][0]
+
+    def conversation_where(self, username, chat_identifier):
+        """
+        Builds the WHERE clause selecting a conversation's messages, and its
+        parameters; group messages only match for members of the group.
+        """
+        if is_public(chat_identifier):
+            return "WHERE recipient_id IS NULL AND group_id IS NULL ", ()
+        if chat_identifier.startswith("group:"):
+            group_name = chat_identifier.split(":", 1)[1]
+            where = (
+                "WHERE group_id = (SELECT id FROM groups WHERE name = ?) "
+                "AND EXISTS (SELECT 1 FROM group_memberships "
+                "WHERE group_memberships.group_id = messages.group_id "
+                "AND group_memberships.user_id = "
+                "(SELECT id FROM users WHERE username = ?)) "
+            )
+            return where, (group_name, username)
+        where = (
+            "WHERE ((sender_id = (SELECT id FROM users WHERE username = ?) "
+            "AND recipient_id = (SELECT id FROM users WHERE username = ?)) "
+            "OR (sender_id = (SELECT id FROM users WHERE username = ?) "
+            "AND recipient_id = (SELECT id FROM users WHERE username = ?))) "
+        )
+        return where, (username, chat_identifier, chat_identifier, username)
+
+    def history(self, username, chat_identifier, after_id, before_id, limit, batch):
+        """Reads the page at once, it is bounded by the limit, and yields it in batches."""
+        where, params = self.conversation_where(username, chat_identifier)
+        rows = self.query(
+            f"SELECT * FROM ({COLUMNS}{where}"
+            "AND messages.id > ? AND messages.id < ? "
+            "ORDER BY messages.id DESC LIMIT ?) ORDER BY id ASC",
+            params + (after_id, before_id or MAX_MESSAGE_ID, limit),
+        )
+        for offset in range(0, len(rows), batch):
+            yield rows[offset : offset + batch]
+
+    def search(self, username, conversation, text, before_id, limit):
+        """Matches every word with LIKE, newest first."""
+        words = search_words(text)
+        if not words:
+            return [], 0
+        where, params = self.conversation_where(username, conversation)
+        where += "AND messages.message LIKE ? " * len(words)
+        params += tuple(f"%{word}%" for word in words)
+        results = self.query(
+            f"{COLUMNS}{where}AND messages.id < ? ORDER BY messages.id DESC LIMIT ?",
+            params + (before_id or MAX_MESSAGE_ID, limit),
+        )
+        next_before_id = results[-1][0] if len(results) == limit else 0
+        return results, next_before_id
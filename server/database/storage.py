@@ -0,0 +1,156 @@
+import os
+import re
+
+# Storage used by the server: 'mysql', 'sqlite' or 'memory'
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mysql")
+# Upper bound used when a request does not page below a given ID
+MAX_MESSAGE_ID = 2**63 - 1
+# Words of a search query that are used, later words are ignored
+SEARCH_MAX_TERMS = 8
+
+
+def search_words(text):
+    """
+    Splits search text into the words every backend matches on.
+
+    Args:
+        text (str): The text the user searched for.
+
+    Returns:
+        list: Up to SEARCH_MAX_TERMS words, without punctuation or operators.
+    """
+    return re.findall(r"\w+", text)[:SEARCH_MAX_TERMS]
+
+
+def is_public(chat_identifier):
+    """Returns True for the identifiers of the public chat."""
+    return chat_identifier == "public" or chat_identifier == "All"
+
+
+class Storage:
+    """
+    The persistence used by the server: users, groups, memberships and messages.
+
+    Rows of messages are (id, timestamp in ms, sender username, text) tuples.
+    Conversations are identified as in history requests: 'public' or 'All',
+    'group:<groupname>', or the username of the other side of a private chat.
+    """
+
+    name = None
+    # Exceptions a backend raises when the store fails, caught by the server
+    errors = ()
+    # Whether the background job moves old messages to an archive table
+    archives = False
+
+    def open(self):
+        """Prepares the backend at server startup, e.g. a pool or the schema."""
+
+    def load_user_ids(self):
+        """
+        Loads every user's ID ahead of the first lookup.
+
+        Returns:
+            int: The number of users loaded.
+        """
+        return len(self.get_all_users())
+
+    def get_all_users(self):
+        """Returns the usernames of every registered user."""
+        raise NotImplementedError
+
+    def get_user_id(self, username):
+        """Returns a user's ID, or None if there is no such user."""
+        raise NotImplementedError
+
+    def add_user(self, username, password_hash=""):
+        """Registers a user unless the username exists, and returns the user's ID."""
+        raise NotImplementedError
+
+    def group_members(self, group_name):
+        """Returns the usernames of a group's members."""
+        raise NotImplementedError
+
+    def add_group_member(self, group_name, username):
+        """Adds a user to a group, creating the user and the group if needed."""
+        raise NotImplementedError
+
+    def store_message(
+        self, sender, recipient, group, message, message_id=0, timestamp=0
+    ):
+        """
+        Stores a sent message, associated with either a recipient or a group.
+
+        Args:
+            sender (str): The username of the message sender.
+            recipient (str | None): The recipient's username, for private messages.
+            group (str | None): The group's name, for group messages.
+            message (str): The content of the message.
+            message_id (int): The server-assigned ID, 0 to let the store assign one.
+            timestamp (int): The server-assigned timestamp in milliseconds.
+        """
+        raise NotImplementedError
+
+    def last_message_id(self):
+        """Returns the highest stored message ID, 0 if there are no messages."""
+        raise NotImplementedError
+
+    def history(self, username, chat_identifier, after_id, before_id, limit, batch):
+        """
+        Yields the newest `limit` messages of a chat between two IDs, oldest first.
+
+        Closing the generator early releases whatever the backend holds.
+
+        Args:
+            username (str | None): The user reading the chat, None for public history.
+            chat_identifier (str): The conversation.
+            after_id (int): Only include messages with a higher ID.
+            before_id (int): Only include messages with a lower ID, 0 for the newest.
+            limit (int): The maximum number of messages.
+            batch (int): The number of messages per yielded list.
+
+        Yields:
+            list: Up to `batch` message rows.
+        """
+        raise NotImplementedError
+
+    def search(self, username, conversation, text, before_id, limit):
+        """
+        Searches a conversation the user can see for messages containing every word.
+
+        Args:
+            username (str): The user searching.
+            conversation (str): The conversation.
+            text (str): The words to search for.
+            before_id (int): Only return messages with a lower ID, 0 for the newest.
+            limit (int): The maximum number of results.
+
+        Returns:
+            tuple: Message rows, newest first, and the before ID of the next page,
+            0 if there is none.
+        """
+        raise NotImplementedError
+
+
+def create_storage(backend=STORAGE_BACKEND):
+    """
+    Creates the storage backend selected by name.
+
+    Args:
+        backend (str): 'mysql', 'sqlite' or 'memory'.
+
+    Returns:
+        Storage: The backend.
+    """
+    if backend == "mysql":
+        from server.database.mysql_storage import MySQLStorage
+
+        return MySQLStorage()
+    if backend == "sqlite":
+        from server.database.sqlite_storage import SQLiteStorage
+
+        return SQLiteStorage()
+    if backend == "memory":
+        from server.database.memory_storage import MemoryStorage
+
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend '{backend}'")
@@ -0,0 +1,169 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# 'json' writes one JSON object per line, 'text' the classic format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Records waiting for the writer thread, newer records are dropped when full
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Records per second each call site may write, and the burst it may save up
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", "100"))
+# Keep 1 in N DEBUG and INFO records per call site; a record's 'sample' extra overrides it
+LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", "1"))
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# Attributes every LogRecord has, anything else was passed as an extra
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# The running writer, one per process
+listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects, including their extra fields."""
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+            "site": f"{record.module}:{record.lineno}",
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class CallSiteFilter(logging.Filter):
+    def __init__(
+        self, rate=LOG_RATE_LIMIT, burst=LOG_RATE_BURST, sample=LOG_SAMPLE_RATE
+    ):
+        """
+        Initializes per-call-site sampling and rate limiting.
+
+        Each logging call site, its file and line, is counted separately, so a
+        flood from one place does not silence the others. Suppressed records are
+        counted and reported on the next record the site writes.
+
+        Args:
+            rate (float): Records per second a call site may write, 0 for no limit.
+            burst (int): Records a call site may write at once after being quiet.
+            sample (int): Keep 1 in this many DEBUG and INFO records per call site.
+
+        Raises:
+            ValueError: If `sample` is below 1.
+        """
+        if sample < 1:
+            raise ValueError(f"LOG_SAMPLE_RATE must be at least 1, got {sample}")
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample = sample
+        self.lock = threading.Lock()
+        self.sites = {}  # (pathname, lineno) -> [tokens, updated, seen, suppressed]
+
+    def filter(self, record):
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None:
+                site = self.sites[key] = [self.burst, now, 0, 0]
+            site[2] += 1
+            sample = max(1, getattr(record, "sample", self.sample))
+            if record.levelno < logging.WARNING and (site[2] - 1) % sample:
+                return False  # Sampled out, not worth reporting
+            if self.rate:
+                site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+                site[1] = now
+                if site[0] < 1:
+                    site[3] += 1
+                    return False
+                site[0] -= 1
+            if site[3]:
+                record.suppressed = site[3]
+                site[3] = 0
+        return True
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread without formatting them.
+
+    The stock QueueHandler formats each message on the calling thread so the
+    record can be pickled; records here stay in-process, so formatting is left to
+    the writer. A full queue drops the record instead of blocking the caller.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(path, level=LOG_LEVEL, log_format=LOG_FORMAT):
+    """
+    Routes the root logger through a queue to a rotating file written by a
+    background thread. Later calls keep the pipeline already running.
+
+    Args:
+        path (str): The log file, e.g. 'logs/server.log'; its directory is created.
+        level (str): The lowest level logged.
+        log_format (str): 'json' or 'text'.
+
+    Returns:
+        QueueListener: The running writer.
+    """
+    global listener
+    if listener is not None:
+        return listener
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Rotate at 5 MB, keeping 5 backups
+    file_handler = RotatingFileHandler(path, maxBytes=5000000, backupCount=5)
+    if log_format == "json":
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = BackgroundQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(CallSiteFilter())
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    listener = QueueListener(queue_handler.queue, file_handler)
+    listener.start()
+    atexit.register(stop_logging)
+    return listener
+
+
+def stop_logging():
+    """Writes the records still queued and stops the writer thread."""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -0,0 +1,303 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local address of the metrics endpoint, METRICS_PORT=0 disables it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# Upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+# Upper bounds of the fan-out histogram, in recipients
+FANOUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Every metric, in the order it is exposed
+registry = []
+
+
+def escape(value):
+    """Escapes a label value for the text exposition format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=""):
+    """Formats label pairs as '{name="value",...}', with an optional extra pair."""
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterValue:
+    """One labelled series of a counter."""
+
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        """Adds to the counter."""
+        with self.lock:
+            self.value += amount
+
+
+class HistogramValue:
+    """One labelled series of a histogram."""
+
+    __slots__ = ("lock", "buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        """Records one observation."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observes the seconds spent in the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Metric:
+    def __init__(self, name, help_text, labelnames=()):
+        """
+        Initializes a metric and adds it to the registry.
+
+        Args:
+            name (str): The exposed name, e.g. 'chase_connections_accepted_total'.
+            help_text (str): The HELP line.
+            labelnames (tuple): The names of the labels distinguishing its series.
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.series = {}
+        registry.append(self)
+
+    def labels(self, *values):
+        """
+        Returns the series for the given label values, creating it on first use.
+
+        Hot paths keep the returned series, so recording is one locked update.
+        """
+        series = self.series.get(values)
+        if series is None:
+            with self.lock:
+                series = self.series.get(values)
+                if series is None:
+                    series = self.series[values] = self.new_series()
+        return series
+
+    def new_series(self):
+        raise NotImplementedError
+
+    def header(self, metric_type):
+        """Returns the HELP and TYPE lines."""
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {metric_type}",
+        ]
+
+
+class Counter(Metric):
+    """A value that only goes up, such as a number of events."""
+
+    def new_series(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        """Adds to the unlabelled counter."""
+        self.labels().inc(amount)
+
+    def expose(self):
+        """Returns the metric in the text exposition format."""
+        lines = self.header("counter")
+        for values, series in list(self.series.items()):
+            lines.append(
+                f"{self.name}{format_labels(self.labelnames, values)} {series.value}"
+            )
+        return lines
+
+
+class Histogram(Metric):
+    """A distribution of observations, counted in cumulative buckets."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def new_series(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        """Records one observation in the unlabelled histogram."""
+        self.labels().observe(value)
+
+    def time(self):
+        """Observes the seconds spent in the with block in the unlabelled histogram."""
+        return self.labels().time()
+
+    def expose(self):
+        """Returns the metric in the text exposition format."""
+        lines = self.header("histogram")
+        for values, series in list(self.series.items()):
+            with series.lock:
+                counts, total, count = list(series.counts), series.sum, series.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labelnames, values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge(Metric):
+    """A value read when the metrics are scraped, such as a queue length."""
+
+    def __init__(self, name, help_text, labelnames, collect):
+        """
+        Initializes the gauge.
+
+        Args:
+            collect: Function returning (label values, value) pairs at scrape time.
+        """
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+
+    def expose(self):
+        """Returns the metric in the text exposition format."""
+        lines = self.header("gauge")
+        for values, value in self.collect():
+            lines.append(f"{self.name}{format_labels(self.labelnames, values)} {value}")
+        return lines
+
+
+def render():
+    """
+    Renders every registered metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The exposition, ending with a newline.
+    """
+    lines = []
+    for metric in registry:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the exposition on GET /metrics."""
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Serves the metrics over HTTP on a background thread.
+
+    Args:
+        host (str): The address to listen on, local by default.
+        port (int): The port to listen on, 0 disables the endpoint.
+
+    Returns:
+        ThreadingHTTPServer | None: The running server, or None if disabled.
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+# Server metrics, recorded on the hot paths
+connections_accepted = Counter(
+    "chase_connections_accepted_total", "Connections accepted by the server."
+)
+tls_handshake_seconds = Histogram(
+    "chase_tls_handshake_seconds", "Time spent in server-side TLS handshakes."
+)
+messages_routed = Counter(
+    "chase_messages_routed_total", "Chat messages routed, by type.", ("type",)
+)
+fanout_recipients = Histogram(
+    "chase_fanout_recipients",
+    "Connections a routed message was queued for.",
+    ("type",),
+    FANOUT_BUCKETS,
+)
+fanout_seconds = Histogram(
+    "chase_fanout_seconds",
+    "Time from routing a message to queueing it for every recipient, by type.",
+    ("type",),
+)
+storage_seconds = Histogram(
+    "chase_storage_seconds",
+    "Latency of storage operations, by operation.",
+    ("operation",),
+)
+history_rows_served = Counter(
+    "chase_history_rows_served_total", "History messages sent to clients."
+)
+rate_limited = Counter(
+    "chase_rate_limited_total",
+    "Messages refused by per-user rate limits, by type.",
+    ("type",),
+)
+admission_rejected = Counter(
+    "chase_admission_rejected_total",
+    "Requests turned away while the server is busy, by resource.",
+    ("resource",),
+)
+bytes_sent = Counter("chase_bytes_sent_total", "Bytes written to client connections.")
@@ -0,0 +1,264 @@
+import os
+import time
+import threading
+from server import metrics
+from server.network import protocol
+from server.network.protocol import Frame
+
+
+def parse_limit(value):
+    """
+    Parses a 'rate/burst' limit, e.g. '5/20' for 5 per second in bursts of 20.
+
+    Args:
+        value (str): The limit; a lone rate allows bursts of that size, 0 disables it.
+
+    Returns:
+        tuple: The rate per second and the burst.
+    """
+    rate, _, burst = value.partition("/")
+    return float(rate), float(burst or rate)
+
+
+# Messages each user may send per second, and in a burst, per message type
+RATE_LIMITS = {
+    kind: parse_limit(os.getenv(f"RATE_LIMIT_{kind.upper()}", default))
+    for kind, default in (
+        ("public", "5/20"),
+        ("private", "10/30"),
+        ("group", "5/20"),
+        ("history", "2/10"),
+        ("search", "1/5"),
+    )
+}
+# Seconds between sweeps dropping the rate limit buckets of idle users
+RATE_LIMIT_SWEEP_INTERVAL = 60
+# Connected clients above which new logins are turned away
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "10000"))
+# New connections per second, and in a burst, before the TLS handshake; 0 disables
+CONNECTION_RATE_LIMIT = parse_limit(os.getenv("CONNECTION_RATE_LIMIT", "0"))
+# History pages read from storage at once, and seconds a request waits for a turn
+HISTORY_CONCURRENCY = int(os.getenv("HISTORY_CONCURRENCY", "16"))
+HISTORY_ADMISSION_TIMEOUT = float(os.getenv("HISTORY_ADMISSION_TIMEOUT", "5"))
+
+# Message types of the frames clients send
+FRAME_KINDS = {
+    protocol.SEND_PUBLIC: "public",
+    protocol.SEND_PRIVATE: "private",
+    protocol.SEND_GROUP: "group",
+    protocol.HISTORY_REQUEST: "history",
+    protocol.SEARCH_REQUEST: "search",
+}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "retired", "lock")
+
+    def __init__(self, rate, burst):
+        """
+        Initializes a bucket that starts full and refills continuously.
+
+        Args:
+            rate (float): Tokens added per second.
+            burst (float): The most tokens the bucket holds.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.retired = False  # Set once a sweep has dropped the bucket
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Takes a token if one is available.
+
+        Returns:
+            float | None: 0 if a token was taken, otherwise the seconds until one
+            is; None if the bucket was retired, so the caller looks up its successor.
+        """
+        with self.lock:
+            if self.retired:
+                return None
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def retire(self, now):
+        """
+        Retires the bucket if it has refilled, so a new bucket would match it.
+
+        Checked and set under the bucket's lock, so no token can be taken from
+        it once it is retired.
+
+        Returns:
+            bool: True if the bucket was retired.
+        """
+        with self.lock:
+            if self.tokens + (now - self.updated) * self.rate >= self.burst:
+                self.retired = True
+            return self.retired
+
+
+class RateLimiter:
+    def __init__(self, limits=RATE_LIMITS, sweep_interval=RATE_LIMIT_SWEEP_INTERVAL):
+        """
+        Initializes the per-user, per-type message rate limits.
+
+        Buckets are shared by all connections of a user, so reconnecting or
+        logging in twice does not reset them. Usernames are chosen by clients,
+        so buckets that have refilled are dropped every `sweep_interval` seconds
+        rather than kept for every name ever seen.
+
+        Args:
+            limits (dict): Message type to (rate, burst); a zero rate is unlimited.
+            sweep_interval (float): Seconds between sweeps of idle buckets.
+        """
+        self.limits = limits
+        self.sweep_interval = sweep_interval
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.next_sweep = time.monotonic() + sweep_interval
+
+    def check(self, username, kind):
+        """
+        Counts one message of a type against the user's limit.
+
+        Args:
+            username (str): The sender.
+            kind (str): The message type, e.g. 'public' or 'history'.
+
+        Returns:
+            float: 0 if the message is allowed, otherwise the seconds to wait.
+        """
+        rate, burst = self.limits.get(kind, (0, 0))
+        if not rate:
+            return 0
+        key = (username.lower(), kind)
+        while True:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                with self.lock:
+                    # Only new buckets grow the table, so sweeping here keeps it off the hot path
+                    if time.monotonic() >= self.next_sweep:
+                        self.sweep()
+                    bucket = self.buckets.setdefault(key, TokenBucket(rate, burst))
+            wait = bucket.take()
+            if wait is not None:
+                return wait
+            # Swept since it was looked up; count the message against the new bucket
+
+    def sweep(self):
+        """
+        Drops the buckets that have refilled; dropping one changes no limit, as its
+        user would get an identical full bucket. A dropped bucket is retired, so a
+        sender still holding it takes its token from the new bucket instead.
+        Called with the lock held.
+        """
+        now = time.monotonic()
+        self.next_sweep = now + self.sweep_interval
+        for key in [key for key, bucket in self.buckets.items() if bucket.retire(now)]:
+            del self.buckets[key]
+
+
+rate_limiter = RateLimiter()
+connection_bucket = (
+    TokenBucket(*CONNECTION_RATE_LIMIT) if CONNECTION_RATE_LIMIT[0] else None
+)
+history_slots = threading.BoundedSemaphore(HISTORY_CONCURRENCY)
+# Logged-in clients, reserved before a client is registered so bursts cannot overshoot
+login_slots = threading.BoundedSemaphore(MAX_CONNECTIONS)
+
+
+def text_kind(message):
+    """Returns the message type of a text-protocol message, as process_message routes it."""
+    if message.startswith("HISTORY:"):
+        return "history"
+    if message.startswith(("SEARCH:", "SEARCH_MORE:")):
+        return "search"
+    if message.startswith("GROUP:"):
+        return "group"
+    if message.startswith("@") and not message.lower().startswith("@public:"):
+        return "private"
+    return "public"
+
+
+def error_frame(reason, *details):
+    """
+    Builds the ERROR frame reporting a refused request.
+
+    Args:
+        reason (str): 'rate_limited' or 'server_busy'.
+        *details: Further fields, e.g. the message type and the retry delay in ms.
+
+    Returns:
+        Frame: The frame, sent as 'ERROR:<reason>:<details>' to text clients.
+    """
+    return Frame(protocol.ERROR, (reason,) + tuple(str(detail) for detail in details))
+
+
+def admit_message(username, kind):
+    """
+    Applies the user's rate limit to one received message.
+
+    Args:
+        username (str): The sender.
+        kind (str): The message type.
+
+    Returns:
+        Frame | None: None if the message may be processed, otherwise the ERROR
+        frame to send back instead.
+    """
+    wait = rate_limiter.check(username, kind)
+    if not wait:
+        return None
+    metrics.rate_limited.labels(kind).inc()
+    return error_frame("rate_limited", kind, int(wait * 1000) + 1)
+
+
+def admit_connection():
+    """Returns True if a new connection may start its TLS handshake."""
+    if connection_bucket is None or not connection_bucket.take():
+        return True
+    metrics.admission_rejected.labels("connection_rate").inc()
+    return False
+
+
+def admit_login():
+    """
+    Reserves one of the MAX_CONNECTIONS login slots; release_login() frees it.
+
+    Returns:
+        bool: True if the client may log in, False if the server is full.
+    """
+    if login_slots.acquire(blocking=False):
+        return True
+    metrics.admission_rejected.labels("connections").inc()
+    return False
+
+
+def release_login():
+    login_slots.release()
+
+
+def acquire_history_slot(timeout=HISTORY_ADMISSION_TIMEOUT):
+    """
+    Waits for a turn to read history from storage; release_history_slot() ends it.
+
+    Returns:
+        bool: True if a turn was given, False if the server stayed busy.
+    """
+    if history_slots.acquire(timeout=timeout):
+        return True
+    metrics.admission_rejected.labels("history").inc()
+    return False
+
+
+def release_history_slot():
+    history_slots.release()
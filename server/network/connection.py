@@ -1,16 +1,33 @@
+import os
 import socket
 import ssl
 import threading
+import time
 import logging
 from queue import Queue
-from server.database.user import get_all_users
-from server.shared import clients, send_message_history, enqueue_message
+from server import metrics, tracing
+from server.shared import clients, storage, send_message_history, enqueue_message
+from server.network import protocol
+from server.network.admission import (
+    FRAME_KINDS,
+    admit_login,
+    admit_message,
+    error_frame,
+    release_login,
+    text_kind,
+)
+from server.network.protocol import Frame, FrameCompressor, FrameReader, ProtocolError
 from server.network.message_broadcast import (
+    encode_text,
     message_sender,
     broadcast_client_list,
     process_message,
+    process_frame,
 )
 
+# Compression codec offered to v2 clients, 'none' sends every frame uncompressed
+FRAME_COMPRESSION = os.getenv("FRAME_COMPRESSION", "zlib")
+
 
 def handle_new_connection(conn, addr, context):
     """
@@ -23,7 +40,8 @@ def handle_new_connection(conn, addr, context):
     """
     try:
         conn.settimeout(5)  # Set a timeout for the SSL handshake
-        ssl_conn = context.wrap_socket(conn, server_side=True)
+        with metrics.tls_handshake_seconds.time():
+            ssl_conn = context.wrap_socket(conn, server_side=True)
         logging.info(f"SSL connection established with {addr}.")  # SSL confirmation log
         ssl_conn.settimeout(None)  # Remove the timeout after a successful handshake
         client_thread = threading.Thread(
@@ -57,16 +75,45 @@ def handle_client(conn, addr):
     """
     message_queue = Queue()
     name = None
+    admitted = False
     try:
-        name = conn.recv(1024).decode().strip()
-        clients[conn] = {"name": name, "queue": message_queue}
+        version, name, leftover, codecs = protocol.parse_handshake(read_handshake(conn))
+        compression = None
+        if version == protocol.PROTOCOL_VERSION:
+            compression = protocol.choose_compression(codecs, (FRAME_COMPRESSION,))
+            conn.sendall(
+                protocol.encode_ack(compression)
+            )  # Sent before any queued message
+        admitted = admit_login()
+        if not admitted:
+            logging.warning(f"Turned {name} away, the server is full")
+            busy = error_frame("server_busy", "connections")
+            if version == protocol.PROTOCOL_VERSION:
+                conn.sendall(busy.to_bytes())
+            else:
+                conn.sendall(encode_text(busy, name).encode())
+            name = None  # Never registered, so nobody is told it left
+            return
+        clients[conn] = {
+            "name": name,
+            "queue": message_queue,
+            "protocol": version,
+            "compressor": FrameCompressor() if compression else None,
+            "sending": 0,  # Frames sent to it that its fan-out worker has yet to queue
+        }
         broadcast_client_list()
-        logging.info(f"{name} connected by {addr}")
+        logging.info(
+            f"{name} connected by {addr} using protocol v{version}, "
+            f"compression {compression or 'off'}"
+        )
 
         # Send the list of all users except the current one
-        all_users = get_all_users()
-        all_users_list = ",".join([user for user in all_users if user != name])
-        enqueue_message(conn, f"ALL_USERS:{all_users_list}")
+        with metrics.storage_seconds.labels("get_all_users").time():
+            all_users = storage.get_all_users()
+        enqueue_message(
+            conn,
+            Frame(protocol.ALL_USERS, [user for user in all_users if user != name]),
+        )
 
         # Start a thread for sending messages to the client
         sender_thread = threading.Thread(target=message_sender, args=(conn,))
@@ -76,15 +123,10 @@ def handle_client(conn, addr):
         send_message_history(conn, name, "public")
         send_message_history(conn, name, name)
 
-        while True:
-            data = conn.recv(1024)
-            if not data:
-                break
-            message = data.decode().strip()
-            logging.debug(f"Received message from {name}")
-            if message == "disconnect":
-                break
-            process_message(conn, name, message)
+        if version == protocol.PROTOCOL_VERSION:
+            receive_frames(conn, name, leftover)
+        else:
+            receive_text(conn, name)
 
     except (ConnectionResetError, ssl.SSLError) as e:
         logging.error(f"Error handling client {name}: {e}")
@@ -92,6 +134,95 @@ def handle_client(conn, addr):
         logging.error(f"Unexpected error handling client {name}: {e}")
     finally:
         cleanup_client_connection(conn, name, addr)
+        if admitted:
+            release_login()
+
+
+def read_handshake(conn):
+    """
+    Reads the first bytes from a client: a bare username, or a complete v2 handshake.
+
+    Args:
+        conn: The SSL-wrapped connection for the client.
+
+    Returns:
+        bytes: The received bytes.
+    """
+    data = conn.recv(1024)
+    # A v2 handshake ends with the newline after the username
+    while (
+        data.startswith(protocol.HANDSHAKE_PREFIX)
+        and data.count(b"\n") < 2
+        and len(data) < 1024
+    ):
+        more = conn.recv(1024)
+        if not more:
+            break
+        data += more
+    return data
+
+
+def receive_text(conn, name):
+    """
+    Reads and processes text-protocol messages until the client disconnects.
+
+    Args:
+        conn: The SSL-wrapped connection for the client.
+        name (str): The username of the client.
+    """
+    while True:
+        data = conn.recv(1024)
+        if not data:
+            break
+        received = time.perf_counter_ns()
+        message = data.decode().strip()
+        logging.debug("Received message from %s", name)
+        if message == "disconnect":
+            break
+        refused = admit_message(name, text_kind(message))
+        if refused:
+            enqueue_message(conn, refused)
+            continue
+        trace = tracing.start(name, received)
+        process_message(conn, name, message)
+        if trace:
+            tracing.finish()
+
+
+def receive_frames(conn, name, leftover=b""):
+    """
+    Reads and processes binary frames until the client disconnects.
+
+    Args:
+        conn: The SSL-wrapped connection for the client.
+        name (str): The username of the client.
+        leftover (bytes): Bytes received together with the handshake.
+    """
+    reader = FrameReader()
+    data = leftover
+    while True:
+        received = time.perf_counter_ns()
+        try:
+            frames = reader.feed(data)
+        except ProtocolError as e:
+            logging.warning("Protocol error from %s: %s", name, e)
+            break
+        for frame in frames:
+            logging.debug("Received frame from %s", name)
+            if frame.frame_type == protocol.DISCONNECT:
+                return
+            kind = FRAME_KINDS.get(frame.frame_type)
+            refused = admit_message(name, kind) if kind else None
+            if refused:
+                enqueue_message(conn, refused)
+                continue
+            trace = tracing.start(name, received)
+            process_frame(conn, name, frame)
+            if trace:
+                tracing.finish()
+        data = conn.recv(65536)
+        if not data:
+            break
 
 
 def cleanup_client_connection(conn, name, addr):
@@ -103,8 +234,7 @@ def cleanup_client_connection(conn, name, addr):
         name (str): The username of the disconnected client.
         addr: The address of the client.
     """
-    if conn in clients:
-        del clients[conn]
+    clients.pop(conn, None)
     if name:
         logging.info(f"{name} disconnected by {addr}")
         broadcast_client_list()
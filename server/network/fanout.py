@@ -0,0 +1,211 @@
+import os
+import time
+import queue
+import logging
+import threading
+from server import metrics
+
+# Tasks each worker may fall behind by before submitters wait for it
+FANOUT_QUEUE_SIZE = int(os.getenv("FANOUT_QUEUE_SIZE", "10000"))
+
+
+class FanoutJob:
+    """Tracks one message's fan-out across shards, to record when it completes."""
+
+    __slots__ = ("kind", "started", "remaining", "recipients", "lock")
+
+    def __init__(self, kind, shards):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.remaining = shards
+        self.recipients = 0
+        self.lock = threading.Lock()
+
+    def done(self, recipients):
+        """Records that one shard has been queued; the last one records the metrics."""
+        with self.lock:
+            self.recipients += recipients
+            self.remaining -= 1
+            if self.remaining:
+                return
+        metrics.fanout_seconds.labels(self.kind).observe(
+            time.perf_counter() - self.started
+        )
+        metrics.fanout_recipients.labels(self.kind).observe(self.recipients)
+
+
+class FanoutSend:
+    """
+    Counts a frame sent to one connection in the client's "sending" entry until
+    its worker has queued it, so waiting for queue space also sees frames that
+    are still on their way to the queue.
+    """
+
+    __slots__ = ("info",)
+
+    def __init__(self, info):
+        self.info = info
+        with info["queue"].mutex:
+            info["sending"] = info.get("sending", 0) + 1
+
+    def done(self, recipients):
+        with self.info["queue"].mutex:
+            self.info["sending"] -= 1
+
+
+class FanoutBarrier:
+    """A task with no recipients, marking a point the workers have passed."""
+
+    __slots__ = ("event",)
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def done(self, recipients):
+        self.event.set()
+
+
+class FanoutPool:
+    def __init__(self, registry, workers, size=FANOUT_QUEUE_SIZE):
+        """
+        Initializes the pool that queues messages for their recipients.
+
+        Each connection belongs to one shard of the registry and each shard to one
+        worker, so a recipient's messages are always queued by the same thread,
+        in the order they were submitted. Submitting puts one task per shard,
+        leaving the sender's reader thread free as soon as the message is accepted.
+        Messages for a single connection, such as history, go through send() and
+        its shard's worker too, so they stay in order with routed messages.
+
+        Args:
+            registry (ClientRegistry): The connected clients, split into one shard
+                per worker.
+            workers (int): The number of worker threads, 0 to fan out on the
+                calling thread.
+            size (int): The tasks each worker may have waiting; submitting blocks
+                while its worker is that far behind.
+        """
+        self.registry = registry
+        self.workers = workers
+        self.tasks = [queue.Queue(size) for _ in range(workers)]
+        self.lock = threading.Lock()  # Keeps every shard in submission order
+        self.threads = []
+
+    def start(self):
+        """Starts the worker threads, once."""
+        with self.lock:
+            if self.threads:
+                return
+            for index, tasks in enumerate(self.tasks):
+                thread = threading.Thread(
+                    target=self.run, args=(tasks,), name=f"fanout-{index}", daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def run(self, tasks):
+        """Queues each task's frame for the recipients of its shard."""
+        while True:
+            recipients, frame, job = tasks.get()
+            queued = 0
+            try:
+                queued = self.enqueue(recipients, frame)
+            except Exception as e:
+                logging.error("Error fanning out a message: %s", e)
+            job.done(queued)
+
+    def enqueue(self, recipients, frame):
+        """
+        Adds the frame to the queue of each recipient that is still connected.
+
+        Returns:
+            int: The number of recipients it was queued for.
+        """
+        queued = 0
+        for conn in recipients:
+            info = self.registry.get(conn)
+            if info is not None:
+                info["queue"].put(frame)
+                queued += 1
+        return queued
+
+    def submit(self, shards, frame, kind):
+        """
+        Hands each non-empty shard of recipients to its worker.
+
+        Args:
+            shards (tuple): One sequence of connections per shard.
+            frame (Frame): The frame to queue for every recipient.
+            kind (str): The message type the metrics are labelled with.
+        """
+        busy = [index for index, recipients in enumerate(shards) if recipients]
+        job = FanoutJob(kind, len(busy) or 1)
+        if not self.workers:
+            job.done(sum(self.enqueue(recipients, frame) for recipients in shards))
+            return
+        if not busy:
+            job.done(0)
+            return
+        if not self.threads:
+            self.start()
+        with self.lock:
+            for index in busy:
+                self.tasks[index].put((shards[index], frame, job))
+
+    def send(self, conn, frame):
+        """
+        Queues a frame for one connection, after everything already submitted for it.
+
+        Until its worker has queued it, the frame is counted in the client's
+        "sending" entry, which wait_for_queue_space() adds to the queue length.
+
+        Args:
+            conn: The recipient's connection.
+            frame (Frame | str): The frame, or preformatted text message.
+        """
+        if not self.workers:
+            self.enqueue((conn,), frame)
+            return
+        info = self.registry.get(conn)
+        if info is None:
+            return  # Disconnected
+        if not self.threads:
+            self.start()
+        self.tasks[self.registry.shard_of(conn)].put(((conn,), frame, FanoutSend(info)))
+
+    def broadcast(self, frame, kind):
+        """Queues a frame for every connected client."""
+        self.submit(self.registry.shards, frame, kind)
+
+    def deliver(self, connections, frame, kind):
+        """
+        Queues a frame for the given connections.
+
+        Args:
+            connections (iterable): The recipients' connections.
+            frame (Frame): The frame to queue.
+            kind (str): The message type the metrics are labelled with.
+        """
+        shards = [[] for _ in range(self.registry.shard_count)]
+        for conn in connections:
+            shards[self.registry.shard_of(conn)].append(conn)
+        self.submit(shards, frame, kind)
+
+    def flush(self, timeout=5):
+        """
+        Waits until every task submitted so far has been queued for its recipients.
+
+        Returns:
+            bool: True if the workers caught up within the timeout.
+        """
+        if not self.threads:
+            return True
+        barriers = [FanoutBarrier() for _ in self.tasks]
+        with self.lock:
+            for tasks, barrier in zip(self.tasks, barriers):
+                tasks.put(((), None, barrier))
+        deadline = time.monotonic() + timeout
+        return all(
+            barrier.event.wait(max(0, deadline - time.monotonic()))
+            for barrier in barriers
+        )
@@ -1,27 +1,113 @@
 import logging
 import ssl
+import time
 from queue import Empty
-from server.database.connection import get_db_connection
+from server import metrics, tracing
+from server.network import protocol
+from server.network.protocol import Frame
 from server.shared import (
     clients,
+    fanout,
+    storage,
+    message_ids,
+    recent_public_history,
     send_message_history,
-    enqueue_message,
+    send_search_results,
     store_message_in_db,
 )
 
+# Series recorded per message, bound once so recording skips the label lookup
+public_routed = metrics.messages_routed.labels("public")
+private_routed = metrics.messages_routed.labels("private")
+group_routed = metrics.messages_routed.labels("group")
+group_members_seconds = metrics.storage_seconds.labels("group_members")
 
-def broadcast_message(message):
+
+def encode_text(frame, client_name):
+    """
+    Encodes a frame in the legacy text protocol for clients that did not negotiate v2.
+
+    Args:
+        frame (Frame): The frame to encode.
+        client_name (str): The recipient's username, used to mark their own history as 'ME'.
+
+    Returns:
+        str: The newline-terminated text message.
+    """
+    fields = frame.fields
+    if frame.frame_type == protocol.HISTORY:
+        sender = "ME" if fields[0] == client_name else fields[0]
+        return f"HISTORY:{sender}:{fields[1]}\n"
+    if frame.frame_type == protocol.HISTORY_START:
+        return f"HISTORY_START:{fields[0]}\n"
+    if frame.frame_type == protocol.HISTORY_BATCH:
+        lines = []
+        for sender, text in zip(fields[2::4], fields[3::4]):
+            sender = "ME" if sender == client_name else sender
+            lines.append(f"HISTORY:{sender}:{text}\n")
+        return "".join(lines)
+    if frame.frame_type == protocol.SEARCH_RESULTS:
+        lines = []
+        for message_id, sender, text in zip(fields[2::4], fields[4::4], fields[5::4]):
+            lines.append(f"SEARCH_RESULT:{message_id}:{sender}:{text}\n")
+        # Ends the page even when nothing matched, with the next page's before id
+        lines.append(f"SEARCH_END:{frame.message_id}:{fields[0]}:{fields[1]}\n")
+        return "".join(lines)
+
+    if frame.encoded_text is None:
+        if frame.frame_type == protocol.PUBLIC:
+            text = f"PUBLIC:{fields[0]}: {fields[1]}\n"
+        elif frame.frame_type == protocol.PRIVATE:
+            text = f"PRIVATE:{fields[0]}:{fields[2]}\n"
+        elif frame.frame_type == protocol.GROUP:
+            text = f"GROUP:{fields[0]}:{fields[1]}:{fields[2]}\n"
+        elif frame.frame_type == protocol.CLIENT_LIST:
+            text = f"CLIENT_LIST:{','.join(fields)}\n"
+        elif frame.frame_type == protocol.ALL_USERS:
+            text = f"ALL_USERS:{','.join(fields)}\n"
+        else:
+            text = f"ERROR:{':'.join(fields)}\n"
+        frame.encoded_text = text
+    return frame.encoded_text
+
+
+def encode_for_client(message, client_info):
+    """
+    Encodes a queued message in the protocol negotiated by the recipient.
+
+    Args:
+        message (Frame | str): The queued frame, or a preformatted text message.
+        client_info (dict): The recipient's entry in the clients registry.
+
+    Returns:
+        bytes: The bytes to send.
+    """
+    if isinstance(message, str):
+        return message.encode()
+    if client_info.get("protocol") == protocol.PROTOCOL_VERSION:
+        compressor = client_info.get("compressor")
+        if compressor is not None:
+            return compressor.encode(message)  # Only bulk and large frames change
+        return message.to_bytes()  # Encoded once and shared by all recipients
+    return encode_text(message, client_info["name"]).encode()
+
+
+def broadcast_message(sender_name, message, message_id=0, timestamp=0):
     """
     Broadcasts a public message to all connected clients.
 
     Args:
+        sender_name (str): The username of the sender.
         message (str): The message to be sent to all clients.
+        message_id (int): The server-assigned message ID.
+        timestamp (int): The server-assigned timestamp in milliseconds.
     """
-    for client in clients.keys():
-        enqueue_message(client, f"PUBLIC:{message}")
+    frame = Frame(protocol.PUBLIC, (sender_name, message), message_id, timestamp)
+    tracing.attach(frame)
+    fanout.broadcast(frame, "public")
 
 
-def send_private_message(target_name, message, sender_name):
+def send_private_message(target_name, message, sender_name, message_id=0, timestamp=0):
     """
     Sends a private message from one client to another.
 
@@ -29,25 +115,24 @@ def send_private_message(target_name, message, sender_name):
         target_name (str): The username of the recipient.
         message (str): The content of the private message.
         sender_name (str): The username of the sender.
+        message_id (int): The server-assigned message ID.
+        timestamp (int): The server-assigned timestamp in milliseconds.
     """
-    target_client = None
-    sender_client = None
-    # Find the target and sender clients in the clients dictionary
-    for client, info in clients.items():
-        if info["name"] == target_name:
-            target_client = client
-        if info["name"] == sender_name:
-            sender_client = client
-        if target_client and sender_client:
-            break
+    # The first connection of each user, found in the registry's name index
+    recipients = {
+        conn
+        for name in (target_name, sender_name)
+        for conn in clients.connections(name)[:1]
+    }
 
-    if target_client:
-        enqueue_message(target_client, f"PRIVATE:{sender_name}:{message}")
-    if sender_client:
-        enqueue_message(sender_client, f"PRIVATE:{sender_name}:{message}")
+    frame = Frame(
+        protocol.PRIVATE, (sender_name, target_name, message), message_id, timestamp
+    )
+    tracing.attach(frame)
+    fanout.deliver(recipients, frame, "private")
 
 
-def send_group_message(group_name, sender_name, message):
+def send_group_message(group_name, sender_name, message, message_id=0, timestamp=0):
     """
     Sends a message to all members of a specified group.
 
@@ -55,31 +140,22 @@ def send_group_message(group_name, sender_name, message):
         group_name (str): The name of the group.
         sender_name (str): The username of the sender.
         message (str): The message to be sent to the group.
+        message_id (int): The server-assigned message ID.
+        timestamp (int): The server-assigned timestamp in milliseconds.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        # Fetch group members from the database
-        cursor.execute(
-            "SELECT users.username FROM users "
-            "JOIN group_memberships ON users.id = group_memberships.user_id "
-            "JOIN groups ON group_memberships.group_id = groups.id "
-            "WHERE groups.name = %s",
-            (group_name,),
-        )
-        members = cursor.fetchall()
-        for member in members:
-            # Send the message to all group members who are currently connected
-            for client, info in clients.items():
-                if info["name"] == member[0]:
-                    enqueue_message(
-                        client, f"GROUP:{group_name}:{sender_name}:{message}"
-                    )
+        with group_members_seconds.time():
+            members = storage.group_members(group_name)
     except Exception as e:
-        logging.error(f"Error retrieving group members: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        logging.error("Error retrieving group members: %s", e)
+        return
+    frame = Frame(
+        protocol.GROUP, (group_name, sender_name, message), message_id, timestamp
+    )
+    tracing.attach(frame)
+    # Send the message to all group members who are currently connected
+    recipients = [conn for member in members for conn in clients.connections(member)]
+    fanout.deliver(recipients, frame, "group")
 
 
 def broadcast_client_list():
@@ -88,9 +164,10 @@ def broadcast_client_list():
     """
     # Normalize the client list by converting usernames to lowercase, but preserve the original case
     unique_clients = {info["name"].lower(): info["name"] for info in clients.values()}
-    client_list = ",".join(unique_clients.values())  # Use original case-sensitive names
-    for client in clients.keys():
-        enqueue_message(client, f"CLIENT_LIST:{client_list}")
+    frame = Frame(
+        protocol.CLIENT_LIST, unique_clients.values()
+    )  # Use original case-sensitive names
+    fanout.broadcast(frame, "client_list")
 
 
 def message_sender(conn):
@@ -100,17 +177,27 @@ def message_sender(conn):
     Args:
         conn: The connection object representing the client.
     """
-    while conn in clients:
+    while True:
+        client_info = clients.get(conn)
+        if client_info is None:
+            break  # Disconnected
         try:
             # Get the next message from the client's message queue
-            message = clients[conn]["queue"].get(timeout=1)
+            message = client_info["queue"].get(timeout=1)
+            dequeued = time.perf_counter_ns()
             try:
-                conn.sendall(message.encode())  # Send the message to the client
+                data = encode_for_client(message, client_info)
+                conn.sendall(data)  # Send the message to the client
+                metrics.bytes_sent.inc(len(data))
+                if getattr(message, "trace", None) is not None:
+                    tracing.delivered(
+                        message, dequeued, time.perf_counter_ns(), client_info["name"]
+                    )
             except ssl.SSLError as e:
-                logging.error(f"SSL Error sending message: {e}")
+                logging.error("SSL Error sending message: %s", e)
                 break
             except Exception as e:
-                logging.error(f"Error sending message: {e}")
+                logging.error("Error sending message: %s", e)
                 break
         except Empty:
             pass
@@ -118,7 +205,8 @@ def message_sender(conn):
 
 def process_message(conn, name, message):
     """
-    Processes a received message and routes it based on its type (public, private, or group).
+    Processes a received text-protocol message and routes it based on its type
+    (public, private, or group).
 
     Args:
         conn: The connection object representing the client.
@@ -130,33 +218,120 @@ def process_message(conn, name, message):
         chat_identifier = message[len("HISTORY:") :]
         send_message_history(conn, name, chat_identifier)
 
+    elif message.startswith("SEARCH:"):
+        # Handle message search request
+        conversation, query = protocol.split_search(message[len("SEARCH:") :])
+        send_search_results(conn, name, conversation, query)
+
+    elif message.startswith("SEARCH_MORE:"):
+        # Handle a request for an older page of search results
+        conversation, query, before_id = protocol.split_search_page(
+            message[len("SEARCH_MORE:") :]
+        )
+        before_id = int(before_id) if before_id.isdigit() else 0
+        send_search_results(conn, name, conversation, query, before_id)
+
     elif message.startswith("@"):
         # Handle private or public message
         target_name, private_message = message.split(":", 1)
         target_name = target_name[1:]  # Remove '@' symbol
         if target_name.lower() == "public":
-            # Broadcast message to all clients
-            broadcast_message(f"{name}: {private_message}")
-            store_message_in_db(
-                name, None, None, private_message
-            )  # Store public message in the DB
+            route_public_message(name, private_message)
         else:
-            # Send private message to the specified user
-            send_private_message(target_name, private_message, name)
-            store_message_in_db(
-                name, target_name, None, private_message
-            )  # Store private message in the DB
+            route_private_message(name, target_name, private_message)
 
     elif message.startswith("GROUP:"):
         # Handle group message
-        group_name, group_message = message.split(":", 1)
-        group_name = group_name[len("GROUP:") :]  # Extract group name
-        send_group_message(group_name, name, group_message)
-        store_message_in_db(
-            name, None, group_name, group_message
-        )  # Store group message in the DB
+        group_name, group_message = message[len("GROUP:") :].split(":", 1)
+        route_group_message(name, group_name, group_message)
 
     else:
         # Broadcast message to all clients (default case)
-        broadcast_message(f"{name}: {message}")
-        store_message_in_db(name, None, None, message)  # Store public message in the DB
+        route_public_message(name, message)
+
+
+def process_frame(conn, name, frame):
+    """
+    Routes a binary frame received from a client that negotiated protocol v2.
+
+    Args:
+        conn: The connection object representing the client.
+        name (str): The username of the sender.
+        frame (Frame): The decoded frame.
+    """
+    fields = frame.fields
+    try:
+        if frame.frame_type == protocol.SEND_PUBLIC:
+            route_public_message(name, fields[0])
+        elif frame.frame_type == protocol.SEND_PRIVATE:
+            route_private_message(name, fields[0], fields[1])
+        elif frame.frame_type == protocol.SEND_GROUP:
+            route_group_message(name, fields[0], fields[1])
+        elif frame.frame_type == protocol.HISTORY_REQUEST:
+            after_id = int(fields[1]) if len(fields) > 1 else 0
+            before_id = int(fields[2]) if len(fields) > 2 else 0
+            send_message_history(conn, name, fields[0], after_id, before_id)
+        elif frame.frame_type == protocol.SEARCH_REQUEST:
+            before_id = int(fields[2]) if len(fields) > 2 else 0
+            send_search_results(conn, name, fields[0], fields[1], before_id)
+        else:
+            logging.debug("Unhandled frame type %s from %s", frame.frame_type, name)
+    except (IndexError, ValueError):
+        logging.warning(
+            "Frame type %s from %s has invalid fields", frame.frame_type, name
+        )
+
+
+def route_public_message(name, message):
+    """
+    Broadcasts a public message and stores it in the database.
+
+    Args:
+        name (str): The username of the sender.
+        message (str): The message text.
+    """
+    public_routed.inc()
+    with tracing.stage("route", type="public"):
+        message_id, timestamp = message_ids.allocate()  # Assigned before fan-out
+        broadcast_message(name, message, message_id, timestamp)
+        if message_id:
+            recent_public_history.append(message_id, timestamp, name, message)
+    store_message_in_db(
+        name, None, None, message, message_id, timestamp
+    )  # Store public message in the DB
+
+
+def route_private_message(name, target_name, message):
+    """
+    Delivers a private message to the target and the sender, and stores it.
+
+    Args:
+        name (str): The username of the sender.
+        target_name (str): The username of the recipient.
+        message (str): The message text.
+    """
+    private_routed.inc()
+    with tracing.stage("route", type="private"):
+        message_id, timestamp = message_ids.allocate()
+        send_private_message(target_name, message, name, message_id, timestamp)
+    store_message_in_db(
+        name, target_name, None, message, message_id, timestamp
+    )  # Store private message in the DB
+
+
+def route_group_message(name, group_name, message):
+    """
+    Delivers a message to the members of a group and stores it.
+
+    Args:
+        name (str): The username of the sender.
+        group_name (str): The name of the group.
+        message (str): The message text.
+    """
+    group_routed.inc()
+    with tracing.stage("route", type="group"):
+        message_id, timestamp = message_ids.allocate()
+        send_group_message(group_name, name, message, message_id, timestamp)
+    store_message_in_db(
+        name, None, group_name, message, message_id, timestamp
+    )  # Store group message in the DB
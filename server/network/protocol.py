@@ -0,0 +1,510 @@
+"""
+Versioned binary wire protocol shared by the server and the client.
+
+A client opts in by sending a handshake instead of its bare username, listing
+the compression codecs it accepts after the version:
+
+    CHASE/2 zlib\\n<username>\\n
+
+A server that supports the version answers with an ack naming the codec it
+picked, if any ('PROTO:2 zlib\\n' or 'PROTO:2\\n'), and from then on both sides
+exchange binary frames. Clients that only send a username, and servers that do
+not answer with the ack, keep using the text protocol.
+
+Binary frame layout (all integers are unsigned LEB128 varints):
+
+    length | type (1 byte) | flags (1 byte) | message id | timestamp (ms) | fields...
+
+Each field is a varint byte length followed by UTF-8 text; the number of
+fields is implied by the frame length, so names and texts may contain any
+character, including ':'.
+
+When compression was negotiated, the server compresses history batches, user
+lists and frames above COMPRESSION_THRESHOLD with one zlib stream per
+connection, so later frames reuse the window of earlier ones. Such frames set
+FLAG_COMPRESSED and everything after the flags byte is the compressed output of
+that frame, ending at a sync flush. Small chat messages are sent as is.
+"""
+
+import zlib
+
+PROTOCOL_VERSION = 2
+HANDSHAKE_PREFIX = b"CHASE/"
+HANDSHAKE_ACK = b"PROTO:2\n"
+# Upper bound on a single frame, larger lengths are treated as a protocol error
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# Compression codecs this implementation can speak, in order of preference
+COMPRESSION_CODECS = ("zlib",)
+# Encoded frames smaller than this are never compressed, unless they are bulk frames
+COMPRESSION_THRESHOLD = 512
+COMPRESSION_LEVEL = 6
+
+# Frame flags
+FLAG_COMPRESSED = 0x01
+
+# Server -> client frame types
+PUBLIC = 0x01
+PRIVATE = 0x02
+GROUP = 0x03
+HISTORY = 0x04
+CLIENT_LIST = 0x05
+ALL_USERS = 0x06
+ERROR = 0x07
+HISTORY_BATCH = 0x08  # (message id, timestamp, sender, text) per message
+# (conversation, query) then (message id, timestamp, sender, text) per result;
+# the frame's message id is the before id of the next page, 0 on the last page
+SEARCH_RESULTS = 0x09
+# (chat,) sent before a chat's history; the history frames that follow belong to it
+HISTORY_START = 0x0A
+
+# Repetitive payloads that are always compressed when the connection allows it
+BULK_FRAME_TYPES = frozenset((HISTORY_BATCH, ALL_USERS))
+
+# Client -> server frame types
+SEND_PUBLIC = 0x10
+SEND_PRIVATE = 0x11
+SEND_GROUP = 0x12
+HISTORY_REQUEST = 0x13  # (chat,), or (chat, after id) or (chat, after id, before id)
+DISCONNECT = 0x14
+SEARCH_REQUEST = 0x15  # (conversation, query) or (conversation, query, before id)
+
+
+class ProtocolError(ValueError):
+    """Raised when a peer sends bytes that are not a valid frame."""
+
+
+class Frame:
+    """A protocol message with typed fields, encoded lazily and at most once per format."""
+
+    __slots__ = (
+        "frame_type",
+        "fields",
+        "message_id",
+        "timestamp",
+        "flags",
+        "encoded",
+        "encoded_text",
+        "trace",
+    )
+
+    def __init__(self, frame_type, fields, message_id=0, timestamp=0, flags=0):
+        """
+        Initializes the frame.
+
+        Args:
+            frame_type (int): One of the frame type constants.
+            fields (tuple): The text fields, in the order defined for the type.
+            message_id (int): The server-assigned message id, 0 if none.
+            timestamp (int): The server timestamp in milliseconds, 0 if none.
+            flags (int): Frame flags, 0 for a plain frame.
+        """
+        self.frame_type = frame_type
+        self.fields = tuple(fields)
+        self.message_id = message_id
+        self.timestamp = timestamp
+        self.flags = flags
+        self.encoded = None  # Cached binary encoding, shared by all recipients
+        self.encoded_text = None  # Cached text-protocol encoding for old clients
+        self.trace = None  # Set by server.tracing when the message is traced
+
+    def __repr__(self):
+        return f"Frame({self.frame_type:#04x}, {self.fields!r}, id={self.message_id})"
+
+    def to_bytes(self):
+        """
+        Returns the binary encoding of the frame, including its length prefix.
+
+        Returns:
+            bytes: The encoded frame.
+        """
+        if self.encoded is None:
+            self.encoded = encode_frame(self)
+        return self.encoded
+
+
+def encode_varint(value):
+    """
+    Encodes a non-negative integer as an unsigned LEB128 varint.
+
+    Args:
+        value (int): The integer to encode.
+
+    Returns:
+        bytes: The encoded integer.
+    """
+    if value < 0:
+        raise ValueError("varints must be non-negative")
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data, offset):
+    """
+    Decodes an unsigned LEB128 varint.
+
+    Args:
+        data (bytes): The buffer to read from.
+        offset (int): The position of the first byte of the varint.
+
+    Returns:
+        tuple: The decoded integer and the offset just after it, or (None, offset)
+        if the buffer ends before the varint does.
+    """
+    result = 0
+    shift = 0
+    position = offset
+    while position < len(data):
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+        if shift > 63:
+            raise ProtocolError("varint is too long")
+    return None, offset
+
+
+def encode_body(frame):
+    """Encodes a frame without its length prefix."""
+    parts = [
+        bytes((frame.frame_type, frame.flags)),
+        encode_varint(frame.message_id),
+        encode_varint(frame.timestamp),
+    ]
+    for field in frame.fields:
+        raw = field.encode("utf-8")
+        parts.append(encode_varint(len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+
+def encode_frame(frame):
+    """
+    Encodes a frame with its length prefix.
+
+    Args:
+        frame (Frame): The frame to encode.
+
+    Returns:
+        bytes: The encoded frame.
+    """
+    body = encode_body(frame)
+    return encode_varint(len(body)) + body
+
+
+def decode_body(body, decompressor=None):
+    """
+    Decodes a frame body (the bytes after the length prefix).
+
+    Args:
+        body (bytes): The frame body.
+        decompressor: The connection's zlib decompression object, if compression
+            was negotiated.
+
+    Returns:
+        Frame: The decoded frame.
+    """
+    if len(body) < 2:
+        raise ProtocolError("frame is too short")
+    frame_type, flags = body[0], body[1]
+    if flags & FLAG_COMPRESSED:
+        if decompressor is None:
+            raise ProtocolError("compressed frame without negotiated compression")
+        try:
+            payload = decompressor.decompress(body[2:], MAX_FRAME_SIZE)
+        except zlib.error as e:
+            raise ProtocolError(f"invalid compressed frame: {e}")
+        if decompressor.unconsumed_tail:
+            raise ProtocolError("compressed frame exceeds the limit")
+        flags &= ~FLAG_COMPRESSED
+        body = bytes((frame_type, flags)) + payload
+    message_id, offset = decode_varint(body, 2)
+    if message_id is None:
+        raise ProtocolError("truncated frame header")
+    timestamp, offset = decode_varint(body, offset)
+    if timestamp is None:
+        raise ProtocolError("truncated frame header")
+
+    fields = []
+    while offset < len(body):
+        length, offset = decode_varint(body, offset)
+        if length is None or offset + length > len(body):
+            raise ProtocolError("truncated frame field")
+        fields.append(body[offset : offset + length].decode("utf-8"))
+        offset += length
+    return Frame(frame_type, fields, message_id, timestamp, flags)
+
+
+class FrameReader:
+    def __init__(self, compression=None):
+        """
+        Initializes a reader that splits a byte stream into frames.
+
+        Args:
+            compression (str | None): The negotiated codec, None if frames are never compressed.
+        """
+        self.buffer = bytearray()
+        self.decompressor = zlib.decompressobj() if compression == "zlib" else None
+
+    def feed(self, data):
+        """
+        Adds received bytes and returns every frame that is now complete.
+
+        Args:
+            data (bytes): Bytes read from the socket.
+
+        Returns:
+            list: The complete frames, in order.
+        """
+        self.buffer += data
+        frames = []
+        offset = 0
+        while True:
+            length, body_start = decode_varint(self.buffer, offset)
+            if length is None:
+                break
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"frame of {length} bytes exceeds the limit")
+            if body_start + length > len(self.buffer):
+                break
+            frames.append(
+                decode_body(
+                    bytes(self.buffer[body_start : body_start + length]),
+                    self.decompressor,
+                )
+            )
+            offset = body_start + length
+        del self.buffer[:offset]
+        return frames
+
+
+class FrameCompressor:
+    def __init__(self, threshold=COMPRESSION_THRESHOLD, level=COMPRESSION_LEVEL):
+        """
+        Initializes the per-connection compressor used by the server's sender thread.
+
+        The zlib stream lives as long as the connection, so repeated usernames and
+        prefixes compress against everything sent before. It is not thread-safe.
+
+        Args:
+            threshold (int): Encoded size from which ordinary frames are compressed.
+            level (int): The zlib compression level.
+        """
+        self.threshold = threshold
+        self.compressor = zlib.compressobj(level)
+        self.bytes_in = 0  # Encoded size of the frames that were compressed
+        self.bytes_out = 0  # Size of the same frames on the wire
+
+    def encode(self, frame):
+        """
+        Encodes a frame for this connection, compressing it if it is worth it.
+
+        Args:
+            frame (Frame): The frame to encode.
+
+        Returns:
+            bytes: The bytes to send.
+        """
+        data = frame.to_bytes()
+        if len(data) < self.threshold and frame.frame_type not in BULK_FRAME_TYPES:
+            return data  # Shared, uncompressed encoding
+
+        _, body_start = decode_varint(data, 0)
+        payload = self.compressor.compress(data[body_start + 2 :])
+        payload += self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        body = bytes((frame.frame_type, frame.flags | FLAG_COMPRESSED)) + payload
+        encoded = encode_varint(len(body)) + body
+        self.bytes_in += len(data)
+        self.bytes_out += len(encoded)
+        return encoded
+
+
+def encode_handshake(client_name, codecs=COMPRESSION_CODECS):
+    """
+    Builds the handshake a binary-capable client sends instead of its bare username.
+
+    Args:
+        client_name (str): The username.
+        codecs (tuple): The compression codecs the client accepts.
+
+    Returns:
+        bytes: The handshake bytes.
+    """
+    header = " ".join((str(PROTOCOL_VERSION),) + tuple(codecs))
+    return HANDSHAKE_PREFIX + f"{header}\n{client_name}\n".encode("utf-8")
+
+
+def parse_handshake(data):
+    """
+    Parses the first bytes a client sends after connecting.
+
+    Args:
+        data (bytes): The first bytes received from the client.
+
+    Returns:
+        tuple: The negotiated protocol version (1 for the text protocol), the
+        username, any bytes received after the handshake, and the compression
+        codecs the client offered.
+    """
+    if data.startswith(HANDSHAKE_PREFIX) and data.count(b"\n") >= 2:
+        header, name, rest = data.split(b"\n", 2)
+        tokens = header[len(HANDSHAKE_PREFIX) :].decode(errors="replace").split()
+        try:
+            version = int(tokens[0])
+        except (ValueError, IndexError):
+            version = 1
+        if version >= PROTOCOL_VERSION:
+            return PROTOCOL_VERSION, name.decode().strip(), rest, tuple(tokens[1:])
+        return 1, name.decode().strip(), rest, ()
+    return 1, data.decode().strip(), b"", ()
+
+
+def choose_compression(offered, enabled=COMPRESSION_CODECS):
+    """
+    Picks the codec to use for a connection.
+
+    Args:
+        offered (tuple): The codecs the client accepts.
+        enabled (tuple): The codecs the server allows, in order of preference.
+
+    Returns:
+        str | None: The chosen codec, or None to send frames uncompressed.
+    """
+    for codec in enabled:
+        if codec in offered and codec in COMPRESSION_CODECS:
+            return codec
+    return None
+
+
+def encode_ack(compression=None):
+    """
+    Builds the server's answer to a v2 handshake.
+
+    Args:
+        compression (str | None): The codec chosen for the connection.
+
+    Returns:
+        bytes: The ack line.
+    """
+    if compression is None:
+        return HANDSHAKE_ACK
+    return HANDSHAKE_ACK[:-1] + f" {compression}\n".encode()
+
+
+def split_search(payload):
+    """
+    Splits the payload of a 'SEARCH:' command into its conversation and query.
+
+    Args:
+        payload (str): '<conversation>:<query>', where group conversations are
+            written 'group:<groupname>'.
+
+    Returns:
+        tuple: The conversation and the query text.
+    """
+    if payload.startswith("group:"):
+        group, _, query = payload[len("group:") :].partition(":")
+        return f"group:{group}", query
+    conversation, _, query = payload.partition(":")
+    return conversation, query
+
+
+def split_search_page(payload):
+    """
+    Splits the payload of a 'SEARCH_MORE:' command, which asks for an older page.
+
+    Args:
+        payload (str): '<before id>:<conversation>:<query>'.
+
+    Returns:
+        tuple: The conversation, the query text and the before id.
+    """
+    before_id, _, search = payload.partition(":")
+    return split_search(search) + (before_id,)
+
+
+def encode_command(message):
+    """
+    Converts a client command string, as produced by the UI, into a binary frame.
+
+    Args:
+        message (str): 'HISTORY:<chat>', 'SEARCH:<chat>:<query>',
+            'SEARCH_MORE:<before id>:<chat>:<query>', '@<user>:<text>',
+            '#<group>:<text>', 'GROUP:<group>:<text>', 'disconnect', or a public message.
+
+    Returns:
+        Frame: The equivalent frame.
+    """
+    if message == "disconnect":
+        return Frame(DISCONNECT, ())
+    if message.startswith("HISTORY:"):
+        return Frame(HISTORY_REQUEST, (message[len("HISTORY:") :],))
+    if message.startswith("SEARCH:"):
+        return Frame(SEARCH_REQUEST, split_search(message[len("SEARCH:") :]))
+    if message.startswith("SEARCH_MORE:"):
+        return Frame(SEARCH_REQUEST, split_search_page(message[len("SEARCH_MORE:") :]))
+    if message.startswith("@") and ":" in message:
+        target, text = message[1:].split(":", 1)
+        if target.lower() == "public":
+            return Frame(SEND_PUBLIC, (text,))
+        return Frame(SEND_PRIVATE, (target, text))
+    for prefix in ("#", "GROUP:"):
+        if message.startswith(prefix) and ":" in message[len(prefix) :]:
+            group, text = message[len(prefix) :].split(":", 1)
+            return Frame(SEND_GROUP, (group, text))
+    return Frame(SEND_PUBLIC, (message,))
+
+
+class ServerStreamDecoder:
+    def __init__(self):
+        """
+        Initializes the client-side decoder for everything the server sends.
+
+        The first bytes decide the mode: the v2 ack switches to binary frames,
+        anything else means the server only speaks the text protocol.
+        """
+        self.binary = None  # Unknown until the first bytes arrive
+        self.compression = None  # The codec named in the ack, if any
+        self.pending = b""
+        self.reader = FrameReader()
+
+    def feed(self, data):
+        """
+        Decodes received bytes.
+
+        Args:
+            data (bytes): Bytes read from the socket.
+
+        Returns:
+            list: Frame objects in binary mode, or decoded text chunks in text mode.
+        """
+        if self.binary is None:
+            self.pending += data
+            ack_prefix = HANDSHAKE_ACK[:-1]
+            if self.pending.startswith(ack_prefix) and b"\n" in self.pending:
+                line, data = self.pending.split(b"\n", 1)
+                options = line[len(ack_prefix) :].decode(errors="replace").split()
+                self.binary = True
+                self.compression = options[0] if options else None
+                self.reader = FrameReader(self.compression)
+            elif ack_prefix.startswith(self.pending) or (
+                self.pending.startswith(ack_prefix) and len(self.pending) < 64
+            ):
+                return []  # Could still become the ack, wait for more bytes
+            else:
+                self.binary = False
+                data = self.pending
+            self.pending = b""
+
+        if self.binary:
+            return self.reader.feed(data)
+        text = data.decode(errors="replace").strip()
+        return [text] if text else []
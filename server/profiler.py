@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import logging
+import itertools
+import linecache
+import threading
+from collections import Counter
+
+# Seconds a profile runs unless stopped earlier
+PROFILE_DURATION = float(os.getenv("PROFILE_DURATION", "30"))
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# Distinct stacks kept per profile, later ones are counted as '(other)'
+PROFILE_MAX_STACKS = 10000
+# Frames kept per stack, innermost first
+PROFILE_MAX_DEPTH = 40
+# Rows printed per report section
+REPORT_ROWS = 25
+
+# Functions a thread sits in while blocked on another thread
+WAIT_FUNCTIONS = {
+    ("threading.py", "wait"),
+    ("threading.py", "acquire"),
+    ("threading.py", "join"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("queue.py", "put"),
+}
+
+
+def frame_location(frame):
+    """Returns 'file:line function' for a frame, with the file's base name."""
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+
+
+def lock_wait_point(frame):
+    """
+    Returns where a thread is blocked on a lock, condition or queue, if it is.
+
+    Lock.acquire() runs in C, so a `with lock:` shows up as its caller's frame
+    sitting on that line; waits inside threading and queue are attributed to the
+    first frame outside those modules.
+
+    Args:
+        frame: The innermost frame of a thread.
+
+    Returns:
+        str | None: The location of the wait, or None if the thread is running.
+    """
+    waiting = False
+    while frame is not None:
+        key = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+        if key not in WAIT_FUNCTIONS:
+            break
+        waiting = True
+        frame = frame.f_back
+    if frame is None:
+        return None
+    if not waiting:
+        line = linecache.getline(frame.f_code.co_filename, frame.f_lineno)
+        if "acquire(" not in line and not ("with " in line and "lock" in line):
+            return None
+    return frame_location(frame)
+
+
+class SamplingProfiler:
+    def __init__(self, directory="logs", interval=PROFILE_INTERVAL):
+        """
+        Initializes a profiler that samples every thread's stack on a timer.
+
+        Nothing is sampled until start() is called. Sampling reads
+        sys._current_frames() from a background thread, so the profiled threads
+        run unchanged and pay no per-call cost.
+
+        Args:
+            directory (str): Where reports are written.
+            interval (float): Seconds between samples.
+        """
+        self.directory = directory
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.last_report = None
+        self.reports = itertools.count(1)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, duration=PROFILE_DURATION):
+        """
+        Starts sampling for at most `duration` seconds, unless already running.
+
+        Safe to call from a signal handler: it neither logs nor blocks, since the
+        interrupted code may hold the logging locks, or this one.
+
+        Returns:
+            bool: True if a new profile started.
+        """
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            if self.running:
+                return False
+            self.stop_event.clear()
+            self.thread = threading.Thread(
+                target=self.run, args=(duration,), name="profiler", daemon=True
+            )
+            self.thread.start()
+        finally:
+            self.lock.release()
+        return True
+
+    def stop(self):
+        """Stops sampling; the report is written by the sampling thread."""
+        self.stop_event.set()
+
+    def toggle(self, duration=PROFILE_DURATION):
+        """Starts a profile, or stops the running one."""
+        if self.running:
+            self.stop()
+        else:
+            self.start(duration)
+
+    def run(self, duration):
+        """Samples until stopped or `duration` has passed, then writes the report."""
+        logging.info(f"Profiling for up to {duration:.0f}s")
+        stacks = Counter()
+        functions = Counter()
+        waits = Counter()
+        samples = 0
+        me = threading.get_ident()
+        started = time.monotonic()
+        deadline = started + duration
+        while not self.stop_event.wait(self.interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                thread_name = names.get(ident, str(ident))
+                wait = lock_wait_point(frame)
+                if wait is not None:
+                    waits[(thread_name, wait)] += 1
+                else:
+                    functions[frame_location(frame)] += 1
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    stack.append(frame_location(frame))
+                    frame = frame.f_back
+                key = (thread_name, tuple(stack))
+                if key in stacks or len(stacks) < PROFILE_MAX_STACKS:
+                    stacks[key] += 1
+                else:
+                    stacks[(thread_name, ("(other)",))] += 1
+            samples += 1
+        self.last_report = self.write_report(
+            time.monotonic() - started, samples, stacks, functions, waits
+        )
+
+    def write_report(self, elapsed, samples, stacks, functions, waits):
+        """
+        Writes the profile to a timestamped file in the reports directory, named
+        with the process ID and a counter so reports never overwrite each other.
+
+        Returns:
+            str: The path of the report.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        name = time.strftime("profile-%Y%m%d-%H%M%S", time.localtime())
+        path = os.path.join(
+            self.directory, f"{name}-{os.getpid()}-{next(self.reports)}.txt"
+        )
+        lines = [
+            f"Sampled every {self.interval * 1000:.1f} ms for {elapsed:.1f}s, "
+            f"{samples} samples",
+            "",
+            "Running functions (samples, location):",
+        ]
+        lines += [
+            f"{count:8d}  {where}"
+            for where, count in functions.most_common(REPORT_ROWS)
+        ]
+        lines += ["", "Lock and queue waits (samples, thread, location):"]
+        lines += [
+            f"{count:8d}  {thread_name}  {where}"
+            for (thread_name, where), count in waits.most_common(REPORT_ROWS)
+        ]
+        lines += ["", "Stacks per thread (samples, innermost frame first):"]
+        per_thread = {}
+        for (thread_name, stack), count in stacks.most_common():
+            per_thread.setdefault(thread_name, []).append((count, stack))
+        for thread_name in sorted(per_thread):
+            lines += ["", f"Thread {thread_name}:"]
+            for count, stack in per_thread[thread_name][:REPORT_ROWS]:
+                lines.append(f"{count:8d}  " + "\n          <- ".join(stack))
+        with open(path, "w") as report:
+            report.write("\n".join(lines) + "\n")
+        logging.info(f"Profile of {samples} samples written to {path}")
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+def toggle_profiler(sig, frame):
+    """
+    Signal handler that starts a bounded profile, or stops the running one.
+
+    It only starts the sampling thread or sets its stop event; anything that
+    logs runs on the sampling thread.
+
+    Args:
+        sig: The received signal.
+        frame: The current stack frame.
+    """
+    profiler.toggle()
@@ -4,31 +4,37 @@ import ssl
 import threading
 import signal
 import sys
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from logging.handlers import RotatingFileHandler
+from server.logging_setup import configure_logging
+from server.metrics import connections_accepted, start_metrics_server
+from server.profiler import toggle_profiler
+from server.network.admission import admit_connection
 from server.network.connection import handle_new_connection, clients
+from server.database.archive import start_archive_job
+from server.shared import load_recent_public_history, message_ids, storage
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Create the logs directory if it doesn't exist
-if not os.path.exists("logs"):
-    os.makedirs("logs")
-
-# Configure logging to log to server.log with rotation (5 backups, each max size 5 MB)
-log_handler = RotatingFileHandler("logs/server.log", maxBytes=5000000, backupCount=5)
-logging.basicConfig(
-    handlers=[log_handler],
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
-
 # Server configuration from environment variables
 HOST = os.getenv("HOST")
 PORT = int(os.getenv("PORT"))
+# Certificate chain and private key, RSA or ECDSA
+CERT_FILE = os.getenv("CERT_FILE", os.path.join("certificates", "cert.pem"))
+KEY_FILE = os.getenv("KEY_FILE", os.path.join("certificates", "key.pem"))
+# TLS 1.3 session tickets issued per handshake, which reconnecting clients resume
+TLS_SESSION_TICKETS = int(os.getenv("TLS_SESSION_TICKETS", "2"))
+# Handshakes run at once; while all are busy, new connections wait in the backlog
+HANDSHAKE_WORKERS = int(os.getenv("HANDSHAKE_WORKERS", "32"))
+# Connections the kernel queues before they are accepted
+LISTEN_BACKLOG = int(os.getenv("LISTEN_BACKLOG", "1024"))
 
 server_socket = None
+handshake_slots = threading.BoundedSemaphore(HANDSHAKE_WORKERS)
+archive_stop = threading.Event()  # Stops the background archive job on shutdown
 
 
 def signal_handler(sig, frame):
@@ -40,6 +46,7 @@ def signal_handler(sig, frame):
         frame: The current stack frame.
     """
     logging.info("Shutting down server.")
+    archive_stop.set()
     if server_socket:
         server_socket.close()
     # Close all client connections
@@ -48,34 +55,129 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
+def timed(task):
+    """Runs a task and returns how many seconds it took."""
+    start = time.perf_counter()
+    task()
+    return time.perf_counter() - start
+
+
+def warm_up():
+    """
+    Opens the storage, then loads the startup caches in parallel.
+
+    A cache that cannot be loaded is logged and filled on first use instead, so
+    the server still starts while the database is unavailable.
+
+    Returns:
+        dict: Seconds spent on each phase that completed, by phase name.
+    """
+    timings = {}
+    try:
+        timings["storage"] = timed(storage.open)
+    except Exception as e:
+        logging.warning(
+            f"Could not open the {storage.name} storage, opening on use: {e}"
+        )
+
+    # Independent reads, each on its own connection with MySQL
+    tasks = {
+        "user_ids": storage.load_user_ids,
+        "public_history": load_recent_public_history,
+        "message_ids": message_ids.load,
+    }
+    with ThreadPoolExecutor(
+        max_workers=len(tasks), thread_name_prefix="warm-up"
+    ) as executor:
+        futures = {name: executor.submit(timed, task) for name, task in tasks.items()}
+        for name, future in futures.items():
+            try:
+                timings[name] = future.result()
+            except Exception as e:
+                logging.warning(f"Could not preload {name}, loading on first use: {e}")
+    return timings
+
+
+def create_tls_context(cert_file=CERT_FILE, key_file=KEY_FILE):
+    """
+    Creates the server's TLS context.
+
+    One context serves every connection, so the session tickets it issues let
+    clients that reconnect while the server runs skip the full handshake.
+
+    Args:
+        cert_file (str): The certificate chain, with an RSA or ECDSA key.
+        key_file (str): The private key.
+
+    Returns:
+        ssl.SSLContext: The context.
+    """
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+    if hasattr(context, "num_tickets"):
+        context.num_tickets = TLS_SESSION_TICKETS
+    return context
+
+
+def run_handshake(conn, addr, context):
+    """Sets up a connection on a handshake worker, then frees its slot."""
+    try:
+        handle_new_connection(conn, addr, context)
+    finally:
+        handshake_slots.release()
+
+
 def start_server():
     """
     Starts the server, sets up SSL, and begins accepting connections.
     """
     global server_socket
-    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-
-    cert_file = os.path.join("certificates", "cert.pem")
-    key_file = os.path.join("certificates", "key.pem")
+    configure_logging(os.path.join("logs", "server.log"))  # On startup, not on import
+    started = time.perf_counter()
+    context = create_tls_context()
+    timings = {"tls": time.perf_counter() - started}
+    timings.update(warm_up())
 
-    # Load SSL certificate and private key
-    context.load_cert_chain(certfile=cert_file, keyfile=key_file)
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_socket.bind((HOST, PORT))
-    server_socket.listen()
-    logging.info(f"Server started, listening on {HOST}:{PORT}")
+    server_socket.listen(LISTEN_BACKLOG)
+    # Ready: accepting connections with the caches loaded
+    breakdown = ", ".join(
+        f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items()
+    )
+    logging.info(
+        f"Server ready, listening on {HOST}:{PORT} with {storage.name} storage "
+        f"after {(time.perf_counter() - started) * 1000:.1f} ms ({breakdown})"
+    )
 
     # Register signal handler for graceful shutdown
     signal.signal(signal.SIGINT, signal_handler)
+    # `kill -USR1 <pid>` starts a bounded profile, a second one stops it early
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, toggle_profiler)
+
+    try:
+        start_metrics_server()
+    except OSError as e:
+        logging.warning(f"Metrics endpoint not started: {e}")
+
+    # Move old messages to the archive table in the background
+    if storage.archives:
+        start_archive_job(archive_stop)
 
+    handshakes = ThreadPoolExecutor(HANDSHAKE_WORKERS, thread_name_prefix="handshake")
     while True:
         try:
             # Accept new client connections
             conn, addr = server_socket.accept()
-            threading.Thread(
-                target=handle_new_connection, args=(conn, addr, context)
-            ).start()
+            connections_accepted.inc()
+            if not admit_connection():
+                conn.close()  # Refused before the handshake, the cheapest point
+                continue
+            # Waits while every worker is busy, leaving later connections queued
+            handshake_slots.acquire()
+            handshakes.submit(run_handshake, conn, addr, context)
         except KeyboardInterrupt:
             break
         except Exception as e:
@@ -1,127 +1,527 @@
+import time
 import logging
-import mysql.connector
-from server.database.connection import get_db_connection
+import threading
+import os
+from collections import deque
+from collections.abc import MutableMapping
+from server import metrics, tracing
+from server.database.storage import create_storage, is_public, search_words
+from server.network import protocol
+from server.network.fanout import FanoutPool
+from server.network.admission import (
+    acquire_history_slot,
+    release_history_slot,
+    error_frame,
+)
+from server.network.protocol import Frame
 
-# Dictionary to manage connected clients
-clients = {}
+
+# Threads fanning messages out to recipients, 0 fans out on the sender's thread
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "4"))
+
+
+class ClientRegistry(MutableMapping):
+    def __init__(self, shard_count=1):
+        """
+        Initializes the registry of connected clients, mapping connections to info.
+
+        Readers see an immutable snapshot, so broadcasts iterate without a lock
+        and without "dictionary changed size during iteration" while clients
+        connect and disconnect. Writers take the lock, copy the snapshot, change
+        the copy and publish it, together with an index of connections by name
+        and the connections split into shards for the fan-out workers.
+
+        Args:
+            shard_count (int): The number of shards connections are split into.
+        """
+        self.lock = threading.Lock()
+        self.shard_count = shard_count
+        self.snapshot = {}
+        self.by_name = {}
+        self.shards = ((),) * shard_count
+
+    def shard_of(self, conn):
+        """Returns the shard a connection always belongs to."""
+        return hash(conn) % self.shard_count
+
+    def publish(self, snapshot):
+        """Replaces the snapshot and its indexes; called with the lock held."""
+        by_name = {}
+        shards = [[] for _ in range(self.shard_count)]
+        for conn, info in snapshot.items():
+            name = info.get("name") if isinstance(info, dict) else None
+            by_name[name] = by_name.get(name, ()) + (conn,)
+            shards[self.shard_of(conn)].append(conn)
+        self.snapshot = snapshot
+        self.by_name = by_name
+        self.shards = tuple(tuple(shard) for shard in shards)
+
+    def __setitem__(self, conn, info):
+        with self.lock:
+            snapshot = dict(self.snapshot)
+            snapshot[conn] = info
+            self.publish(snapshot)
+
+    def __delitem__(self, conn):
+        with self.lock:
+            snapshot = dict(self.snapshot)
+            del snapshot[conn]
+            self.publish(snapshot)
+
+    def pop(self, conn, *default):
+        with self.lock:
+            if conn not in self.snapshot and default:
+                return default[0]
+            snapshot = dict(self.snapshot)
+            info = snapshot.pop(conn)
+            self.publish(snapshot)
+            return info
+
+    def clear(self):
+        with self.lock:
+            self.publish({})
+
+    def __getitem__(self, conn):
+        return self.snapshot[conn]
+
+    def get(self, conn, default=None):
+        return self.snapshot.get(conn, default)
+
+    def __contains__(self, conn):
+        return conn in self.snapshot
+
+    def __iter__(self):
+        return iter(self.snapshot)
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    # Views of one snapshot, which later changes do not affect
+    def keys(self):
+        return self.snapshot.keys()
+
+    def items(self):
+        return self.snapshot.items()
+
+    def values(self):
+        return self.snapshot.values()
+
+    def copy(self):
+        return dict(self.snapshot)
+
+    def connections(self, name):
+        """
+        Returns the connections of a connected user.
+
+        Args:
+            name (str): The username, matched exactly.
+
+        Returns:
+            tuple: The user's connections, empty if the user is not connected.
+        """
+        return self.by_name.get(name, ())
+
+
+# Connected clients: connection -> {'name', 'queue', 'protocol', 'compressor'}
+clients = ClientRegistry(max(FANOUT_WORKERS, 1))
+# Queues messages for recipients, one worker per shard of the registry
+fanout = FanoutPool(clients, FANOUT_WORKERS)
+# Users, groups and messages, in the backend selected by STORAGE_BACKEND
+storage = create_storage()
+# Number of history messages fetched and sent together in one HISTORY_BATCH frame
+HISTORY_BATCH_SIZE = 50
+# Most recent messages sent per history request, older pages are requested by ID
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "500"))
+# Matching messages returned per search request, newest first
+SEARCH_PAGE_SIZE = 20
+# Queued outbound messages above which history streaming waits for the client
+HISTORY_QUEUE_HIGH_WATERMARK = 100
+# Seconds a history stream waits for queue space before giving up
+HISTORY_BACKPRESSURE_TIMEOUT = 30
+
+# Storage latency series, bound once so recording skips the label lookup
+store_seconds = metrics.storage_seconds.labels("store_message")
+history_seconds = metrics.storage_seconds.labels("history")
+search_seconds = metrics.storage_seconds.labels("search")
+last_id_seconds = metrics.storage_seconds.labels("last_message_id")
+
+
+def queue_depths():
+    """Returns the number of messages waiting in each connection's outbound queue."""
+    return [info["queue"].qsize() for info in clients.values()]
+
+
+# Aggregated rather than labelled per user, which would give one series per
+# username and clash for users logged in more than once
+metrics.Gauge(
+    "chase_client_queue_depth_max",
+    "Messages waiting in the fullest client outbound queue.",
+    (),
+    lambda: [((), max(queue_depths(), default=0))],
+)
+metrics.Gauge(
+    "chase_client_queued_messages",
+    "Messages waiting in all client outbound queues.",
+    (),
+    lambda: [((), sum(queue_depths()))],
+)
 
 
 def enqueue_message(conn, message):
     """
     Adds a message to the message queue of the specified client connection.
 
+    The message is queued by the connection's fan-out worker, after any routed
+    message already submitted for it.
+
     Args:
         conn: The connection object representing the client.
-        message (str): The message to be enqueued.
+        message (Frame | str): The frame, or preformatted text message, to be enqueued.
     """
-    if conn in clients:
-        clients[conn]["queue"].put(message)
+    fanout.send(conn, message)
+
+
+class MessageIdAllocator:
+    def __init__(self, load_last_id=None):
+        """
+        Initializes the allocator of server-assigned message IDs and timestamps.
+
+        IDs continue from the highest ID stored in the database, which is loaded on
+        first use, and are assigned before a message is delivered so every
+        recipient and the stored row see the same ID.
+
+        Args:
+            load_last_id: Function returning the highest stored message ID.
+        """
+        self.lock = threading.Lock()
+        self.load_last_id = load_last_id or load_last_message_id
+        self.last_id = None
+        self.last_timestamp = 0
+
+    def allocate(self):
+        """
+        Assigns the next message ID and a timestamp that never goes backwards.
+
+        Returns:
+            tuple: The message ID, or 0 if the last stored ID could not be loaded,
+            and the timestamp in milliseconds since the epoch.
+        """
+        with self.lock:
+            self.last_timestamp = max(int(time.time() * 1000), self.last_timestamp)
+            if self.last_id is None:
+                try:
+                    self.last_id = self.load_last_id()
+                except storage.errors as err:
+                    logging.error("Error loading the last message ID: %s", err)
+                    return 0, self.last_timestamp
+            self.last_id += 1
+            return self.last_id, self.last_timestamp
 
+    def load(self):
+        """Loads the last stored ID ahead of the first allocation, e.g. during startup."""
+        last_id = self.load_last_id()
+        with self.lock:
+            if self.last_id is None:
+                self.last_id = last_id
 
-def store_message_in_db(sender, recipient, group, message):
+
+def load_last_message_id():
+    """
+    Returns the highest stored message ID.
+
+    Returns:
+        int: The highest ID, 0 if there are no messages.
     """
-    Stores a sent message into the database, associated with either a recipient or a group.
+    with last_id_seconds.time():
+        return storage.last_message_id()
+
+
+message_ids = MessageIdAllocator()
+
+
+class RecentHistory:
+    def __init__(self, size=HISTORY_PAGE_SIZE):
+        """
+        Initializes the in-memory copy of the newest public messages.
+
+        Once loaded, the first page of public history is served from memory
+        instead of the database, which is what every client asks for on login.
+
+        Args:
+            size (int): The number of messages kept, one history page.
+        """
+        self.lock = threading.Lock()
+        self.messages = deque(maxlen=size)
+        self.ready = False
+
+    def load(self, rows):
+        """
+        Replaces the buffer with rows read from the database and marks it ready.
+
+        Args:
+            rows (list): (id, timestamp, sender, message) rows, oldest first.
+        """
+        with self.lock:
+            self.messages.clear()
+            self.messages.extend(rows)
+            self.ready = True
+
+    def append(self, message_id, timestamp, sender, message):
+        """Adds a newly routed public message, dropping the oldest one when full."""
+        with self.lock:
+            self.messages.append((message_id, timestamp, sender, message))
+
+    def page(self, after_id=0):
+        """
+        Returns the buffered messages newer than after_id.
+
+        Args:
+            after_id (int): Only include messages with a higher ID.
+
+        Returns:
+            list | None: The rows, oldest first, or None if the buffer is not loaded.
+        """
+        with self.lock:
+            if not self.ready:
+                return None
+            rows = [row for row in self.messages if row[0] > after_id]
+        # Concurrent senders may append slightly out of ID order
+        return sorted(rows)
+
+
+recent_public_history = RecentHistory()
+
+
+def wait_for_queue_space(
+    conn,
+    high_watermark=HISTORY_QUEUE_HIGH_WATERMARK,
+    timeout=HISTORY_BACKPRESSURE_TIMEOUT,
+):
+    """
+    Blocks until the client's outbound queue drops below the high watermark.
+
+    Frames sent to the client that its fan-out worker has not queued yet count
+    towards the watermark, so a worker that is behind cannot hide a backlog.
+
+    Args:
+        conn: The connection object representing the client.
+        high_watermark (int): The queue length to wait below.
+        timeout (float): Maximum number of seconds to wait.
+
+    Returns:
+        bool: True if there is room, False if the client left or did not drain in time.
+    """
+    info = clients.get(conn)
+    if info is None:
+        return False
+    message_queue = info["queue"]
+    deadline = time.monotonic() + timeout
+    # Queue.get() notifies not_full, so the sender thread wakes us as it drains
+    with message_queue.not_full:
+        while len(message_queue.queue) + info.get("sending", 0) >= high_watermark:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or conn not in clients:
+                return False
+            message_queue.not_full.wait(min(remaining, 1))
+    return True
+
+
+def store_message_in_db(sender, recipient, group, message, message_id=0, timestamp=0):
+    """
+    Stores a sent message, associated with either a recipient or a group.
 
     Args:
         sender (str): The username of the message sender.
         recipient (str or None): The username of the recipient, if applicable (for private messages).
         group (str or None): The name of the group, if applicable (for group messages).
         message (str): The content of the message.
+        message_id (int): The server-assigned ID, 0 to let the storage assign one.
+        timestamp (int): The server-assigned timestamp in milliseconds.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        # Fetch sender ID based on username
-        cursor.execute("SELECT id FROM users WHERE username = %s", (sender,))
-        sender_id = cursor.fetchone()[0]
-
-        recipient_id = None
-        group_id = None
-
-        if recipient:
-            # Fetch recipient ID for private message
-            cursor.execute("SELECT id FROM users WHERE username = %s", (recipient,))
-            recipient_id = cursor.fetchone()[0]
-
-        if group:
-            # Fetch group ID for group message
-            cursor.execute("SELECT id FROM `groups` WHERE name = %s", (group,))
-            group_id = cursor.fetchone()[0]
-
-        # Insert message into the database
-        cursor.execute(
-            "INSERT INTO messages (sender_id, recipient_id, group_id, message) VALUES (%s, %s, %s, %s)",
-            (sender_id, recipient_id, group_id, message),
-        )
-        conn.commit()
-        logging.debug("Stored message in DB.")
-    except mysql.connector.Error as err:
-        logging.error(f"Error storing message in DB: {err}")
-    finally:
-        cursor.close()
-        conn.close()
+        with store_seconds.time(), tracing.stage("persist"):
+            storage.store_message(
+                sender, recipient, group, message, message_id, timestamp
+            )
+    except storage.errors as err:
+        logging.error("Error storing message in DB: %s", err)
 
 
-def send_message_history(conn, username, chat_identifier):
+def send_message_history(conn, username, chat_identifier, after_id=0, before_id=0):
     """
     Sends the message history to the client for a specific chat (public, group, or private).
 
+    Sends the newest HISTORY_PAGE_SIZE messages between after_id and before_id.
+    The newest public page is served from memory once it has been loaded.
+
     Args:
         conn: The connection object representing the client.
         username (str): The username of the client requesting the message history.
         chat_identifier (str): Identifier for the chat (e.g., 'public', 'group:<groupname>', or private username).
+        after_id (int): Only send messages with a higher ID, for incremental sync.
+        before_id (int): Only send messages with a lower ID, to page back; 0 for the newest.
     """
-    conn_db = get_db_connection()
-    cursor = conn_db.cursor()
-    try:
-        # Fetch user ID based on the username
-        user_id_query = "SELECT id FROM users WHERE username = %s"
-        cursor.execute(user_id_query, (username,))
-        user_id = cursor.fetchone()[0]
-
-        if chat_identifier == "public" or chat_identifier == "All":
-            # Retrieve all public messages
-            query = (
-                "SELECT users.username, messages.message "
-                "FROM messages JOIN users ON messages.sender_id = users.id "
-                "WHERE recipient_id IS NULL AND group_id IS NULL "
-                "ORDER BY messages.timestamp ASC"
-            )
-            cursor.execute(query)
-        elif chat_identifier.startswith("group:"):
-            # Retrieve messages for a specific group
-            group_name = chat_identifier.split(":", 1)[1]
-            query = (
-                "SELECT users.username, messages.message "
-                "FROM messages JOIN users ON messages.sender_id = users.id "
-                "JOIN `groups` ON messages.group_id = `groups`.id "
-                "WHERE `groups`.name = %s "
-                "ORDER BY messages.timestamp ASC"
-            )
-            cursor.execute(query, (group_name,))
-        else:
-            # Retrieve private message history
-            query = (
-                "SELECT users.username, messages.message "
-                "FROM messages JOIN users ON messages.sender_id = users.id "
-                "WHERE (messages.sender_id = %s AND messages.recipient_id = (SELECT id FROM users WHERE username = %s)) "
-                "OR (messages.sender_id = (SELECT id FROM users WHERE username = %s) AND messages.recipient_id = %s) "
-                "ORDER BY messages.timestamp ASC"
+    # Tells the client which chat the batches belong to, e.g. when it has another open
+    enqueue_message(conn, Frame(protocol.HISTORY_START, (chat_identifier,)))
+    if is_public(chat_identifier) and not before_id:
+        rows = recent_public_history.page(after_id)
+        if rows is not None:
+            sent = 0
+            for start in range(0, len(rows), HISTORY_BATCH_SIZE):
+                if not enqueue_history_batch(
+                    conn, rows[start : start + HISTORY_BATCH_SIZE]
+                ):
+                    logging.warning(
+                        "Stopped history for %s after %d messages, "
+                        "the client is not reading",
+                        username,
+                        sent,
+                    )
+                    return
+                sent += min(HISTORY_BATCH_SIZE, len(rows) - start)
+            logging.debug(
+                "Sent %d recent history messages for %s", sent, chat_identifier
             )
-            cursor.execute(query, (user_id, chat_identifier, chat_identifier, user_id))
-
-        # Send the retrieved messages to the client
-        messages = cursor.fetchall()
-        for message in messages:
-            sender = message[0]
-            text = message[1]
-            if sender == username:
-                enqueue_message(conn, f"HISTORY:ME:{text}\n")
-            else:
-                enqueue_message(conn, f"HISTORY:{sender}:{text}\n")
-        logging.debug(f"Sent message history for {chat_identifier}")
-    except mysql.connector.Error as err:
-        logging.error(f"Error retrieving message history: {err}")
+            return
+
+    # Bounds the history pages read from storage at once
+    if not acquire_history_slot():
+        logging.warning("Refused history for %s, the server is busy", username)
+        enqueue_message(conn, error_frame("server_busy", "history"))
+        return
+    sent = 0
+    batches = timed_batches(
+        storage.history(
+            username,
+            chat_identifier,
+            after_id,
+            before_id,
+            HISTORY_PAGE_SIZE,
+            HISTORY_BATCH_SIZE,
+        )
+    )
+    try:
+        for rows in batches:
+            if not enqueue_history_batch(conn, rows):
+                logging.warning(
+                    "Stopped history for %s after %d messages, "
+                    "the client is not reading",
+                    username,
+                    sent,
+                )
+                break
+            sent += len(rows)
+        logging.debug("Sent %d history messages for %s", sent, chat_identifier)
+    except storage.errors as err:
+        logging.error("Error retrieving message history: %s", err)
+    finally:
+        batches.close()  # Releases the rows a stopped stream did not read
+        release_history_slot()
+
+
+def timed_batches(batches):
+    """
+    Passes history batches through, observing how long each one took to fetch.
+
+    Args:
+        batches: The generator returned by storage.history().
+
+    Yields:
+        list: The batches, unchanged.
+    """
+    try:
+        while True:
+            start = time.perf_counter()
+            rows = next(batches, None)
+            history_seconds.observe(time.perf_counter() - start)
+            if rows is None:
+                return
+            yield rows
     finally:
-        cursor.close()
-        conn_db.close()
+        batches.close()
+
+
+def enqueue_history_batch(conn, rows):
+    """
+    Waits for room in the client's queue and enqueues one HISTORY_BATCH frame.
+
+    Args:
+        conn: The connection object representing the client.
+        rows (list): (id, timestamp, sender, message) rows, oldest first.
+
+    Returns:
+        bool: True if the batch was queued, False if the client stopped reading.
+    """
+    fields = []
+    for message_id, timestamp, sender, text in rows:
+        fields.extend((str(message_id), str(timestamp), sender, text))
+    if not wait_for_queue_space(conn):
+        return False
+    enqueue_message(conn, Frame(protocol.HISTORY_BATCH, fields, message_id=rows[-1][0]))
+    metrics.history_rows_served.inc(len(rows))
+    return True
+
+
+def load_recent_public_history():
+    """
+    Loads the newest page of public history into memory.
+
+    Returns:
+        int: The number of messages loaded.
+    """
+    rows = []
+    for batch in storage.history(
+        None, "public", 0, 0, HISTORY_PAGE_SIZE, HISTORY_BATCH_SIZE
+    ):
+        rows.extend(batch)
+    recent_public_history.load(rows)
+    return len(rows)
+
+
+def search_messages(username, conversation, text, before_id=0):
+    """
+    Searches a conversation the user can see.
+
+    Args:
+        username (str): The username of the client searching.
+        conversation (str): 'public', 'All', 'group:<groupname>', or a username.
+        text (str): The words to search for.
+        before_id (int): Only return messages with a lower ID, to page back; 0 for the newest.
+
+    Returns:
+        tuple: Up to SEARCH_PAGE_SIZE (id, timestamp, sender, message) rows, newest
+        first, and the ID to pass as before_id for the next page, 0 if there is none.
+    """
+    if not search_words(text):
+        return [], 0
+    with search_seconds.time():
+        return storage.search(username, conversation, text, before_id, SEARCH_PAGE_SIZE)
+
+
+def send_search_results(conn, username, conversation, text, before_id=0):
+    """
+    Searches a conversation and sends one page of results to the client.
+
+    Args:
+        conn: The connection object representing the client.
+        username (str): The username of the client searching.
+        conversation (str): 'public', 'All', 'group:<groupname>', or a username.
+        text (str): The words to search for.
+        before_id (int): Only return messages with a lower ID, to page back.
+    """
+    try:
+        results, next_before_id = search_messages(
+            username, conversation, text, before_id
+        )
+    except storage.errors as err:
+        logging.error("Error searching messages: %s", err)
+        results, next_before_id = [], 0
+
+    fields = [conversation, text]
+    for message_id, timestamp, sender, message in results:
+        fields.extend((str(message_id), str(timestamp), sender, message))
+    # The frame's message ID is the cursor for the next page
+    enqueue_message(
+        conn, Frame(protocol.SEARCH_RESULTS, fields, message_id=next_before_id)
+    )
+    logging.debug("Sent %d search results for %s", len(results), conversation)
@@ -0,0 +1,182 @@
+import os
+import json
+import queue
+import random
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Fraction of received messages traced, 0 disables tracing
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# JSON lines file the spans are appended to, read by benchmarks/trace_report.py
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("logs", "traces.jsonl"))
+# Spans waiting for the writer thread, newer spans are dropped when full
+TRACE_QUEUE_SIZE = 10000
+
+# The trace of the message the current thread is handling
+local = threading.local()
+# Returned by stage() when the current message is not traced
+NO_SPAN = nullcontext()
+
+
+class SpanExporter:
+    def __init__(self, path=TRACE_FILE, size=TRACE_QUEUE_SIZE):
+        """
+        Initializes the writer that appends finished spans to a JSON lines file.
+
+        Spans are written by a background thread, so recording one is a queue put.
+
+        Args:
+            path (str): The file spans are appended to.
+            size (int): The number of spans that may wait to be written.
+        """
+        self.path = path
+        self.spans = queue.Queue(size)
+        self.dropped = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        """Queues a span for writing, dropping it if the writer is behind."""
+        if self.thread is None:
+            self.start()
+        try:
+            self.spans.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        """Starts the writer thread, once."""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name="trace-exporter", daemon=True
+                )
+                self.thread.start()
+
+    def run(self):
+        """Appends spans to the file as they arrive."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.path, "a") as trace_file:
+                while True:
+                    lines = [json.dumps(self.spans.get())]
+                    while True:
+                        try:
+                            lines.append(json.dumps(self.spans.get_nowait()))
+                        except queue.Empty:
+                            break
+                    trace_file.write("\n".join(lines) + "\n")
+                    trace_file.flush()
+        except OSError as e:
+            logging.error(f"Trace export to {self.path} stopped: {e}")
+
+
+exporter = SpanExporter()
+
+
+class Trace:
+    """The spans of one message, from receipt to delivery, sharing a trace ID."""
+
+    __slots__ = ("trace_id", "sender")
+
+    def __init__(self, sender):
+        self.trace_id = os.urandom(8).hex()
+        self.sender = sender
+
+    def span(self, stage, start, end, **attributes):
+        """
+        Exports one finished stage.
+
+        Args:
+            stage (str): The stage, e.g. 'receive', 'route', 'persist'.
+            start (int): When it started, from time.perf_counter_ns().
+            end (int): When it ended, from time.perf_counter_ns().
+            **attributes: Extra fields recorded with the span.
+        """
+        exporter.export(
+            {
+                "trace": self.trace_id,
+                "stage": stage,
+                "start_ns": start,
+                "end_ns": end,
+                "sender": self.sender,
+                **attributes,
+            }
+        )
+
+    @contextmanager
+    def stage(self, stage, **attributes):
+        """Exports the time spent in the with block as a span."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.span(stage, start, time.perf_counter_ns(), **attributes)
+
+
+def start(sender, received, rate=TRACE_SAMPLE_RATE):
+    """
+    Decides whether to trace a received message, and if so makes its trace current.
+
+    Args:
+        sender (str): The username of the sender.
+        received (int): When its bytes were received, from time.perf_counter_ns().
+        rate (float): The fraction of messages traced.
+
+    Returns:
+        Trace | None: The trace, or None if the message is not sampled.
+    """
+    if not rate or random.random() >= rate:
+        return None
+    trace = Trace(sender)
+    trace.span("receive", received, time.perf_counter_ns())
+    local.trace = trace
+    return trace
+
+
+def finish():
+    """Ends the current thread's trace once the message has been handled."""
+    local.trace = None
+
+
+def stage(name, **attributes):
+    """
+    Times a stage of the current message, if it is traced.
+
+    Args:
+        name (str): The stage.
+        **attributes: Extra fields recorded with the span.
+
+    Returns:
+        A context manager exporting the span, or one doing nothing.
+    """
+    trace = getattr(local, "trace", None)
+    if trace is None:
+        return NO_SPAN
+    return trace.stage(name, **attributes)
+
+
+def attach(frame):
+    """Marks an outgoing frame of a traced message, so its deliveries are timed."""
+    trace = getattr(local, "trace", None)
+    if trace is not None:
+        frame.trace = (trace, time.perf_counter_ns())
+
+
+def delivered(frame, dequeued, sent, recipient):
+    """
+    Exports the queue wait and the send of a traced frame to one recipient.
+
+    Args:
+        frame (Frame): The frame, marked by attach().
+        dequeued (int): When the sender thread took it from the queue.
+        sent (int): When the send finished.
+        recipient (str): The username of the recipient.
+    """
+    trace, enqueued = frame.trace
+    trace.span("queue", enqueued, dequeued, recipient=recipient)
+    trace.span("send", dequeued, sent, recipient=recipient)
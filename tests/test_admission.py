@@ -0,0 +1,192 @@
+import unittest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+from server.network import protocol
+from server.network.protocol import Frame
+from server.network import admission
+from server.network.admission import RateLimiter, TokenBucket, text_kind
+
+
+class TestRateLimits(unittest.TestCase):
+    @patch("server.network.admission.time.monotonic")
+    def test_token_bucket_allows_bursts_then_the_rate(self, mock_monotonic):
+        """
+        Test that a bucket allows its burst at once, then refills at its rate and
+        reports how long to wait meanwhile.
+        """
+        mock_monotonic.return_value = 10.0
+        bucket = TokenBucket(rate=2, burst=3)
+
+        taken = [bucket.take() for _ in range(4)]
+        mock_monotonic.return_value = 10.5
+
+        self.assertEqual(taken[:3], [0, 0, 0])
+        self.assertAlmostEqual(taken[3], 0.5)
+        self.assertEqual(bucket.take(), 0)
+        self.assertGreater(bucket.take(), 0)
+
+    def test_limits_are_per_user_and_type(self):
+        """
+        Test that each user and message type has its own bucket, shared across
+        the case of the username, and that a zero rate is unlimited.
+        """
+        limiter = RateLimiter({"public": (1, 1), "search": (0, 0)})
+
+        self.assertEqual(limiter.check("Alice", "public"), 0)
+        self.assertGreater(limiter.check("alice", "public"), 0)
+        self.assertEqual(limiter.check("Bob", "public"), 0)
+        self.assertEqual([limiter.check("Alice", "search") for _ in range(5)], [0] * 5)
+
+    @patch("server.network.admission.time.monotonic")
+    def test_idle_buckets_are_swept(self, mock_monotonic):
+        """
+        Test that buckets which have refilled are dropped on the next sweep, so
+        names that stop sending do not stay in memory, while limited users keep
+        their bucket.
+        """
+        mock_monotonic.return_value = 0.0
+        limiter = RateLimiter({"public": (1, 2)}, sweep_interval=60)
+        for i in range(100):
+            limiter.check(f"user{i}", "public")
+        mock_monotonic.return_value = 59.0
+        limiter.check("Alice", "public")
+        limiter.check("Alice", "public")
+
+        mock_monotonic.return_value = 60.0
+        limiter.check("Bob", "public")
+
+        self.assertEqual(set(limiter.buckets), {("alice", "public"), ("bob", "public")})
+
+    @patch("server.network.admission.time.monotonic")
+    def test_messages_are_not_lost_to_a_sweep(self, mock_monotonic):
+        """
+        Test that a message counted while its bucket is being swept is charged to
+        the bucket that replaces it, so a sweep never lets a user exceed the burst.
+        """
+        mock_monotonic.return_value = 0.0
+        limiter = RateLimiter({"public": (1, 2)}, sweep_interval=60)
+        limiter.check("Alice", "public")
+        mock_monotonic.return_value = 60.0
+        swept = limiter.buckets[("alice", "public")]
+
+        class SweptDuringLookup(dict):
+            def get(self, key, default=None):
+                bucket = super().get(key, default)
+                if bucket is swept:
+                    with limiter.lock:
+                        limiter.sweep()  # Another sender creates a bucket meanwhile
+                return bucket
+
+        limiter.buckets = SweptDuringLookup(limiter.buckets)
+
+        self.assertEqual(limiter.check("Alice", "public"), 0)
+        self.assertEqual(limiter.check("Alice", "public"), 0)
+        self.assertGreater(limiter.check("Alice", "public"), 0)
+        self.assertIsNone(swept.take())
+
+    def test_text_messages_are_classified_as_routed(self):
+        """
+        Test that text-protocol messages get the type process_message routes them as.
+        """
+        self.assertEqual(text_kind("HISTORY:public"), "history")
+        self.assertEqual(text_kind("SEARCH:public:deploy"), "search")
+        self.assertEqual(text_kind("SEARCH_MORE:42:public:deploy"), "search")
+        self.assertEqual(text_kind("GROUP:team:hi"), "group")
+        self.assertEqual(text_kind("@Bob:hi"), "private")
+        self.assertEqual(text_kind("@Public:hi"), "public")
+        self.assertEqual(text_kind("hello"), "public")
+
+
+class TestAdmission(unittest.TestCase):
+    @patch("server.network.connection.process_frame")
+    @patch("server.network.connection.enqueue_message")
+    @patch(
+        "server.network.admission.rate_limiter",
+        RateLimiter({"public": (1, 2)}),
+    )
+    def test_frames_over_the_limit_get_an_error(self, mock_enqueue, mock_process):
+        """
+        Test that frames beyond the sender's limit are answered with an ERROR frame
+        instead of being routed.
+        """
+        from server.network.connection import receive_frames
+
+        conn = MagicMock()
+        conn.recv.return_value = b""
+        data = b"".join(
+            Frame(protocol.SEND_PUBLIC, (f"hi {i}",)).to_bytes() for i in range(3)
+        )
+
+        receive_frames(conn, "Alice", data)
+
+        self.assertEqual(mock_process.call_count, 2)
+        error = mock_enqueue.call_args.args[1]
+        self.assertEqual(error.frame_type, protocol.ERROR)
+        self.assertEqual(error.fields[:2], ("rate_limited", "public"))
+
+    @patch("server.network.admission.login_slots", threading.BoundedSemaphore(2))
+    def test_logins_beyond_the_connection_limit_are_refused(self):
+        """
+        Test that logins are refused once MAX_CONNECTIONS slots are reserved, even
+        when they arrive together, and admitted again once a slot is released.
+        """
+        start = threading.Barrier(5)
+
+        def login():
+            start.wait()
+            return admission.admit_login()
+
+        with ThreadPoolExecutor(5) as pool:
+            admitted = list(pool.map(lambda _: login(), range(5)))
+
+        self.assertEqual(sorted(admitted), [False, False, False, True, True])
+        admission.release_login()
+        self.assertTrue(admission.admit_login())
+
+    @patch("server.network.admission.login_slots", threading.BoundedSemaphore(1))
+    @patch("server.network.connection.cleanup_client_connection")
+    @patch("server.network.connection.read_handshake", return_value=b"Alice")
+    def test_refused_and_finished_logins_release_their_slot(
+        self, mock_read, mock_cleanup
+    ):
+        """
+        Test that a client turned away does not hold a slot, and that a client's
+        slot is released when its connection ends.
+        """
+        from server.network.connection import handle_client
+
+        self.assertTrue(admission.admit_login())
+        handle_client(MagicMock(), ("127.0.0.1", 1))
+        self.assertFalse(admission.login_slots.acquire(blocking=False))
+
+        admission.release_login()
+        with patch(
+            "server.network.connection.storage.get_all_users",
+            side_effect=RuntimeError("storage down"),
+        ), patch("server.network.connection.broadcast_client_list"):
+            handle_client(MagicMock(), ("127.0.0.1", 2))
+
+        self.assertTrue(admission.admit_login())
+
+    @patch("server.shared.acquire_history_slot", return_value=False)
+    @patch("server.shared.storage")
+    @patch("server.shared.enqueue_message")
+    def test_history_is_refused_while_the_server_is_busy(
+        self, mock_enqueue, mock_storage, mock_acquire
+    ):
+        """
+        Test that a history request that gets no turn is answered with an ERROR
+        frame without reading storage.
+        """
+        from server.shared import send_message_history
+
+        send_message_history(MagicMock(), "Alice", "Bob")
+
+        mock_storage.history.assert_not_called()
+        error = mock_enqueue.call_args.args[1]
+        self.assertEqual(error.fields, ("server_busy", "history"))
+
+
+if __name__ == "__main__":
+    unittest.main()
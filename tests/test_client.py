@@ -1,22 +1,61 @@
+import socket
+import struct
+import asyncio
 import unittest
+import threading
 from unittest.mock import patch, MagicMock
 from client.client import ChatClient, main
+from client.ui.chat_management import (
+    display_message,
+    handle_send_button,
+    highlight_chat_tab,
+    reload_current_chat,
+    resize_message_bubbles,
+    show_search_results,
+)
+from client.handlers.message_decoder import (
+    ChatRecord,
+    MessageDecoder,
+    SearchResultsRecord,
+)
+from server.network import protocol
+from server.network.protocol import Frame
+from client.ui.update_scheduler import NotificationDebouncer, UiUpdateScheduler
+from client.ui.chat_client_ui import ChatClientUI
+from client.network.connection import ClientConnection
+from client.network.async_connection import AsyncClientConnection
+from client.handlers.auth_handler import AuthHandler, login_and_measure
+from client.network.reconnect import (
+    ReconnectSupervisor,
+    backoff_delay,
+    CONNECTING,
+    CONNECTED,
+    DISCONNECTED,
+    FAILED,
+)
 from PyQt5.QtWidgets import QDialog
+from PyQt5.QtCore import QObject
 import sys
 import os  # Import os to use environment variable
 
 
 class TestChatClient(unittest.TestCase):
+    def setUp(self):
+        # Keep the tests from starting the background reconnect thread
+        patcher = patch("client.client.ReconnectSupervisor")
+        self.mock_supervisor = patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch("client.client.ClientConnection")
     @patch("client.client.MessageHandler")
-    @patch("client.client.QSound.play")
+    @patch("client.client.NotificationPlayer")
     @patch("client.client.logout_user")
     @patch("client.client.ChatClientUI")
     def test_chat_client_initialization(
         self,
         mock_ui,
         mock_logout_user,
-        mock_qsound,
+        mock_notification_player,
         mock_message_handler,
         mock_client_connection,
     ):
@@ -32,8 +71,9 @@ class TestChatClient(unittest.TestCase):
             os.getenv("HOST", "127.0.0.1"), 65432, mock_ui_instance, "TestClient"
         )
 
-        # Check if connection is established
-        mock_connection.connect_to_server.assert_called_once()
+        # Check that the connection is handed to a started reconnect supervisor
+        self.assertIs(self.mock_supervisor.call_args[0][0], mock_connection)
+        self.mock_supervisor.return_value.start.assert_called_once()
 
         # Mock additional methods
         with patch.object(
@@ -42,20 +82,21 @@ class TestChatClient(unittest.TestCase):
             client.ui, "display_message"
         ) as mock_display_message:
             # Simulate signal emission by directly calling the connected slots
-            client.ui.display_message("Test Message", "general", "left")
-            client.play_notification_sound("Test Message", "general", "left")
+            record = ChatRecord("general", None, "Test Message", "left")
+            client.ui.display_message(record)
+            client.play_notification_sound(record)
 
             # Verify that display_message was called with the correct arguments
-            mock_display_message.assert_called_with("Test Message", "general", "left")
+            mock_display_message.assert_called_with(record)
 
             # Verify that play_notification_sound was called with the correct arguments
-            mock_play_sound.assert_called_with("Test Message", "general", "left")
+            mock_play_sound.assert_called_with(record)
 
     @patch("client.client.ClientConnection")
     @patch("client.client.MessageHandler")
-    @patch("client.client.QSound.play")
+    @patch("client.client.NotificationPlayer")
     def test_chat_client_send_message(
-        self, mock_qsound, mock_message_handler, mock_client_connection
+        self, mock_notification_player, mock_message_handler, mock_client_connection
     ):
         """
         Test the send_message functionality, ensuring that the message is sent correctly to the server.
@@ -75,9 +116,9 @@ class TestChatClient(unittest.TestCase):
 
     @patch("client.client.ClientConnection")
     @patch("client.client.MessageHandler")
-    @patch("client.client.QSound.play")
+    @patch("client.client.NotificationPlayer")
     def test_chat_client_receive_messages(
-        self, mock_qsound, mock_message_handler, mock_client_connection
+        self, mock_notification_player, mock_message_handler, mock_client_connection
     ):
         """
         Test the receive_messages functionality, ensuring that incoming messages are processed correctly.
@@ -100,10 +141,15 @@ class TestChatClient(unittest.TestCase):
         mock_handler_instance.process_message.assert_any_call("message2")
 
     @patch("client.client.ClientConnection")
+    @patch("client.client.NotificationPlayer")
     @patch("client.client.QApplication.instance")
     @patch("client.client.logout_user")
     def test_chat_client_close_connection(
-        self, mock_logout_user, mock_qapp_instance, mock_client_connection
+        self,
+        mock_logout_user,
+        mock_qapp_instance,
+        mock_notification_player,
+        mock_client_connection,
     ):
         """
         Test the close_connection method, ensuring that the connection is properly closed,
@@ -120,7 +166,8 @@ class TestChatClient(unittest.TestCase):
         # Simulate closing the connection
         client.close_connection()
 
-        # Check if the connection's close_connection method was called
+        # Check that reconnecting is stopped and the connection is closed
+        self.mock_supervisor.return_value.stop.assert_called_once()
         mock_connection.close_connection.assert_called_once()
 
         # Check if logout_user was called with the correct client name
@@ -163,6 +210,862 @@ class TestChatClient(unittest.TestCase):
             mock_chat_client.return_value.close_connection
         )
 
+    @patch("client.client.ClientConnection")
+    @patch("client.client.MessageHandler")
+    @patch("client.client.NotificationPlayer")
+    def test_play_notification_sound(
+        self, mock_notification_player, mock_message_handler, mock_client_connection
+    ):
+        """
+        Test that received live messages play the preloaded sound, while history
+        and our own messages do not.
+        """
+        client = ChatClient(
+            os.getenv("HOST", "127.0.0.1"), 65432, MagicMock(), "TestClient"
+        )
+        player = mock_notification_player.return_value
+
+        client.play_notification_sound(ChatRecord("history", "Bob", "old", "left"))
+        client.play_notification_sound(
+            ChatRecord("public", "TestClient", "hi", "right")
+        )
+        player.play.assert_not_called()
+
+        client.play_notification_sound(ChatRecord("public", "Bob", "hi", "left", "All"))
+        player.play.assert_called_once()
+
+    @patch("client.client.ClientConnection")
+    @patch("client.client.MessageHandler")
+    @patch("client.client.NotificationPlayer")
+    def test_reconnect_is_signalled(
+        self, mock_notification_player, mock_message_handler, mock_client_connection
+    ):
+        """
+        Test that connecting again after a loss signals a reconnect, so the UI can
+        reload the open chat, while the first connection does not.
+        """
+        client = ChatClient(
+            os.getenv("HOST", "127.0.0.1"), 65432, MagicMock(), "TestClient"
+        )
+        reconnected = MagicMock()
+        client.reconnected_signal.connect(reconnected)
+
+        client.handle_connection_state(CONNECTED)
+        reconnected.assert_not_called()
+
+        client.handle_connection_state(DISCONNECTED)
+        client.handle_connection_state(CONNECTING)
+        client.handle_connection_state(CONNECTED)
+        reconnected.assert_called_once_with()
+
+
+class TestReconnectSupervisor(unittest.TestCase):
+    @patch("client.network.reconnect.backoff_delay", return_value=0)
+    def test_reconnects_after_loss_and_gives_up(self, mock_backoff):
+        """
+        Test that the supervisor resumes receiving after a lost connection and
+        reports FAILED once the attempt limit is reached.
+        """
+        connection = MagicMock()
+        connection.connect_to_server.side_effect = [True, True, False, False]
+        receive_loop = MagicMock()
+        states = []
+
+        supervisor = ReconnectSupervisor(connection, receive_loop, states.append, 2)
+        supervisor.run()
+
+        self.assertEqual(receive_loop.call_count, 2)
+        self.assertEqual(
+            states,
+            [
+                CONNECTING,
+                CONNECTED,
+                DISCONNECTED,
+                CONNECTING,
+                CONNECTED,
+                DISCONNECTED,
+                CONNECTING,
+                CONNECTING,
+                FAILED,
+            ],
+        )
+
+    @patch("client.network.connection.socket.socket")
+    @patch("client.network.connection.ssl.create_default_context")
+    def test_reconnect_resumes_the_tls_session(self, mock_context, mock_socket):
+        """
+        Test that a reconnect offers the TLS session of the previous connection.
+        """
+        context = mock_context.return_value
+        first, second = MagicMock(), MagicMock()
+        context.wrap_socket.side_effect = [first, second]
+        connection = ClientConnection("localhost", 65432, "Alice")
+        connection.negotiate_protocol = MagicMock()
+
+        self.assertTrue(connection.connect_to_server())
+        self.assertTrue(connection.connect_to_server())
+
+        sessions = [
+            call.kwargs["session"] for call in context.wrap_socket.call_args_list
+        ]
+        self.assertEqual(sessions, [None, first.session])
+        self.assertIs(connection.session, second.session)
+
+    def test_backoff_uses_full_jitter(self):
+        """
+        Test that backoff delays stay within the exponentially growing, capped ceiling.
+        """
+        for attempt in range(10):
+            delay = backoff_delay(attempt, base=1.0, cap=30.0)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30.0, 2**attempt))
+
+
+def recv_exactly(sock, size):
+    """Reads `size` bytes from a blocking socket, fewer if it closes first."""
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class TestAsyncClientConnection(unittest.TestCase):
+    def setUp(self):
+        # A plain TCP peer stands in for the server; TLS is patched out
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(self.listener.close)
+        open_connection = asyncio.open_connection
+        self.writers = []
+
+        async def plain_open_connection(host, port, **kwargs):
+            reader, writer = await open_connection(host, port)
+            self.writers.append(writer)
+            return reader, writer
+
+        for target, replacement in (
+            (
+                "client.network.async_connection.asyncio.open_connection",
+                plain_open_connection,
+            ),
+            ("client.network.async_connection.ssl.create_default_context", MagicMock()),
+        ):
+            patcher = patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_connection(self, protocol_version=protocol.PROTOCOL_VERSION):
+        connection = AsyncClientConnection(
+            "127.0.0.1", self.listener.getsockname()[1], "Alice", protocol_version
+        )
+        self.addCleanup(connection.close_connection)
+        return connection
+
+    def accept(self, handshake_size, reply):
+        """Accepts the client, reads its handshake and answers with `reply`."""
+        peer, _ = self.listener.accept()
+        self.addCleanup(peer.close)
+        peer.settimeout(5)
+        handshake = recv_exactly(peer, handshake_size)
+        if reply:
+            peer.sendall(reply)
+        else:
+            peer.close()
+        return peer, handshake
+
+    def connect(self, connection, handshake, reply):
+        """Connects on a background thread while the peer answers the handshake."""
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(connection.connect_to_server())
+        )
+        thread.start()
+        peer, received = self.accept(len(handshake), reply)
+        thread.join(5)
+        self.assertEqual(received, handshake)
+        return peer, result[0]
+
+    def test_negotiates_frames_and_writes_in_order(self):
+        """
+        Test that the v2 handshake switches to binary frames, and that queued
+        sends reach the server in the order they were made.
+        """
+        connection = self.make_connection()
+        peer, connected = self.connect(
+            connection, protocol.encode_handshake("Alice"), protocol.encode_ack()
+        )
+
+        messages = [f"message {i}" for i in range(50)] + ["@Bob:hi", "HISTORY:Bob"]
+        for message in messages:
+            connection.send_message(message)
+        expected = b"".join(
+            protocol.encode_command(message).to_bytes() for message in messages
+        )
+
+        self.assertTrue(connected)
+        self.assertTrue(connection.stream.binary)
+        self.assertEqual(recv_exactly(peer, len(expected)), expected)
+
+    def test_falls_back_to_text_for_servers_without_frames(self):
+        """
+        Test that a server answering the v2 handshake with text is spoken to in
+        text, and that its first message is delivered, as is a v1-only client.
+        """
+        connection = self.make_connection()
+        peer, connected = self.connect(
+            connection, protocol.encode_handshake("Alice"), b"CLIENT_LIST:Alice,Bob"
+        )
+        connection.send_message("hello")
+
+        self.assertTrue(connected)
+        self.assertFalse(connection.stream.binary)
+        self.assertEqual(next(connection.receive_messages()), "CLIENT_LIST:Alice,Bob")
+        self.assertEqual(recv_exactly(peer, 5), b"hello")
+
+        text_only = self.make_connection(protocol_version=1)
+        _, connected = self.connect(text_only, b"Alice", b"ALL_USERS:Bob")
+        self.assertTrue(connected)
+        self.assertFalse(text_only.stream.binary)
+
+    def test_close_cancels_the_reader_and_writer(self):
+        """
+        Test that closing the connection ends its reader and writer tasks, closes
+        the stream and stops the event loop.
+        """
+        connection = self.make_connection()
+        peer, _ = self.connect(
+            connection, protocol.encode_handshake("Alice"), protocol.encode_ack()
+        )
+        tasks = list(connection.tasks)
+
+        connection.close_connection()
+
+        self.assertEqual(len(tasks), 2)
+        self.assertTrue(all(task.done() for task in tasks))
+        self.assertFalse(connection.loop_thread.is_alive())
+        self.assertFalse(connection.connected)
+        self.assertEqual(peer.recv(1024), b"")
+
+    @patch("client.network.reconnect.backoff_delay", return_value=0)
+    def test_peer_eof_or_reset_reports_a_disconnect(self, mock_backoff):
+        """
+        Test that the server closing or resetting the connection ends
+        receive_messages, so the supervisor reports DISCONNECTED.
+        """
+        for reset in (False, True):
+            with self.subTest(reset=reset):
+                connection = self.make_connection()
+                received = []
+                states = []
+
+                def on_state(state):
+                    states.append(state)
+                    if state == DISCONNECTED:
+                        supervisor.stop()
+
+                supervisor = ReconnectSupervisor(
+                    connection,
+                    lambda: received.extend(connection.receive_messages()),
+                    on_state,
+                )
+                supervisor.start()
+                peer, _ = self.accept(
+                    len(protocol.encode_handshake("Alice")), protocol.encode_ack()
+                )
+                peer.sendall(Frame(protocol.CLIENT_LIST, ("Alice", "Bob")).to_bytes())
+                if reset:
+                    # Closing with a zero linger time sends a TCP reset
+                    peer.setsockopt(
+                        socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+                    )
+                peer.close()
+                supervisor.join(5)
+
+                self.assertFalse(supervisor.is_alive())
+                self.assertEqual(states, [CONNECTING, CONNECTED, DISCONNECTED])
+                self.assertFalse(connection.connected)
+                if not reset:
+                    self.assertEqual(received[0].fields, ("Alice", "Bob"))
+
+    def test_failed_handshake_closes_the_stream(self):
+        """
+        Test that a server closing the connection during the handshake fails the
+        attempt and closes the stream that was opened for it.
+        """
+        connection = self.make_connection()
+
+        _, connected = self.connect(connection, protocol.encode_handshake("Alice"), b"")
+
+        self.assertFalse(connected)
+        self.assertFalse(connection.connected)
+        self.assertEqual(len(self.writers), 1)
+        self.assertTrue(self.writers[0].is_closing())
+
+
+class FakeThreadPool:
+    """Holds started tasks until the test runs them, on the test's thread."""
+
+    def __init__(self):
+        self.tasks = []
+
+    def start(self, task):
+        self.tasks.append(task)
+
+    def run_next(self):
+        self.tasks.pop(0).run()
+
+
+class TestAuthHandler(unittest.TestCase):
+    def setUp(self):
+        self.pool = FakeThreadPool()
+        for target, kwargs in (
+            (
+                "client.handlers.auth_handler.QThreadPool.globalInstance",
+                {"return_value": self.pool},
+            ),
+            ("client.handlers.auth_handler.QTimer", {}),
+            ("client.handlers.auth_handler.login_user", {"return_value": "Alice"}),
+            ("client.handlers.auth_handler.register_user", {"return_value": True}),
+            ("client.handlers.auth_handler.logout_user", {}),
+        ):
+            patcher = patch(target, **kwargs)
+            setattr(self, "mock_" + target.rsplit(".", 1)[1], patcher.start())
+            self.addCleanup(patcher.stop)
+        self.dialog = MagicMock()
+        self.dialog.login_username.text.return_value = "alice"
+        self.dialog.login_password.text.return_value = "secret"
+        self.handler = AuthHandler(self.dialog)
+        self.timer = self.handler.timeout_timer
+
+    def test_login_runs_on_the_pool_and_applies_the_result(self):
+        """
+        Test that a login is dispatched to the thread pool with the dialog marked
+        busy and the timeout running, and that its result logs the user in.
+        """
+        self.handler.handle_login()
+
+        self.assertEqual(len(self.pool.tasks), 1)
+        self.assertIs(self.pool.tasks[0].func, login_and_measure)
+        self.assertEqual(self.pool.tasks[0].args, ("alice", "secret"))
+        self.dialog.set_busy.assert_called_once_with(True, "Signing in...")
+        self.timer.start.assert_called_once()
+        self.dialog.accept.assert_not_called()
+
+        self.pool.run_next()
+
+        self.mock_login_user.assert_called_once()
+        self.assertEqual(self.dialog.username, "Alice")
+        self.dialog.accept.assert_called_once()
+        self.dialog.set_busy.assert_called_with(False)
+        self.timer.stop.assert_called_once()
+        self.assertIsNone(self.handler.active_request)
+
+    def test_failed_login_and_task_errors_are_reported(self):
+        """
+        Test that rejected credentials and an exception in the task are shown on
+        the login page and clear the busy state.
+        """
+        self.mock_login_user.return_value = False
+        self.handler.handle_login()
+        self.pool.run_next()
+
+        self.dialog.accept.assert_not_called()
+        self.dialog.login_message_label.setText.assert_called_with(
+            "Invalid credentials,\nor user already logged in."
+        )
+
+        self.mock_login_user.side_effect = RuntimeError("pool exhausted")
+        self.handler.handle_login()
+        self.pool.run_next()
+
+        self.dialog.login_message_label.setText.assert_called_with(
+            "Something went wrong,\nplease try again."
+        )
+        self.dialog.set_busy.assert_called_with(False)
+        self.assertIsNone(self.handler.active_request)
+
+    def test_timeout_gives_up_and_undoes_a_late_login(self):
+        """
+        Test that a timed out login stops waiting, and that a login completing
+        afterwards is logged out instead of accepted.
+        """
+        self.handler.handle_login()
+
+        self.handler.handle_timeout()
+
+        self.dialog.login_message_label.setText.assert_called_with(
+            "Server is not responding,\nplease try again."
+        )
+        self.dialog.set_busy.assert_called_with(False)
+        self.assertIsNone(self.handler.active_request)
+
+        self.pool.run_next()  # The login completes late
+        self.dialog.accept.assert_not_called()
+        self.assertEqual(len(self.pool.tasks), 1)
+        self.pool.run_next()
+        self.mock_logout_user.assert_called_once_with("Alice")
+
+    def test_cancel_drops_stale_results(self):
+        """
+        Test that a cancelled request's result is ignored while a newer request is
+        waited for, that a cancelled successful login is logged out, and that a
+        cancelled failed one needs no logout.
+        """
+        self.handler.handle_login()
+        self.handler.cancel()
+
+        self.dialog.login_message_label.setText.assert_called_with("Cancelled.")
+        self.dialog.set_busy.assert_called_with(False)
+
+        self.mock_login_user.return_value = False
+        self.handler.handle_login()
+        second = self.handler.active_request
+        self.mock_login_user.return_value = "Alice"
+        self.pool.run_next()  # The cancelled login succeeds
+
+        self.dialog.accept.assert_not_called()
+        self.assertEqual(self.handler.active_request, second)
+        self.assertIs(self.pool.tasks[-1].func, self.mock_logout_user)
+
+        self.mock_login_user.return_value = False
+        self.pool.run_next()  # The current login fails
+        self.pool.run_next()  # The logout of the cancelled one
+        self.mock_logout_user.assert_called_once_with("Alice")
+        self.assertIsNone(self.handler.active_request)
+
+        self.handler.handle_login()
+        self.handler.cancel()
+        self.pool.run_next()
+        self.assertEqual(self.pool.tasks, [])
+
+    def test_register_runs_on_the_pool(self):
+        """
+        Test that registration is dispatched to the pool and, once it succeeds,
+        switches to the login page with the new username filled in.
+        """
+        self.dialog.register_username.text.return_value = "bob"
+        self.dialog.register_password.text.return_value = "pw"
+        self.dialog.confirm_password.text.return_value = "pw"
+
+        self.handler.handle_register()
+
+        self.dialog.set_busy.assert_called_once_with(True, "Registering...")
+        self.pool.run_next()
+        self.mock_register_user.assert_called_once_with("bob", "pw")
+        self.dialog.switch_to_login.assert_called_once()
+        self.dialog.login_username.setText.assert_called_with("bob")
+
+
+class TestMessageDecoder(unittest.TestCase):
+    def setUp(self):
+        self.decoder = MessageDecoder("Alice")
+
+    def test_decode_public_message(self):
+        """
+        Test that a public frame decodes into a chat record with its alignment resolved.
+        """
+        record = self.decoder.decode("PUBLIC:Bob: hello: world")
+
+        self.assertEqual(record.message_type, "public")
+        self.assertEqual(record.sender, "Bob")
+        self.assertEqual(record.content, "hello: world")
+        self.assertEqual(record.alignment, "left")
+        self.assertEqual(record.initials, "BO")
+        self.assertEqual(record.highlight, "All")
+
+    def test_decode_history_from_self(self):
+        """
+        Test that history sent by the current user is attributed to them and right aligned.
+        """
+        record = self.decoder.decode("HISTORY:ME:earlier")
+
+        self.assertEqual(record.sender, "Alice")
+        self.assertEqual(record.alignment, "right")
+        self.assertIsNone(record.highlight)
+
+    def test_decode_client_list_excludes_self(self):
+        """
+        Test that the connected client list drops the current user and duplicates.
+        """
+        record = self.decoder.decode("CLIENT_LIST:Alice,Bob,bob,Carol")
+
+        self.assertEqual(record.clients, ["bob", "Carol"])
+
+    def test_decode_unknown_or_malformed(self):
+        """
+        Test that unknown prefixes and malformed payloads are dropped.
+        """
+        self.assertIsNone(self.decoder.decode("UNKNOWN:thing"))
+        self.assertIsNone(self.decoder.decode("GROUP:only-group"))
+
+    def test_decode_history_batch(self):
+        """
+        Test that a history batch frame decodes into one history record per message,
+        keeping each message's server ID and timestamp.
+        """
+        frame = Frame(
+            protocol.HISTORY_BATCH,
+            ("7", "1000", "Bob", "hi", "9", "2000", "Alice", "hey"),
+        )
+        records = self.decoder.decode_frame(frame)
+
+        self.assertEqual([r.sender for r in records], ["Bob", "Alice"])
+        self.assertEqual([r.alignment for r in records], ["left", "right"])
+        self.assertEqual([r.message_id for r in records], [7, 9])
+        self.assertEqual([r.timestamp for r in records], [1000, 2000])
+        self.assertTrue(all(r.message_type == "history" for r in records))
+        self.assertIsNone(
+            self.decoder.decode_frame(Frame(protocol.HISTORY_BATCH, ("7", "Bob")))
+        )
+
+    def test_decode_search_results(self):
+        """
+        Test that search results keep their message IDs and the next page cursor.
+        """
+        frame = Frame(
+            protocol.SEARCH_RESULTS,
+            ("public", "deploy", "12", "1000", "Bob", "deploy now"),
+            message_id=12,
+        )
+        record = self.decoder.decode_frame(frame)
+
+        self.assertEqual((record.conversation, record.query), ("public", "deploy"))
+        self.assertEqual(record.next_before_id, 12)
+        self.assertEqual(record.results[0].message_type, "search")
+        self.assertEqual(record.results[0].message_id, 12)
+
+    def test_decode_text_search_results(self):
+        """
+        Test that text-protocol result lines are collected into one page at their
+        SEARCH_END, and that a search with no matches still yields its page.
+        """
+        self.assertIsNone(self.decoder.decode("SEARCH_RESULT:12:Bob:deploy: now"))
+        self.assertIsNone(self.decoder.decode("SEARCH_RESULT:9:Alice:deployed"))
+        record = self.decoder.decode("SEARCH_END:9:group:team:deploy")
+
+        self.assertEqual((record.conversation, record.query), ("group:team", "deploy"))
+        self.assertEqual(
+            [r.content for r in record.results], ["deploy: now", "deployed"]
+        )
+        self.assertEqual([r.message_id for r in record.results], [12, 9])
+        self.assertEqual(record.next_before_id, 9)
+
+        record = self.decoder.decode("SEARCH_END:0:public:nothing")
+        self.assertEqual((record.query, record.results), ("nothing", []))
+        self.assertEqual(record.next_before_id, 0)
+
+    def test_history_is_tagged_with_its_chat(self):
+        """
+        Test that history records carry the chat named by the HISTORY_START sent
+        before them, in binary frames and in the text protocol.
+        """
+        self.assertIsNone(
+            self.decoder.decode_frame(Frame(protocol.HISTORY_START, ("Bob",)))
+        )
+        records = self.decoder.decode_frame(
+            Frame(protocol.HISTORY_BATCH, ("7", "1000", "Bob", "hi"))
+        )
+        self.assertEqual(records[0].conversation, "Bob")
+
+        self.assertIsNone(self.decoder.decode("HISTORY_START:group:team"))
+        record = self.decoder.decode("HISTORY:Bob:hello")
+        self.assertEqual(record.conversation, "group:team")
+
+    def test_decode_frame_keeps_message_id(self):
+        """
+        Test that live frames pass their server-assigned ID and timestamp to the record.
+        """
+        frame = Frame(protocol.PUBLIC, ("Bob", "hi"), 42, 1700000000123)
+        record = self.decoder.decode_frame(frame)
+
+        self.assertEqual((record.message_id, record.timestamp), (42, 1700000000123))
+
+
+class TestSidebarHighlighting(unittest.TestCase):
+    def _make_ui(self, names):
+        """
+        Builds a mock UI whose sidebar index holds a mock row for each name.
+        """
+        ui = MagicMock()
+        ui.selected_chat = "All"
+        ui.unread_counts = {}
+        ui.sidebar_index = {
+            name: {
+                "item": MagicMock(),
+                "widget": MagicMock(),
+                "unread_label": MagicMock(),
+            }
+            for name in names
+        }
+        return ui
+
+    def test_highlight_uses_exact_name(self):
+        """
+        Test that highlighting "Al" does not touch the row for "Alice" and that
+        only the matching row is repainted.
+        """
+        ui = self._make_ui(["All", "Alice", "Al"])
+
+        highlight_chat_tab(ui, "Al")
+        highlight_chat_tab(ui, "Al")
+
+        self.assertEqual(ui.unread_counts, {"Al": 2})
+        ui.sidebar_index["Al"]["unread_label"].setText.assert_called_with("2")
+        ui.sidebar_index["Alice"]["widget"].setStyleSheet.assert_not_called()
+
+    def test_highlight_skips_selected_and_unknown_chats(self):
+        """
+        Test that the open chat and names missing from the sidebar are not counted.
+        """
+        ui = self._make_ui(["All", "Bob"])
+
+        highlight_chat_tab(ui, "All")
+        highlight_chat_tab(ui, "Carol")
+
+        self.assertEqual(ui.unread_counts, {})
+
+
+@patch("client.ui.chat_management.QHBoxLayout", MagicMock())
+@patch("client.ui.chat_management.QWidget", MagicMock())
+@patch("client.ui.chat_management.QLabel", MagicMock())
+class TestReconnectHistory(unittest.TestCase):
+    def _make_ui(self, current_chat, displayed_ids):
+        """
+        Builds a mock UI with the given chat open and message IDs already shown.
+        """
+        ui = MagicMock()
+        ui.client_name = "Alice"
+        ui.current_chat = current_chat
+        ui.displayed_ids = set(displayed_ids)
+        ui.search_query = None
+        ui.message_bubbles = []
+        ui.last_sender = None
+        ui.bubble_max_width = 500
+        ui.text_metrics.ideal_width.return_value = 50.0
+        return ui
+
+    def show(self, ui, frames):
+        """Decodes the frames as the receive thread does and displays the records."""
+        decoder = MessageDecoder(ui.client_name)
+        for frame in frames:
+            records = decoder.decode_frame(frame)
+            for record in records if isinstance(records, list) else [records]:
+                if record is not None:
+                    display_message(ui, record)
+        return [content for _, content, _ in ui.message_bubbles]
+
+    def test_reconnect_with_a_private_chat_open(self):
+        """
+        Test that after a reconnect, with a private chat open, the public history
+        sent on login is not shown in it, and the private chat's history adds only
+        the messages that were missed.
+        """
+        ui = self._make_ui("Bob", displayed_ids=[7])
+
+        reload_current_chat(ui)
+        ui.send_message_signal.emit.assert_called_once_with("HISTORY:Bob")
+
+        shown = self.show(
+            ui,
+            [
+                Frame(protocol.HISTORY_START, ("public",)),
+                Frame(protocol.HISTORY_BATCH, ("5", "1000", "Carol", "to everyone")),
+                Frame(protocol.HISTORY_START, ("Bob",)),
+                Frame(
+                    protocol.HISTORY_BATCH,
+                    ("7", "2000", "Bob", "seen", "8", "3000", "Bob", "missed"),
+                ),
+            ],
+        )
+
+        self.assertEqual(shown, ["missed"])
+        self.assertEqual(ui.displayed_ids, {7, 8})
+
+    def test_reconnect_with_the_public_chat_open(self):
+        """
+        Test that the public chat relies on the history sent on login, and that
+        'All' and 'public' name the same chat.
+        """
+        ui = self._make_ui("All", displayed_ids=[5])
+
+        reload_current_chat(ui)
+        ui.send_message_signal.emit.assert_not_called()
+
+        shown = self.show(
+            ui,
+            [
+                Frame(protocol.HISTORY_START, ("public",)),
+                Frame(
+                    protocol.HISTORY_BATCH,
+                    ("5", "1000", "Carol", "seen", "6", "2000", "Carol", "missed"),
+                ),
+            ],
+        )
+
+        self.assertEqual(shown, ["missed"])
+
+
+class TestUiUpdateScheduler(unittest.TestCase):
+    @patch("client.ui.update_scheduler.QTimer")
+    def test_clearing_the_view_keeps_unread_highlights(self, mock_timer):
+        """
+        Test that clearing the chat display drops the queued bubbles but still
+        marks the other chats they belong to as unread.
+        """
+        ui = MagicMock()
+        ui.selected_chat = "All"
+        ui.unread_counts = {}
+        ui.sidebar_index = {name: MagicMock() for name in ("All", "Bob")}
+        ui.chat_layout.count.return_value = 0
+        ui.update_scheduler = UiUpdateScheduler(QObject())
+        ui.update_scheduler.chat_client = ui
+
+        ui.update_scheduler.enqueue(ChatRecord("public", "Carol", "hi", "left", "All"))
+        ui.update_scheduler.enqueue(ChatRecord("private", "Bob", "psst", "left", "Bob"))
+        ChatClientUI.clear_chat_display(ui)
+
+        self.assertEqual(ui.unread_counts, {"Bob": 1})
+        self.assertFalse(ui.update_scheduler.pending)
+        ui.chat_layout.addWidget.assert_not_called()
+
+
+class TestSearchView(unittest.TestCase):
+    def _make_ui(self):
+        """
+        Builds a mock UI with the public chat open.
+        """
+        ui = MagicMock()
+        ui.client_name = "Alice"
+        ui.current_chat = "public"
+        ui.displayed_ids = set()
+        ui.message_bubbles = []
+        ui.last_sender = None
+        ui.bubble_max_width = 500
+        ui.text_metrics.ideal_width.return_value = 50.0
+        ui.search_query = None
+        ui.search_before_id = 0
+        return ui
+
+    def type_message(self, ui, text):
+        """Sends the text as if typed in the message input."""
+        ui.message_input.text.return_value = text
+        handle_send_button(ui)
+
+    def page(self, ids, next_before_id, query="deploy"):
+        """Builds a page of search results in the public chat."""
+        results = [
+            ChatRecord("search", "Bob", f"deploy {i}", "left", message_id=i)
+            for i in ids
+        ]
+        return SearchResultsRecord("public", query, results, next_before_id)
+
+    def shown(self, ui):
+        """Returns the content of the records queued for display."""
+        return [call.args[0].content for call in ui.display_message.call_args_list]
+
+    def test_older_pages_are_requested_with_more(self):
+        """
+        Test that /more asks for the page before the last result shown, and only
+        while there is one.
+        """
+        ui = self._make_ui()
+
+        self.type_message(ui, "/search deploy")
+        ui.send_message_signal.emit.assert_called_with("SEARCH:public:deploy")
+        show_search_results(ui, self.page([9, 8], next_before_id=8))
+        self.assertEqual(
+            self.shown(ui), ["deploy 9", "deploy 8", "Type /more for older results"]
+        )
+
+        self.type_message(ui, "/more")
+        ui.send_message_signal.emit.assert_called_with("SEARCH_MORE:8:public:deploy")
+        show_search_results(ui, self.page([7], next_before_id=0))
+        self.assertEqual(self.shown(ui)[3:], ["deploy 7"])
+
+        ui.send_message_signal.emit.reset_mock()
+        self.type_message(ui, "/more")
+        ui.send_message_signal.emit.assert_not_called()
+
+    def test_empty_and_stale_pages(self):
+        """
+        Test that a search without matches says so, and that results arriving
+        after the search was replaced are dropped.
+        """
+        ui = self._make_ui()
+
+        self.type_message(ui, "/search nothing")
+        show_search_results(ui, self.page([], next_before_id=0, query="nothing"))
+        show_search_results(ui, self.page([3], next_before_id=0, query="older"))
+
+        self.assertEqual(self.shown(ui), ["No messages found for 'nothing'"])
+
+    @patch("client.ui.chat_management.QHBoxLayout", MagicMock())
+    @patch("client.ui.chat_management.QWidget", MagicMock())
+    @patch("client.ui.chat_management.QLabel", MagicMock())
+    def test_live_messages_stay_out_of_the_search_view(self):
+        """
+        Test that live messages and history are not added to the search results,
+        and are shown again once the chat is reopened.
+        """
+        ui = self._make_ui()
+        ui.search_query = ("public", "deploy")
+        ui.unread_counts = {}
+        ui.sidebar_index = {}
+
+        display_message(ui, ChatRecord("public", "Bob", "live", "left", "All"))
+        display_message(ui, ChatRecord("history", "Bob", "old", "left"))
+        display_message(ui, ChatRecord("search", "Bob", "deploy", "left"))
+        with patch("client.ui.chat_management.time.time", return_value=1000.0):
+            ui.last_click_time = 0
+            ChatClientUI.switch_chat(ui, "public", None)
+        display_message(ui, ChatRecord("public", "Bob", "live", "left", "All"))
+
+        self.assertIsNone(ui.search_query)
+        self.assertEqual(
+            [content for _, content, _ in ui.message_bubbles], ["deploy", "live"]
+        )
+
+
+class TestBubbleResizing(unittest.TestCase):
+    def test_resize_only_when_width_changes(self):
+        """
+        Test that bubbles are resized in one pass when the window width changes,
+        and left untouched when it does not.
+        """
+        ui = MagicMock()
+        ui.width.return_value = 1000
+        ui.bubble_max_width = 500
+        label = MagicMock()
+        ui.message_bubbles = [(label, "hello", 100.0)]
+
+        resize_message_bubbles(ui)
+        label.setFixedWidth.assert_not_called()
+
+        ui.width.return_value = 200
+        resize_message_bubbles(ui)
+        label.setFixedWidth.assert_called_once_with(100)
+        self.assertEqual(ui.bubble_max_width, 100)
+
+
+class TestNotificationDebouncer(unittest.TestCase):
+    def test_debounces_per_conversation(self):
+        """
+        Test that a flood in one conversation plays a single notification while
+        another conversation can still notify once the global interval has passed.
+        """
+        debouncer = NotificationDebouncer(
+            debounce_seconds=2.0, min_interval_seconds=0.25
+        )
+
+        self.assertTrue(debouncer.should_notify("All", now=10.0))
+        self.assertFalse(debouncer.should_notify("All", now=10.1))
+        self.assertFalse(debouncer.should_notify("Bob", now=10.1))
+        self.assertTrue(debouncer.should_notify("Bob", now=10.5))
+        self.assertFalse(debouncer.should_notify("All", now=11.0))
+        self.assertTrue(debouncer.should_notify("All", now=12.5))
+
 
 if __name__ == "__main__":
     unittest.main()
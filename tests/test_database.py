@@ -1,5 +1,8 @@
 import unittest
+import threading
+from queue import Queue
 from unittest.mock import patch, MagicMock
+from server.database.storage import MAX_MESSAGE_ID
 
 
 class TestFetchoneMock(unittest.TestCase):
@@ -45,5 +48,344 @@ class TestFetchoneMock(unittest.TestCase):
         self.assertEqual(executed_args, ("sender",))
 
 
+class TestLoginTimings(unittest.TestCase):
+    @patch("server.database.user.bcrypt.checkpw", return_value=True)
+    @patch("server.database.user.get_db_connection")
+    def test_login_records_phase_timings(self, mock_get_db_connection, mock_checkpw):
+        """
+        Test that login_user reports the time spent connecting, verifying the
+        password and updating the login state.
+        """
+        from server.database.user import login_user
+
+        mock_cursor = mock_get_db_connection.return_value.cursor.return_value
+        mock_cursor.fetchone.return_value = ("Alice", "hashed", False)
+
+        timings = {}
+        self.assertEqual(login_user("alice", "secret", timings), "Alice")
+        self.assertEqual(set(timings), {"connect", "verify", "update"})
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+
+@patch.dict("server.database.user.user_ids", clear=True)
+class TestStreamingHistory(unittest.TestCase):
+    @patch("server.database.mysql_storage.get_db_connection")
+    def test_history_is_streamed_in_batches(self, mock_get_db_connection):
+        """
+        Test that history rows are fetched in chunks from an unbuffered cursor and
+        enqueued as one batch frame per chunk.
+        """
+        from server import shared
+        from server.network import protocol
+
+        mock_conn = mock_get_db_connection.return_value
+        mock_cursor = mock_conn.cursor.return_value
+        mock_cursor.fetchone.side_effect = [(0,)]  # Nothing archived
+        mock_cursor.fetchmany.side_effect = [
+            [(1, 1000, "Bob", "hi")] * shared.HISTORY_BATCH_SIZE,
+            [(2, 2000, "Alice", "hey")],
+            [],
+        ]
+
+        conn = MagicMock()
+        with patch.dict(shared.clients, {conn: {"queue": Queue()}}):
+            shared.send_message_history(conn, "Alice", "public")
+            shared.fanout.flush()
+            queued = list(shared.clients[conn]["queue"].queue)
+
+        mock_conn.cursor.assert_called_once_with(buffered=False)
+        mock_cursor.fetchall.assert_not_called()
+        self.assertEqual(
+            [frame.frame_type for frame in queued],
+            [protocol.HISTORY_START] + [protocol.HISTORY_BATCH] * 2,
+        )
+        self.assertEqual(queued[0].fields, ("public",))
+        self.assertEqual(len(queued[1].fields), 4 * shared.HISTORY_BATCH_SIZE)
+        self.assertEqual(queued[2].fields, ("2", "2000", "Alice", "hey"))
+        self.assertEqual(queued[2].message_id, 2)
+        query, params = mock_cursor.execute.call_args[0]
+        self.assertIn("FROM messages AS messages", query)
+        self.assertIn("ORDER BY messages.id DESC LIMIT", query)
+        self.assertEqual(params, (0, MAX_MESSAGE_ID, shared.HISTORY_PAGE_SIZE))
+
+    def test_group_history_requires_membership(self):
+        """
+        Test that group history is scoped to members, as group search is.
+        """
+        from server.database.mysql_storage import history_query
+
+        query, params = history_query("messages", 5, "group:team", 0, 100, 50)
+
+        self.assertIn("group_memberships.user_id = %s", query)
+        self.assertEqual(params, ("team", 5, 0, 100, 50))
+
+    @patch("server.database.mysql_storage.get_db_connection")
+    def test_history_reads_archive_only_beyond_hot_tier(self, mock_get_db_connection):
+        """
+        Test that the archive is skipped when the hot tier fills the page, and read
+        first, for the rest of the page, when it does not.
+        """
+        from server import shared
+        from server.network import protocol
+
+        mock_conn = mock_get_db_connection.return_value
+        mock_cursor = mock_conn.cursor.return_value
+        conn = MagicMock()
+
+        def tables():
+            return [
+                call.args[0]
+                for call in mock_cursor.execute.call_args_list
+                if "AS page" in call.args[0]
+            ]
+
+        with patch.dict(shared.clients, {conn: {"queue": Queue()}}):
+            # Public history needs no user ID: archive boundary and a full hot page
+            mock_cursor.fetchone.side_effect = [(100,), (shared.HISTORY_PAGE_SIZE,)]
+            mock_cursor.fetchmany.side_effect = [[]]
+            shared.send_message_history(conn, "Alice", "public")
+            self.assertEqual(len(tables()), 2)  # Counted, then streamed
+            self.assertTrue(all("messages_archive" not in q for q in tables()))
+
+            mock_cursor.reset_mock()
+            # Archive boundary and a short hot page
+            mock_cursor.fetchone.side_effect = [(100,), (3,)]
+            mock_cursor.fetchmany.side_effect = [
+                [(99, 1000, "Bob", "old")],
+                [],
+                [(101, 2000, "Bob", "new")],
+                [],
+            ]
+            shared.send_message_history(conn, "Alice", "public")
+            shared.fanout.flush()
+            queued = list(shared.clients[conn]["queue"].queue)
+
+        archive_query, hot_query = tables()[1:]
+        self.assertIn("FROM messages_archive AS messages", archive_query)
+        self.assertIn("FROM messages AS messages", hot_query)
+        archive_params = mock_cursor.execute.call_args_list[-2].args[1]
+        self.assertEqual(archive_params, (0, 101, shared.HISTORY_PAGE_SIZE - 3))
+        batches = [f for f in queued if f.frame_type == protocol.HISTORY_BATCH]
+        self.assertEqual([frame.message_id for frame in batches], [99, 101])
+
+    @patch("server.database.mysql_storage.get_db_connection")
+    def test_recent_public_history_is_served_from_memory(self, mock_get_db_connection):
+        """
+        Test that the newest public page comes from the in-memory buffer once it is
+        loaded, including messages routed since, without touching the database.
+        """
+        from server import shared
+
+        recent = shared.RecentHistory(size=3)
+        self.assertIsNone(recent.page())
+        recent.load([(1, 1000, "Bob", "one"), (2, 2000, "Bob", "two")])
+        recent.append(4, 4000, "Alice", "four")
+        recent.append(3, 3000, "Bob", "three")  # Evicts the oldest message
+
+        conn = MagicMock()
+        with patch.object(shared, "recent_public_history", recent), patch.dict(
+            shared.clients, {conn: {"queue": Queue()}}
+        ):
+            shared.send_message_history(conn, "Alice", "All", after_id=2)
+            shared.fanout.flush()
+            queued = list(shared.clients[conn]["queue"].queue)
+
+        mock_get_db_connection.assert_not_called()
+        self.assertEqual(len(queued), 2)
+        self.assertEqual(queued[0].fields, ("All",))  # The chat, as requested
+        self.assertEqual(
+            queued[1].fields,
+            ("3", "3000", "Bob", "three", "4", "4000", "Alice", "four"),
+        )
+        self.assertEqual(queued[1].message_id, 4)
+
+    def test_wait_for_queue_space(self):
+        """
+        Test that waiting returns once the sender drains the queue, and gives up
+        if the client does not read in time.
+        """
+        from server import shared
+
+        conn = MagicMock()
+        message_queue = Queue()
+        for _ in range(3):
+            message_queue.put("message")
+
+        with patch.dict(shared.clients, {conn: {"queue": message_queue}}):
+            self.assertFalse(shared.wait_for_queue_space(conn, 2, timeout=0.05))
+
+            drain = threading.Timer(0.05, message_queue.get)
+            drain.start()
+            self.assertTrue(shared.wait_for_queue_space(conn, 3, timeout=5))
+            drain.join()
+
+            # Frames the fan-out worker has yet to queue count as queued
+            shared.clients[conn]["sending"] = 1
+            self.assertFalse(shared.wait_for_queue_space(conn, 3, timeout=0.05))
+
+        self.assertFalse(shared.wait_for_queue_space(conn))
+
+
+class TestUserIds(unittest.TestCase):
+    @patch.dict("server.database.user.user_ids", clear=True)
+    def test_user_ids_are_cached(self):
+        """
+        Test that a user ID is queried once and then served from the identity cache,
+        and that unknown users are not cached.
+        """
+        from server.database.user import get_user_id, user_ids
+
+        cursor = MagicMock()
+        cursor.fetchone.side_effect = [(7,), None]
+        self.assertEqual(get_user_id(cursor, "alice"), 7)
+        self.assertEqual(get_user_id(cursor, "alice"), 7)
+        self.assertIsNone(get_user_id(cursor, "nobody"))
+        self.assertEqual(cursor.execute.call_count, 2)
+        self.assertEqual(user_ids, {"alice": 7})
+
+
+class TestMessageIds(unittest.TestCase):
+    def test_allocator_continues_from_stored_ids(self):
+        """
+        Test that IDs continue after the highest stored ID, the database is only
+        asked once, and timestamps never go backwards.
+        """
+        from server.shared import MessageIdAllocator
+
+        load_last_id = MagicMock(return_value=41)
+        allocator = MessageIdAllocator(load_last_id)
+        allocated = [allocator.allocate() for _ in range(3)]
+
+        self.assertEqual([message_id for message_id, _ in allocated], [42, 43, 44])
+        timestamps = [timestamp for _, timestamp in allocated]
+        self.assertEqual(timestamps, sorted(timestamps))
+        load_last_id.assert_called_once()
+
+    @patch("server.database.mysql_storage.get_db_connection")
+    def test_store_uses_assigned_id(self, mock_get_db_connection):
+        """
+        Test that a message is stored with the ID its recipients received.
+        """
+        from server.shared import store_message_in_db
+
+        mock_cursor = mock_get_db_connection.return_value.cursor.return_value
+        mock_cursor.fetchone.return_value = (1,)
+
+        store_message_in_db("Alice", None, None, "hi", 42, 1700000000123)
+
+        query, params = mock_cursor.execute.call_args[0]
+        self.assertIn("INSERT INTO messages (id,", query)
+        self.assertEqual(params[0], 42)
+        self.assertEqual(params[-1], 1700000000.123)
+
+
+class TestArchive(unittest.TestCase):
+    @patch("server.database.archive.get_db_connection")
+    def test_archive_moves_id_ranges(self, mock_get_db_connection):
+        """
+        Test that messages up to the newest old-enough ID are copied and deleted in
+        ID ranges, committing after each range.
+        """
+        from server.database.archive import archive_old_messages
+
+        mock_conn = mock_get_db_connection.return_value
+        mock_cursor = mock_conn.cursor.return_value
+        mock_cursor.fetchone.side_effect = [(2500,), (1,)]  # Boundary, first ID
+        mock_cursor.rowcount = 1000
+
+        self.assertEqual(archive_old_messages(days=30, batch_size=1000), 3000)
+
+        ranges = [
+            call.args[1]
+            for call in mock_cursor.execute.call_args_list
+            if call.args[0].startswith("DELETE")
+        ]
+        self.assertEqual(ranges, [(1, 1000), (1001, 2000), (2001, 2500)])
+        self.assertEqual(mock_conn.commit.call_count, 3)
+
+    @patch("server.database.archive.get_db_connection")
+    def test_archive_without_old_messages(self, mock_get_db_connection):
+        """
+        Test that nothing is moved when no message is old enough.
+        """
+        from server.database.archive import archive_old_messages
+
+        mock_cursor = mock_get_db_connection.return_value.cursor.return_value
+        mock_cursor.fetchone.return_value = (None,)
+
+        self.assertEqual(archive_old_messages(days=30), 0)
+        mock_get_db_connection.return_value.commit.assert_not_called()
+
+
+@patch.dict("server.database.user.user_ids", clear=True)
+class TestMessageSearch(unittest.TestCase):
+    def test_fulltext_terms(self):
+        """
+        Test that every word becomes a required prefix and operators are dropped.
+        """
+        from server.database.mysql_storage import fulltext_terms
+
+        self.assertEqual(
+            fulltext_terms('deploy -"release" fix*'), "+deploy* +release* +fix*"
+        )
+        self.assertEqual(fulltext_terms("+-*"), "")
+
+    @patch("server.database.mysql_storage.get_db_connection")
+    def test_search_is_scoped_and_paginated(self, mock_get_db_connection):
+        """
+        Test that group searches require membership, use the FULLTEXT index, and
+        return the next page's cursor when a page is full.
+        """
+        from server import shared
+
+        mock_cursor = mock_get_db_connection.return_value.cursor.return_value
+        mock_cursor.fetchone.side_effect = [(5,), (0,)]  # User ID, nothing archived
+        rows = [(100 - i, 0, "Bob", "deploy") for i in range(shared.SEARCH_PAGE_SIZE)]
+        mock_cursor.fetchall.return_value = rows
+
+        results, next_before_id = shared.search_messages(
+            "Alice", "group:team", "deploy"
+        )
+
+        query, params = mock_cursor.execute.call_args[0]
+        self.assertIn("group_memberships.user_id = %s", query)
+        self.assertIn("MATCH(messages.message) AGAINST (%s IN BOOLEAN MODE)", query)
+        self.assertEqual(
+            params,
+            ("team", 5, "+deploy*", MAX_MESSAGE_ID, shared.SEARCH_PAGE_SIZE),
+        )
+        self.assertEqual(results, rows)
+        self.assertEqual(next_before_id, rows[-1][0])
+
+    @patch("server.network.message_broadcast.send_search_results")
+    def test_text_clients_can_page_search_results(self, mock_send_search_results):
+        """
+        Test that a text-protocol SEARCH_MORE command asks for the page before the
+        given message ID, and that an invalid ID asks for the newest page.
+        """
+        from server.network.message_broadcast import process_message
+
+        conn = MagicMock()
+        process_message(conn, "Alice", "SEARCH_MORE:42:group:team:deploy")
+        process_message(conn, "Alice", "SEARCH_MORE:x:public:deploy")
+
+        mock_send_search_results.assert_any_call(
+            conn, "Alice", "group:team", "deploy", 42
+        )
+        mock_send_search_results.assert_called_with(
+            conn, "Alice", "public", "deploy", 0
+        )
+
+    @patch("server.database.mysql_storage.get_db_connection")
+    def test_empty_query_skips_database(self, mock_get_db_connection):
+        """
+        Test that a query without words returns no results without a database call.
+        """
+        from server.shared import search_messages
+
+        self.assertEqual(search_messages("Alice", "public", "!!"), ([], 0))
+        mock_get_db_connection.assert_not_called()
+
+
 if __name__ == "__main__":
     unittest.main()
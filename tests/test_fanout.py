@@ -0,0 +1,151 @@
+import unittest
+import threading
+from queue import Queue
+from server import metrics
+from server.shared import ClientRegistry
+from server.network.fanout import FanoutPool
+
+
+def connect(registry, count):
+    """Registers `count` clients and returns their connections and queues."""
+    queues = {}
+    for i in range(count):
+        conn = f"conn{i}"
+        queues[conn] = Queue()
+        registry[conn] = {"name": f"user{i}", "queue": queues[conn]}
+    return queues
+
+
+def drain(message_queue):
+    return [message_queue.get_nowait() for _ in range(message_queue.qsize())]
+
+
+class TestFanoutPool(unittest.TestCase):
+    def test_broadcasts_keep_per_recipient_order(self):
+        """
+        Test that every client receives every broadcast, in submission order,
+        when the recipients are spread over several workers.
+        """
+        registry = ClientRegistry(4)
+        queues = connect(registry, 50)
+        pool = FanoutPool(registry, workers=4)
+
+        for i in range(200):
+            pool.broadcast(i, "test")
+        self.assertTrue(pool.flush())
+
+        for message_queue in queues.values():
+            self.assertEqual(drain(message_queue), list(range(200)))
+
+    def test_deliver_reaches_only_the_given_connections(self):
+        """
+        Test that a delivery queues the frame for the given, still connected,
+        recipients and records its fan-out size and latency.
+        """
+        registry = ClientRegistry(3)
+        queues = connect(registry, 6)
+        pool = FanoutPool(registry, workers=3)
+        before = metrics.fanout_seconds.labels("test_group").count
+
+        pool.deliver(["conn1", "conn4", "gone"], "hello", "test_group")
+        self.assertTrue(pool.flush())
+
+        received = {conn for conn, q in queues.items() if drain(q) == ["hello"]}
+        self.assertEqual(received, {"conn1", "conn4"})
+        self.assertEqual(metrics.fanout_seconds.labels("test_group").count, before + 1)
+        series = metrics.fanout_recipients.labels("test_group")
+        self.assertEqual(series.sum, 2)
+
+    def test_sends_stay_in_order_with_routed_messages(self):
+        """
+        Test that frames sent to one connection are queued after the routed
+        messages submitted before them, as on login, where the client list is
+        broadcast before the user list is sent.
+        """
+        registry = ClientRegistry(4)
+        queues = connect(registry, 20)
+        pool = FanoutPool(registry, workers=4)
+
+        for i in range(50):
+            pool.broadcast(("routed", i), "test")
+            pool.send("conn7", ("sent", i))
+        self.assertTrue(pool.flush())
+
+        expected = [(kind, i) for i in range(50) for kind in ("routed", "sent")]
+        self.assertEqual(drain(queues["conn7"]), expected)
+        self.assertEqual(drain(queues["conn8"]), [("routed", i) for i in range(50)])
+
+    def test_submitters_wait_for_a_worker_that_is_behind(self):
+        """
+        Test that a worker's task queue is bounded, so submitting blocks while the
+        worker is stalled instead of letting tasks pile up.
+        """
+        stalled = threading.Event()
+        released = threading.Event()
+
+        class StallingQueue(Queue):
+            def put(self, item, block=True, timeout=None):
+                stalled.set()
+                released.wait(5)
+                super().put(item, block, timeout)
+
+        registry = ClientRegistry(1)
+        registry["conn0"] = {"name": "user0", "queue": StallingQueue()}
+        pool = FanoutPool(registry, workers=1, size=2)
+        submitter = threading.Thread(
+            target=lambda: [pool.broadcast(i, "test") for i in range(5)], daemon=True
+        )
+
+        submitter.start()
+        stalled.wait(5)
+        submitter.join(0.2)
+        self.assertTrue(submitter.is_alive())
+        self.assertLessEqual(pool.tasks[0].qsize(), 2)
+
+        released.set()
+        submitter.join(5)
+        self.assertFalse(submitter.is_alive())
+        self.assertTrue(pool.flush())
+        self.assertEqual(drain(registry["conn0"]["queue"]), list(range(5)))
+
+    def test_sends_are_counted_until_queued(self):
+        """
+        Test that frames sent to a connection count in its "sending" entry while
+        its worker is behind, and stop counting once they are queued.
+        """
+        released = threading.Event()
+
+        class StallingQueue(Queue):
+            def put(self, item, block=True, timeout=None):
+                released.wait(5)
+                super().put(item, block, timeout)
+
+        registry = ClientRegistry(1)
+        registry["conn0"] = {"name": "user0", "queue": StallingQueue(), "sending": 0}
+        pool = FanoutPool(registry, workers=1)
+
+        for i in range(3):
+            pool.send("conn0", i)
+        self.assertEqual(registry["conn0"]["sending"], 3)
+
+        released.set()
+        self.assertTrue(pool.flush())
+        self.assertEqual(registry["conn0"]["sending"], 0)
+        self.assertEqual(drain(registry["conn0"]["queue"]), [0, 1, 2])
+
+    def test_without_workers_fan_out_is_inline(self):
+        """
+        Test that with no workers the frame is queued before broadcast returns.
+        """
+        registry = ClientRegistry(1)
+        queues = connect(registry, 3)
+        pool = FanoutPool(registry, workers=0)
+
+        pool.broadcast("hi", "test")
+
+        self.assertEqual([drain(q) for q in queues.values()], [["hi"]] * 3)
+        self.assertEqual(pool.threads, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
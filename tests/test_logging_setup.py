@@ -0,0 +1,116 @@
+import os
+import json
+import queue
+import logging
+import tempfile
+import unittest
+from unittest.mock import patch
+from server import logging_setup
+from server.logging_setup import BackgroundQueueHandler, CallSiteFilter, JsonFormatter
+
+
+def make_record(level=logging.INFO, lineno=10, msg="hello %s", args=("Bob",), **extra):
+    record = logging.LogRecord("chase", level, "chase.py", lineno, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestLoggingSetup(unittest.TestCase):
+    def test_json_records_include_extras(self):
+        """
+        Test that records are formatted as one JSON object with their extra fields.
+        """
+        entry = json.loads(JsonFormatter().format(make_record(client="Bob")))
+
+        self.assertEqual(entry["message"], "hello Bob")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["client"], "Bob")
+        self.assertEqual(entry["site"], "chase:10")
+
+    def test_call_sites_are_sampled(self):
+        """
+        Test that DEBUG and INFO records are sampled per call site, per record when
+        given a 'sample' extra, and that warnings are never sampled out.
+        """
+        log_filter = CallSiteFilter(rate=0, sample=3)
+
+        kept = [log_filter.filter(make_record()) for _ in range(6)]
+        other_site = log_filter.filter(make_record(lineno=11))
+        warnings = [log_filter.filter(make_record(logging.WARNING)) for _ in range(3)]
+        per_record = [
+            log_filter.filter(make_record(lineno=12, sample=2)) for _ in range(4)
+        ]
+
+        self.assertEqual(kept, [True, False, False, True, False, False])
+        self.assertTrue(other_site)
+        self.assertEqual(warnings, [True, True, True])
+        self.assertEqual(per_record, [True, False, True, False])
+
+    def test_sample_rates_below_one(self):
+        """
+        Test that a sample rate below 1 is refused up front, and that a per-record
+        'sample' of 0 keeps every record instead of raising from the log call.
+        """
+        with self.assertRaises(ValueError):
+            CallSiteFilter(sample=0)
+
+        log_filter = CallSiteFilter(rate=0)
+        kept = [log_filter.filter(make_record(sample=0)) for _ in range(3)]
+
+        self.assertEqual(kept, [True, True, True])
+
+    @patch("server.logging_setup.time.monotonic")
+    def test_call_sites_are_rate_limited(self, mock_monotonic):
+        """
+        Test that a call site writes at most its burst at once, refills at its rate,
+        and reports how many records were suppressed in between.
+        """
+        mock_monotonic.return_value = 100.0
+        log_filter = CallSiteFilter(rate=1, burst=2)
+
+        kept = [log_filter.filter(make_record(logging.ERROR)) for _ in range(5)]
+        mock_monotonic.return_value = 101.0
+        record = make_record(logging.ERROR)
+
+        self.assertEqual(kept, [True, True, False, False, False])
+        self.assertTrue(log_filter.filter(record))
+        self.assertEqual(record.suppressed, 3)
+
+    def test_queue_handler_defers_formatting_and_drops_when_full(self):
+        """
+        Test that queued records are left unformatted for the writer thread, and
+        that a full queue drops records instead of blocking.
+        """
+        handler = BackgroundQueueHandler(queue.Queue(1))
+        first, second = make_record(), make_record()
+
+        handler.handle(first)
+        handler.handle(second)
+
+        queued = handler.queue.get_nowait()
+        self.assertIs(queued, first)
+        self.assertEqual(queued.args, ("Bob",))
+        self.assertEqual(handler.dropped, 1)
+
+    def test_configure_logging_writes_from_a_background_thread(self):
+        """
+        Test that the root logger writes JSON lines to the file through the queue.
+        """
+        root = logging.getLogger()
+        self.addCleanup(setattr, root, "handlers", root.handlers)
+        self.addCleanup(root.setLevel, root.level)
+        path = os.path.join(tempfile.mkdtemp(), "logs", "test.log")
+
+        with patch.object(logging_setup, "listener", None):
+            listener = logging_setup.configure_logging(path, "INFO", "json")
+            logging.info("stored %d messages", 3)
+            logging_setup.stop_logging()
+            listener.handlers[0].close()
+
+        with open(path) as log_file:
+            entry = json.loads(log_file.readline())
+        self.assertEqual(entry["message"], "stored 3 messages")
+
+
+if __name__ == "__main__":
+    unittest.main()
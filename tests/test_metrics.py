@@ -0,0 +1,103 @@
+import queue
+import socket
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import patch
+from server import metrics, shared
+
+
+def free_port():
+    """Returns a local port nothing is listening on."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        registry = list(metrics.registry)
+        self.addCleanup(lambda: metrics.registry.__setitem__(slice(None), registry))
+
+    def test_counters_and_histograms_render_as_text(self):
+        """
+        Test that labelled counters and histograms render in the text exposition
+        format, with cumulative buckets and escaped label values.
+        """
+        counter = metrics.Counter("test_sent_total", "Sent.", ("type",))
+        counter.labels("public").inc()
+        counter.labels("public").inc(2)
+        counter.labels('a"b').inc()
+        histogram = metrics.Histogram("test_seconds", "Latency.", buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        text = metrics.render()
+
+        self.assertIn("# TYPE test_sent_total counter\n", text)
+        self.assertIn('test_sent_total{type="public"} 3\n', text)
+        self.assertIn('test_sent_total{type="a\\"b"} 1\n', text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('test_seconds_bucket{le="1"} 2\n', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn("test_seconds_sum 5.55\n", text)
+        self.assertIn("test_seconds_count 3\n", text)
+
+    def test_gauges_are_collected_when_scraped(self):
+        """
+        Test that a gauge reads its values at render time.
+        """
+        depths = {"Alice": 1}
+        metrics.Gauge(
+            "test_queue_depth",
+            "Depth.",
+            ("client",),
+            lambda: [((name,), depth) for name, depth in depths.items()],
+        )
+        depths["Alice"] = 4
+
+        self.assertIn('test_queue_depth{client="Alice"} 4\n', metrics.render())
+
+    def test_client_queue_depths_are_aggregated(self):
+        """
+        Test that outbound queue depths are exposed as a max and a total, so two
+        connections of one user do not produce duplicate series.
+        """
+        first, second = queue.Queue(), queue.Queue()
+        first.put("a")
+        for message in ("b", "c", "d"):
+            second.put(message)
+        connections = {
+            "conn1": {"name": "Alice", "queue": first},
+            "conn2": {"name": "Alice", "queue": second},
+        }
+
+        with patch.object(shared, "clients", connections):
+            text = metrics.render()
+
+        self.assertIn("chase_client_queue_depth_max 3\n", text)
+        self.assertIn("chase_client_queued_messages 4\n", text)
+        self.assertNotIn('client="Alice"', text)
+
+    def test_endpoint_serves_metrics(self):
+        """
+        Test that the HTTP endpoint serves the exposition on /metrics only, and is
+        disabled by port 0.
+        """
+        metrics.Counter("test_scraped_total", "Scraped.").inc()
+        port = free_port()
+        server = metrics.start_metrics_server("127.0.0.1", port)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode()
+        self.assertIn("test_scraped_total 1\n", body)
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other")
+        self.assertIsNone(metrics.start_metrics_server("127.0.0.1", 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from server.profiler import SamplingProfiler, lock_wait_point
+
+
+class TestProfiler(unittest.TestCase):
+    def test_blocked_threads_are_reported_as_lock_waits(self):
+        """
+        Test that a thread blocked on a lock is attributed to the line holding it up,
+        and that a running frame is not a wait.
+        """
+        lock = threading.Lock()
+        lock.acquire()
+        self.addCleanup(lock.release)
+        started = threading.Event()
+
+        def blocked():
+            started.set()
+            with lock:
+                pass
+
+        thread = threading.Thread(target=blocked, daemon=True)
+        thread.start()
+        started.wait()
+        wait = None
+        for _ in range(100):
+            wait = lock_wait_point(sys._current_frames()[thread.ident])
+            if wait:
+                break
+            threading.Event().wait(0.01)
+
+        self.assertIn("blocked", wait)
+        self.assertIsNone(lock_wait_point(sys._getframe()))
+
+    def test_profile_is_bounded_and_written_to_a_report(self):
+        """
+        Test that a profile stops after its duration and writes per-thread stacks,
+        and that toggling while running stops it.
+        """
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        directory = temporary.name
+        profiler = SamplingProfiler(directory, interval=0.001)
+        stop = threading.Event()
+        worker = threading.Thread(
+            target=lambda: stop.wait(5), name="worker", daemon=True
+        )
+        worker.start()
+        self.addCleanup(stop.set)
+
+        self.assertTrue(profiler.start(duration=0.2))
+        self.assertFalse(profiler.start())
+        profiler.thread.join(5)
+
+        self.assertFalse(profiler.running)
+        with open(profiler.last_report) as report:
+            text = report.read()
+        self.assertIn("Thread worker:", text)
+        self.assertIn("Lock and queue waits", text)
+        self.assertEqual(os.path.dirname(profiler.last_report), directory)
+
+        first_report = profiler.last_report
+        profiler.toggle(duration=30)
+        profiler.toggle()
+        profiler.thread.join(5)
+        self.assertFalse(profiler.running)
+        self.assertNotEqual(profiler.last_report, first_report)
+        self.assertTrue(os.path.exists(first_report))
+
+    def test_start_does_not_log_or_wait_on_its_lock(self):
+        """
+        Test that start(), which runs in the SIGUSR1 handler, neither logs on the
+        interrupted thread nor blocks when the profiler lock is already held.
+        """
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        profiler = SamplingProfiler(temporary.name, interval=0.001)
+
+        with profiler.lock:
+            self.assertFalse(profiler.start(duration=0.01))
+        logged_from = []
+        with patch(
+            "server.profiler.logging.info",
+            side_effect=lambda *args: logged_from.append(threading.current_thread()),
+        ):
+            self.assertTrue(profiler.start(duration=0.05))
+            profiler.thread.join(5)
+
+        self.assertTrue(logged_from)
+        self.assertNotIn(threading.current_thread(), logged_from)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import unittest
+from server.network import protocol
+from server.network.protocol import (
+    Frame,
+    FrameCompressor,
+    FrameReader,
+    ServerStreamDecoder,
+    encode_varint,
+    decode_varint,
+)
+from server.network.message_broadcast import encode_for_client
+
+
+class TestFrameCodec(unittest.TestCase):
+    def test_varint_round_trip(self):
+        """
+        Test that varints of various sizes decode to the encoded value.
+        """
+        for value in (0, 1, 127, 128, 300, 2**32, 2**63 - 1):
+            encoded = encode_varint(value)
+            self.assertEqual(decode_varint(encoded, 0), (value, len(encoded)))
+
+    def test_frames_split_across_reads(self):
+        """
+        Test that frames arriving in arbitrary chunks are reassembled in order,
+        with colons and non-ASCII text preserved in their fields.
+        """
+        frames = [
+            Frame(protocol.GROUP, ("team:a", "Bob", "hi: there"), 7, 1700000000000),
+            Frame(protocol.PUBLIC, ("Zoë", "ünïcode")),
+        ]
+        data = b"".join(frame.to_bytes() for frame in frames)
+
+        reader = FrameReader()
+        decoded = []
+        for i in range(len(data)):
+            decoded.extend(reader.feed(data[i : i + 1]))
+
+        self.assertEqual(len(decoded), 2)
+        self.assertEqual(decoded[0].fields, ("team:a", "Bob", "hi: there"))
+        self.assertEqual(decoded[0].message_id, 7)
+        self.assertEqual(decoded[0].timestamp, 1700000000000)
+        self.assertEqual(decoded[1].fields, ("Zoë", "ünïcode"))
+
+    def test_oversized_frame_is_rejected(self):
+        """
+        Test that a length prefix above the limit raises a protocol error.
+        """
+        with self.assertRaises(protocol.ProtocolError):
+            FrameReader().feed(encode_varint(protocol.MAX_FRAME_SIZE + 1))
+
+
+class TestHandshake(unittest.TestCase):
+    def test_parse_handshake(self):
+        """
+        Test that v2 handshakes are recognised and bare usernames fall back to text.
+        """
+        data = protocol.encode_handshake("Alice") + b"\x05rest"
+        self.assertEqual(
+            protocol.parse_handshake(data), (2, "Alice", b"\x05rest", ("zlib",))
+        )
+        self.assertEqual(protocol.parse_handshake(b"Alice"), (1, "Alice", b"", ()))
+        data = protocol.encode_handshake("Alice", codecs=())
+        self.assertEqual(protocol.parse_handshake(data), (2, "Alice", b"", ()))
+
+    def test_stream_decoder_detects_protocol(self):
+        """
+        Test that the client switches to binary only after the server's ack.
+        """
+        frame = Frame(protocol.PUBLIC, ("Bob", "hi"))
+        binary = ServerStreamDecoder()
+        self.assertEqual(binary.feed(protocol.HANDSHAKE_ACK[:3]), [])
+        decoded = binary.feed(protocol.HANDSHAKE_ACK[3:] + frame.to_bytes())
+        self.assertTrue(binary.binary)
+        self.assertEqual(decoded[0].fields, ("Bob", "hi"))
+
+        text = ServerStreamDecoder()
+        self.assertEqual(text.feed(b"CLIENT_LIST:Bob\n"), ["CLIENT_LIST:Bob"])
+        self.assertFalse(text.binary)
+
+    def test_encode_command(self):
+        """
+        Test that UI command strings map to the matching client frames.
+        """
+        cases = {
+            "hello": (protocol.SEND_PUBLIC, ("hello",)),
+            "@public:hi": (protocol.SEND_PUBLIC, ("hi",)),
+            "@Bob:hi: there": (protocol.SEND_PRIVATE, ("Bob", "hi: there")),
+            "#team:hi": (protocol.SEND_GROUP, ("team", "hi")),
+            "HISTORY:group:team": (protocol.HISTORY_REQUEST, ("group:team",)),
+            "SEARCH:public:a b": (protocol.SEARCH_REQUEST, ("public", "a b")),
+            "SEARCH:group:team:x:y": (protocol.SEARCH_REQUEST, ("group:team", "x:y")),
+            "SEARCH_MORE:42:group:team:x": (
+                protocol.SEARCH_REQUEST,
+                ("group:team", "x", "42"),
+            ),
+            "disconnect": (protocol.DISCONNECT, ()),
+        }
+        for message, (frame_type, fields) in cases.items():
+            frame = protocol.encode_command(message)
+            self.assertEqual((frame.frame_type, frame.fields), (frame_type, fields))
+
+
+class TestCompression(unittest.TestCase):
+    def test_compressed_stream_round_trip(self):
+        """
+        Test that bulk frames are compressed on one stream per connection and decode
+        in order, while small chat frames keep their shared encoding.
+        """
+        compressor = FrameCompressor()
+        batch = Frame(protocol.HISTORY_BATCH, ["1", "0", "Bob", "hello there"] * 50)
+        chat = Frame(protocol.PUBLIC, ("Bob", "hi"))
+        data = compressor.encode(batch) + compressor.encode(chat)
+        data += compressor.encode(Frame(protocol.HISTORY_BATCH, ["Bob", "hi"] * 50))
+
+        self.assertIs(compressor.encode(chat), chat.to_bytes())
+        self.assertLess(compressor.bytes_out, compressor.bytes_in // 4)
+
+        decoder = ServerStreamDecoder()
+        frames = decoder.feed(protocol.encode_ack("zlib") + data)
+        self.assertEqual(decoder.compression, "zlib")
+        self.assertEqual([f.frame_type for f in frames], [0x08, 0x01, 0x08])
+        self.assertEqual(frames[0].fields, batch.fields)
+        self.assertEqual(frames[0].flags, 0)
+        self.assertEqual(frames[1].fields, ("Bob", "hi"))
+        self.assertEqual(frames[2].fields, tuple(["Bob", "hi"] * 50))
+
+    def test_compressed_frame_requires_negotiation(self):
+        """
+        Test that a compressed frame on an uncompressed connection is rejected.
+        """
+        data = FrameCompressor().encode(Frame(protocol.ALL_USERS, ("Bob",)))
+        with self.assertRaises(protocol.ProtocolError):
+            FrameReader().feed(data)
+
+    def test_choose_compression(self):
+        """
+        Test that the server only picks a codec both sides enable.
+        """
+        self.assertEqual(protocol.choose_compression(("zlib",)), "zlib")
+        self.assertIsNone(protocol.choose_compression(("zlib",), ("none",)))
+        self.assertIsNone(protocol.choose_compression(("zstd",)))
+        self.assertEqual(protocol.encode_ack(None), protocol.HANDSHAKE_ACK)
+
+
+class TestTextFallback(unittest.TestCase):
+    def test_text_encoding_matches_legacy_format(self):
+        """
+        Test that clients without v2 receive the legacy text messages.
+        """
+        old_client = {"name": "Alice", "protocol": 1}
+        cases = [
+            (Frame(protocol.PUBLIC, ("Bob", "hi")), b"PUBLIC:Bob: hi\n"),
+            (Frame(protocol.PRIVATE, ("Bob", "Alice", "psst")), b"PRIVATE:Bob:psst\n"),
+            (Frame(protocol.HISTORY, ("Alice", "mine")), b"HISTORY:ME:mine\n"),
+            (Frame(protocol.CLIENT_LIST, ("Alice", "Bob")), b"CLIENT_LIST:Alice,Bob\n"),
+            (
+                Frame(
+                    protocol.HISTORY_BATCH,
+                    ("1", "0", "Bob", "a:b", "2", "0", "Alice", "c"),
+                ),
+                b"HISTORY:Bob:a:b\nHISTORY:ME:c\n",
+            ),
+            (
+                Frame(protocol.HISTORY_START, ("group:team",)),
+                b"HISTORY_START:group:team\n",
+            ),
+            (
+                Frame(
+                    protocol.SEARCH_RESULTS,
+                    ("group:team", "deploy", "7", "0", "Bob", "deploy: now"),
+                    message_id=7,
+                ),
+                b"SEARCH_RESULT:7:Bob:deploy: now\nSEARCH_END:7:group:team:deploy\n",
+            ),
+            (
+                Frame(protocol.SEARCH_RESULTS, ("public", "nothing")),
+                b"SEARCH_END:0:public:nothing\n",
+            ),
+        ]
+        for frame, expected in cases:
+            self.assertEqual(encode_for_client(frame, old_client), expected)
+
+        new_client = {"name": "Alice", "protocol": 2}
+        frame = Frame(protocol.PUBLIC, ("Bob", "hi"))
+        self.assertEqual(encode_for_client(frame, new_client), frame.to_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
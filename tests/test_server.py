@@ -3,18 +3,30 @@ from unittest.mock import patch, MagicMock
 import ssl
 import signal
 import os  # Import os to use environment variable
-from server.server import start_server, signal_handler
-from server.network.connection import handle_new_connection
+import threading
+from server.server import start_server, signal_handler, warm_up, LISTEN_BACKLOG
+from server.shared import ClientRegistry
 
 
 class TestServer(unittest.TestCase):
+    @patch("server.server.ThreadPoolExecutor")
+    @patch("server.server.start_metrics_server")
+    @patch("server.server.warm_up", return_value={"storage": 0.01})
     @patch("server.server.ssl.create_default_context")
     @patch("server.server.socket.socket")
     @patch("server.server.signal.signal")
     @patch("sys.exit")  # Patch sys.exit to prevent the test from stopping
     @patch("threading.Thread")  # Patch threading.Thread to mock threading behavior
     def test_start_server(
-        self, mock_thread, mock_exit, mock_signal, mock_socket, mock_ssl_context
+        self,
+        mock_thread,
+        mock_exit,
+        mock_signal,
+        mock_socket,
+        mock_ssl_context,
+        mock_warm_up,
+        mock_metrics_server,
+        mock_executor,
     ):
         """
         Test the start_server function to ensure SSL context, socket, and threading
@@ -37,14 +49,9 @@ class TestServer(unittest.TestCase):
             KeyboardInterrupt,
         ]
 
-        # Call handle_new_connection directly within the threading patch to simplify test flow
-        with patch(
-            "threading.Thread.start",
-            side_effect=lambda: handle_new_connection(
-                mock_conn, mock_addr, mock_context
-            ),
-        ):
-            start_server()
+        # Run handshakes directly instead of on the handshake workers
+        mock_executor.return_value.submit.side_effect = lambda task, *args: task(*args)
+        start_server()
 
         # Check SSL context creation and certificate loading
         mock_ssl_context.assert_called_once_with(ssl.Purpose.CLIENT_AUTH)
@@ -56,7 +63,10 @@ class TestServer(unittest.TestCase):
         mock_socket_instance.bind.assert_called_once_with(
             (os.getenv("HOST", "127.0.0.1"), 65432)
         )
-        mock_socket_instance.listen.assert_called_once()
+        mock_socket_instance.listen.assert_called_once_with(LISTEN_BACKLOG)
+        mock_context.wrap_socket.assert_called_once_with(mock_conn, server_side=True)
+        mock_warm_up.assert_called_once()
+        mock_metrics_server.assert_called_once()
 
     @patch("server.server.server_socket")
     @patch("server.server.clients", new_callable=dict)
@@ -78,6 +88,95 @@ class TestServer(unittest.TestCase):
         mock_client.close.assert_called_once()
         mock_exit.assert_called_once_with(0)
 
+    @patch("server.server.message_ids")
+    @patch("server.server.load_recent_public_history")
+    @patch("server.server.storage")
+    def test_warm_up_skips_failed_caches(
+        self, mock_storage, mock_load_history, mock_message_ids
+    ):
+        """
+        Test that warm_up opens the storage, loads every cache, and reports timings
+        for the phases that succeeded when one of them fails.
+        """
+        mock_storage.load_user_ids.side_effect = OSError("database down")
+
+        timings = warm_up()
+
+        mock_storage.open.assert_called_once()
+        mock_load_history.assert_called_once()
+        mock_message_ids.load.assert_called_once()
+        self.assertEqual(set(timings), {"storage", "public_history", "message_ids"})
+
+
+class TestClientRegistry(unittest.TestCase):
+    def test_iteration_reads_a_stable_snapshot(self):
+        """
+        Test that iterating the registry while clients connect and disconnect sees
+        the clients present when iteration began.
+        """
+        registry = ClientRegistry()
+        for i in range(3):
+            registry[f"conn{i}"] = {"name": f"user{i}"}
+
+        seen = []
+        for conn, info in registry.items():
+            registry.pop("conn2", None)
+            registry["conn3"] = {"name": "user3"}
+            seen.append(conn)
+
+        self.assertEqual(seen, ["conn0", "conn1", "conn2"])
+        self.assertEqual(list(registry), ["conn0", "conn1", "conn3"])
+
+    def test_connections_are_indexed_by_name(self):
+        """
+        Test that the name index follows additions and removals, including a user
+        connected twice.
+        """
+        registry = ClientRegistry()
+        registry["a"] = {"name": "Alice"}
+        registry["b"] = {"name": "Bob"}
+        registry["c"] = {"name": "Alice"}
+        del registry["a"]
+
+        self.assertEqual(registry.connections("Alice"), ("c",))
+        self.assertEqual(registry.connections("Bob"), ("b",))
+        self.assertEqual(registry.connections("Carol"), ())
+        self.assertIsNone(registry.pop("a", None))
+
+    def test_concurrent_churn_and_broadcasts(self):
+        """
+        Test that broadcasts iterating from several threads never fail while
+        another thread connects and disconnects clients.
+        """
+        registry = ClientRegistry()
+        errors = []
+        done = threading.Event()
+
+        def churn():
+            for i in range(2000):
+                registry[i] = {"name": f"user{i % 10}"}
+                if i >= 10:
+                    del registry[i - 10]
+            done.set()
+
+        def broadcast():
+            try:
+                while not done.is_set():
+                    for conn, info in registry.items():
+                        registry.connections(info["name"])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=broadcast) for _ in range(3)]
+        threads.append(threading.Thread(target=churn))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(registry), 10)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from server.database.storage import create_storage
+from server.database.memory_storage import MemoryStorage
+from server.database.sqlite_storage import SQLiteStorage
+
+
+class StorageContract:
+    """Behaviour every storage backend shares, run against each backend below."""
+
+    def create_storage(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.storage = self.create_storage()
+        self.storage.open()
+
+    def test_history_pages_by_id(self):
+        """
+        Test that a history page holds the newest messages between two IDs, oldest
+        first, in batches of the requested size.
+        """
+        for i in range(1, 8):
+            self.storage.store_message("Alice", None, None, f"message {i}", i, i * 1000)
+
+        batches = list(self.storage.history(None, "public", 2, 7, 3, 2))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        rows = [row for batch in batches for row in batch]
+        self.assertEqual([row[0] for row in rows], [4, 5, 6])
+        self.assertEqual(tuple(rows[0]), (4, 4000, "Alice", "message 4"))
+        self.assertEqual(self.storage.last_message_id(), 7)
+
+    def test_private_and_group_conversations(self):
+        """
+        Test that private history holds both directions of one conversation, that
+        group history is only readable by members, and that senders become users.
+        """
+        self.storage.store_message("Alice", "Bob", None, "hi bob", 1, 1000)
+        self.storage.store_message("Bob", "Alice", None, "hi alice", 2, 2000)
+        self.storage.store_message("Alice", "Carol", None, "hi carol", 3, 3000)
+        self.storage.store_message("Alice", None, "team", "hi team", 4, 4000)
+        self.storage.add_group_member("team", "Bob")
+
+        for username, other in (("Alice", "Bob"), ("Bob", "Alice")):
+            rows = [
+                row
+                for batch in self.storage.history(username, other, 0, 0, 10, 10)
+                for row in batch
+            ]
+            self.assertEqual([row[0] for row in rows], [1, 2])
+        group = list(self.storage.history("Bob", "group:team", 0, 0, 10, 10))
+        self.assertEqual([row[0] for row in group[0]], [4])
+        self.assertEqual(
+            list(self.storage.history("Carol", "group:team", 0, 0, 10, 10)), []
+        )
+        self.assertEqual(self.storage.group_members("team"), ["Bob"])
+        self.assertEqual(
+            sorted(self.storage.get_all_users()), ["Alice", "Bob", "Carol"]
+        )
+        self.assertEqual(
+            self.storage.get_user_id("carol"), self.storage.get_user_id("Carol")
+        )
+        self.assertIsNone(self.storage.get_user_id("Dave"))
+
+    def test_search_is_scoped_and_paginated(self):
+        """
+        Test that search returns pages newest first with a next-page cursor, and
+        only searches groups the user belongs to.
+        """
+        for i in range(1, 6):
+            self.storage.store_message("Bob", None, None, f"deploy build {i}", i, 0)
+        self.storage.store_message("Bob", None, "team", "deploy team", 6, 0)
+        self.storage.store_message("Bob", None, None, "lunch", 7, 0)
+
+        self.assertEqual(self.storage.search("Alice", "public", "deplo", 0, 2)[1], 4)
+        results, next_before_id = self.storage.search(
+            "Alice", "public", "deploy", 4, 10
+        )
+        self.assertEqual([row[0] for row in results], [3, 2, 1])
+        self.assertEqual(next_before_id, 0)
+
+        self.assertEqual(
+            self.storage.search("Alice", "group:team", "deploy", 0, 10)[0], []
+        )
+        self.storage.add_group_member("team", "Alice")
+        results, _ = self.storage.search("Alice", "group:team", "deploy", 0, 10)
+        self.assertEqual([row[0] for row in results], [6])
+
+
+class TestMemoryStorage(StorageContract, unittest.TestCase):
+    def create_storage(self):
+        return MemoryStorage()
+
+
+class TestSQLiteStorage(StorageContract, unittest.TestCase):
+    def create_storage(self):
+        return SQLiteStorage(":memory:")
+
+
+class TestCreateStorage(unittest.TestCase):
+    def test_backends_are_selected_by_name(self):
+        """
+        Test that each configured name selects its backend and unknown names fail.
+        """
+        self.assertEqual(create_storage("memory").name, "memory")
+        self.assertEqual(create_storage("sqlite").name, "sqlite")
+        self.assertEqual(create_storage("mysql").name, "mysql")
+        with self.assertRaises(ValueError):
+            create_storage("redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
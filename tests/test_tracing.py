@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from server import tracing
+from server.network import protocol
+from server.network.protocol import Frame
+from benchmarks.trace_report import breakdown
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(tracing.finish)
+
+    def exported(self, mock_exporter):
+        return [call.args[0] for call in mock_exporter.export.call_args_list]
+
+    @patch("server.tracing.exporter")
+    def test_unsampled_messages_record_nothing(self, mock_exporter):
+        """
+        Test that with a zero sample rate no trace starts and stages are no-ops.
+        """
+        frame = Frame(protocol.PUBLIC, ("Alice", "hi"))
+
+        self.assertIsNone(tracing.start("Alice", time.perf_counter_ns(), rate=0))
+        with tracing.stage("route"):
+            tracing.attach(frame)
+
+        self.assertIsNone(frame.trace)
+        mock_exporter.export.assert_not_called()
+
+    @patch("server.tracing.exporter")
+    def test_stages_share_the_trace_id(self, mock_exporter):
+        """
+        Test that a sampled message exports receive, route, queue and send spans
+        under one trace ID, in order.
+        """
+        trace = tracing.start("Alice", time.perf_counter_ns(), rate=1)
+        frame = Frame(protocol.PUBLIC, ("Alice", "hi"))
+        with tracing.stage("route", type="public"):
+            tracing.attach(frame)
+        tracing.finish()
+        dequeued = time.perf_counter_ns()
+        tracing.delivered(frame, dequeued, time.perf_counter_ns(), "Bob")
+
+        spans = self.exported(mock_exporter)
+        self.assertEqual(
+            [span["stage"] for span in spans], ["receive", "route", "queue", "send"]
+        )
+        self.assertEqual({span["trace"] for span in spans}, {trace.trace_id})
+        self.assertEqual(spans[1]["type"], "public")
+        self.assertEqual(spans[3]["recipient"], "Bob")
+        self.assertTrue(all(span["start_ns"] <= span["end_ns"] for span in spans))
+        self.assertIs(tracing.stage("persist"), tracing.NO_SPAN)
+
+    def test_exporter_appends_json_lines(self):
+        """
+        Test that exported spans are written to the file by the background thread.
+        """
+        path = os.path.join(tempfile.mkdtemp(), "logs", "traces.jsonl")
+        exporter = tracing.SpanExporter(path)
+
+        exporter.export({"trace": "a", "stage": "route"})
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and not (
+            os.path.exists(path) and os.path.getsize(path)
+        ):
+            time.sleep(0.01)
+
+        with open(path) as trace_file:
+            self.assertEqual(json.loads(trace_file.readline())["stage"], "route")
+
+    def test_report_breaks_down_stages(self):
+        """
+        Test that the report summarizes each stage and receipt-to-delivery latency.
+        """
+        ms = 1000000
+        spans = [
+            {"trace": "a", "stage": "receive", "start_ns": 0, "end_ns": 1 * ms},
+            {"trace": "a", "stage": "route", "start_ns": 1 * ms, "end_ns": 3 * ms},
+            {"trace": "a", "stage": "queue", "start_ns": 2 * ms, "end_ns": 6 * ms},
+            {"trace": "a", "stage": "send", "start_ns": 6 * ms, "end_ns": 7 * ms},
+        ]
+
+        report = breakdown(spans)
+
+        self.assertEqual(
+            list(report), ["receive", "route", "queue", "send", "delivered"]
+        )
+        self.assertAlmostEqual(report["queue"]["p50_ms"], 4)
+        self.assertAlmostEqual(report["delivered"]["p50_ms"], 7)
+
+
+class TestTracedRouting(unittest.TestCase):
+    @patch("server.tracing.exporter")
+    @patch("server.network.message_broadcast.store_message_in_db")
+    @patch("server.network.message_broadcast.message_ids")
+    def test_routed_frames_carry_the_trace(
+        self, mock_message_ids, mock_store, mock_exporter
+    ):
+        """
+        Test that frames routed while a message is traced are marked for delivery.
+        """
+        from server.network import message_broadcast
+
+        mock_message_ids.allocate.return_value = (0, 1000)
+        conn = MagicMock()
+        client_queue = MagicMock()
+        with patch.dict(
+            "server.network.message_broadcast.clients",
+            {conn: {"name": "Bob", "queue": client_queue}},
+            clear=True,
+        ):
+            tracing.start("Alice", time.perf_counter_ns(), rate=1)
+            message_broadcast.route_public_message("Alice", "hi")
+            tracing.finish()
+            message_broadcast.fanout.flush()
+
+        frame = client_queue.put.call_args.args[0]
+        self.assertIsNotNone(frame.trace)
+        stages = [call.args[0]["stage"] for call in mock_exporter.export.call_args_list]
+        self.assertEqual(stages, ["receive", "route"])
+
+
+if __name__ == "__main__":
+    unittest.main()